@@ -2,11 +2,23 @@ import argparse
 
 from borice.application import *
 
+def parse_duration(duration):
+	"""Returns a duration in seconds from a number of seconds, or of minutes or hours with the suffix m or h (ex: 90, 20m, 1.5h).
+	"""
+	units = {'s': 1, 'm': 60, 'h': 3600}
+	try:
+		if duration[-1:].lower() in units:
+			return float(duration[:-1]) * units[duration[-1:].lower()]
+		return float(duration)
+	except ValueError:
+		raise argparse.ArgumentTypeError("invalid duration: %r" % duration)
+
 def main():
 	parser = argparse.ArgumentParser()
 
 	parser.add_argument(dest='datafile',
-						help='input data file (formatted as CSV)')
+						nargs='?',
+						help='input data file (formatted as CSV). It may be left out when resuming a run from a checkpoint.')
 
 	parser.add_argument('--locus',
 						type=bool,
@@ -27,6 +39,11 @@ def main():
 						dest='burnin_steps',
 						help='number of initial steps that will be discarded before the posterior distributions are calculated. If replicate runs of BORICE yield varying estimates of t or F, this may indicate that the burn-in length is too short.')
 
+	parser.add_argument('--auto-burnin',
+						action='store_true',
+						dest='auto_burn_in',
+						help='ends the burn-in as soon as the t and ln likelihood trace of the chain is stationary, at the latest after --burnin-steps steps. The trace is compared in windows of a quarter of --burnin-steps (at least 200 steps), so the burn-in needs at least 400 steps to end early. The burn-in found is reported in the output file 1.')
+
 	parser.add_argument('--outcrossing-tuning',
 						type=float,
 						default=Application.OUTCROSSING_RATE_TUNING,
@@ -39,6 +56,29 @@ def main():
 						dest='allele_frequency_tuning',
 						help='determines how large a change in allele frequency is made at each step.')
 
+	parser.add_argument('--adapt-tuning',
+						action='store_true',
+						dest='adapt_tuning',
+						help='adapts the outcrossing rate and allele frequency (y value, for each locus) tuning parameters during the burn-in toward a target acceptance rate, starting from the values of --outcrossing-tuning and --allele-frequency-tuning. The adapted values are kept after the burn-in and reported in the output file 1.')
+
+	parser.add_argument('--t-move',
+						choices=list(Application.T_MOVES),
+						default=Application.T_MOVE,
+						dest='t_move',
+						help='move of the outcrossing rate: a random walk with the outcrossing tuning parameter as its width (metropolis), or a draw from its conditional posterior evaluated on a grid (grid), which gives nearly independent t values at every step.')
+
+	parser.add_argument('--ih-move',
+						choices=list(Application.IH_MOVES),
+						default=Application.IH_MOVE,
+						dest='ih_move',
+						help='move of the inbreeding histories: a proposal from the inbreeding history probabilities accepted on the probability of the maternal genotypes (metropolis), or a draw of every family from its full conditional distribution over the 7 inbreeding histories (gibbs).')
+
+	parser.add_argument('--mom-move',
+						choices=list(Application.MOM_MOVES),
+						default=Application.MOM_MOVE,
+						dest='mom_move',
+						help='move of the imputed maternal genotypes: a proposal from the allele frequencies accepted on the likelihood of the offspring (metropolis), or a draw from the full conditional distribution of the candidate genotypes compatible with the offspring (gibbs).')
+
 	parser.add_argument('--outcrossing-rate',
 						type=float,
 						default=Application.INITIAL_OUTCROSSING_RATE,
@@ -65,13 +105,108 @@ def main():
 						dest='write_output_4',
 						help='skips writing the output file 4 (posterior distributions for each maternal genotype at each locus in each family).')
 
+	parser.add_argument('--summary',
+						action='store_true',
+						dest='write_summary',
+						help='also writes the convergence diagnostics and proposal tuning of the output file 1 to BORICE_summary.json, for use by other programs.')
+
 	parser.add_argument('--seed',
 						type=int,
 						default=Application.SEED,
 						dest='seed',
 						help='custom seed used for random number generation')
 
+	parser.add_argument('--engine',
+						default=Application.ENGINE,
+						choices=list(Application.ENGINES),
+						dest='engine',
+						help='engine used to compute the likelihood and step the chain. The reference engine is the pure-Python implementation; the array engine uses NumPy and is much faster on large datasets; the jit engine is the array engine with its inner loops compiled by Numba, when Numba is installed.')
+
+	parser.add_argument('--cross-check',
+						type=int,
+						default=Application.CROSS_CHECK,
+						dest='cross_check',
+						help='checks the likelihood of the engine against another engine after every move of the first N steps, and stops with an error on any mismatch.')
+
+	parser.add_argument('--checkpoint',
+						default=Application.CHECKPOINT_FILE,
+						dest='checkpoint',
+						help='file to which the state of the chain and the posterior tallies are saved periodically, at the end of the run, and when BORICE is stopped (SIGTERM or Ctrl+C), so that the run can be resumed or extended.')
+
+	parser.add_argument('--checkpoint-interval',
+						type=int,
+						default=Application.CHECKPOINT_INTERVAL,
+						dest='checkpoint_interval',
+						help='number of steps between periodic checkpoints.')
+
+	parser.add_argument('--resume',
+						dest='resume',
+						help='continues the run saved in a checkpoint file, with the settings it was started with. The output is identical to that of a run that was never stopped. New checkpoints are saved to the same file unless --checkpoint is given.')
+
+	parser.add_argument('--extend',
+						type=int,
+						default=0,
+						dest='extend',
+						help='adds N steps to the run resumed with --resume, which may have finished.')
+
+	parser.add_argument('--chains',
+						type=int,
+						default=Application.CHAINS,
+						dest='chains',
+						help='number of independent chains, each with its own seed, whose posterior distributions are pooled in the output files. Replicate chains that disagree indicate that the chains are too short.')
+
+	parser.add_argument('--jobs',
+						type=int,
+						default=Application.JOBS,
+						dest='jobs',
+						help='number of worker processes over which the chains are run.')
+
+	parser.add_argument('--chain-outputs',
+						action='store_true',
+						dest='chain_outputs',
+						help='keeps the output files of each chain in a directory BORICE_chainN, next to the pooled output files. Chains are always kept in these directories when checkpoints are written.')
+
+	parser.add_argument('--target-ess',
+						type=float,
+						default=Application.TARGET_ESS,
+						dest='target_ess',
+						help='stops the chain once the effective sample sizes of t and F reach this target. --steps is then the largest number of steps taken. With several chains, the target is for the pooled chains.')
+
+	parser.add_argument('--target-mcse',
+						type=float,
+						default=Application.TARGET_MCSE,
+						dest='target_mcse',
+						help='stops the chain once the Monte Carlo standard errors of the posterior means of t and F are down to this target. --steps is then the largest number of steps taken.')
+
+	parser.add_argument('--time-budget',
+						type=parse_duration,
+						default=Application.TIME_BUDGET,
+						dest='time_budget',
+						help='stops the chain after this time (in seconds, or in minutes or hours with the suffix m or h, ex: 20m) and writes the output files from the samples so far. The burn-in gets at most half of this time, and ends early if it is not over by then.')
+
+	parser.add_argument('--temperatures',
+						type=int,
+						default=Application.TEMPERATURES,
+						dest='temperatures',
+						help='number of chains of parallel tempering: heated copies of the chain run in worker processes and swap states with their neighbours, which helps the chain move between maternal genotype configurations. Only the unheated chain is sampled.')
+
+	parser.add_argument('--heat-increment',
+						type=float,
+						default=Application.HEAT_INCREMENT,
+						dest='heat_increment',
+						help='heat increment of parallel tempering: chain k samples the offspring likelihood raised to the power 1 / (1 + k * increment).')
+
+	parser.add_argument('--swap-interval',
+						type=int,
+						default=Application.SWAP_INTERVAL,
+						dest='swap_interval',
+						help='number of steps between swaps of the chains of parallel tempering.')
+
 	args = parser.parse_args()
+	if args.datafile is None and args.resume is None:
+		parser.error('the data file is required unless a run is resumed with --resume')
+	if args.extend and args.resume is None:
+		parser.error('--extend requires --resume')
 
 	app = Application()
 
@@ -86,7 +221,30 @@ def main():
 			args.write_output_3,
 			args.write_output_4,
 			args.ignore_genotyping_errors,
-			args.seed)
+			args.seed,
+			args.engine,
+			args.cross_check,
+			args.checkpoint,
+			args.checkpoint_interval,
+			args.resume,
+			args.extend,
+			args.chains,
+			args.jobs,
+			args.chain_outputs,
+			args.target_ess,
+			args.target_mcse,
+			args.time_budget,
+			args.adapt_tuning,
+			args.auto_burn_in,
+			args.temperatures,
+			args.heat_increment,
+			args.swap_interval,
+			args.t_move,
+			args.ih_move,
+			args.mom_move,
+			args.write_summary)
+	if app.stopped:
+		sys.exit(1)
 
 if __name__ == '__main__':
 	main()
@@ -1,6 +1,8 @@
 class Allele(object):
 	"""An Allele is an object representing an allele in the population. It has a y value.
 	"""
+	__slots__ = ('name', 'locus', 'y', 'af_list')
+
 	def __init__(self, allele, locus):
 		self.name = allele
 		self.locus = locus
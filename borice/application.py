@@ -2,8 +2,15 @@ import sys
 import os
 import math
 import random
+import signal
+import threading
 import time
-from decimal import *
+import contextlib
+import tempfile
+import multiprocessing
+import concurrent.futures
+import json
+import numpy as np
 
 from .allele import *
 from .csv_utils import *
@@ -11,6 +18,13 @@ from .population import *
 from .family import *
 from .individual import *
 from .genotype import *
+from .engine import *
+from .array_engine import *
+from .chain_state import *
+from .checkpoint import *
+from .diagnostics import *
+from .tuning import *
+from .tempering import *
 
 class Application(object):	
 	"""The application class encompasses the main functional components of the BORICE software.
@@ -25,16 +39,80 @@ class Application(object):
 	WRITE_OUTPUT_2 = True
 	WRITE_OUTPUT_3 = True
 	WRITE_OUTPUT_4 = True
+	WRITE_SUMMARY = False
 	IGNORE_GENOTYPING_ERRORS = False
 	SEED = None
+	ENGINE = 'reference'
+	ENGINES = {'reference': ReferenceEngine, 'array': ArrayEngine, 'jit': JitEngine}
+	CROSS_CHECK = 0
+	CROSS_CHECK_ENGINE = 'reference'
+	CROSS_CHECK_TOLERANCE = 1e-9
+	CHECKPOINT_FILE = None
+	CHECKPOINT_INTERVAL = 10000
+	CHAINS = 1
+	JOBS = 1
+	CHAIN_OUTPUTS = False
+	TARGET_ESS = None
+	TARGET_MCSE = None
+	TIME_BUDGET = None
+	STOPPING_RULE_MIN_SAMPLES = 100
+	BURN_IN_TIME_FRACTION = 0.5
+	ADAPT_TUNING = False
+	AUTO_BURN_IN = False
+	AUTO_BURN_IN_WINDOWS = 4
+	AUTO_BURN_IN_MIN_WINDOW = 20
+	TEMPERATURES = 1
+	HEAT_INCREMENT = 0.1
+	SWAP_INTERVAL = 100
+	T_MOVE = 'metropolis'
+	T_MOVES = ('metropolis', 'grid')
+	T_GRID_SIZE = 100
+	IH_MOVE = 'metropolis'
+	IH_MOVES = ('metropolis', 'gibbs')
+	MOM_MOVE = 'metropolis'
+	MOM_MOVES = ('metropolis', 'gibbs')
+	TARGET_ACCEPTANCE_RATE = 0.44
+	OUTPUT_3_HEADER = "List of t, F, and ln likelihoood values from every 10 steps in the chain beyond the burn-in\nt\tF\tLn Likelihood of the Data\n"
 
 	def __init__(self):
 		#Progress of calculation
 		self.current_step = 0	
+		# a stop asked for by def request_stop (or a signal) ends the chain at the end of a step
+		self.stop_requested = False
+		self.stopped = False
+		# the output file 3 and the number of cross-checked steps of the running chain (see def run)
+		self.borice_output3 = None
+		self.cross_check = 0
 
 	def getStep(self):
 		return self.current_step
 
+	def request_stop(self):
+		"""Asks the running chain to stop at the end of the current step.
+		"""
+		self.stop_requested = True
+
+	@contextlib.contextmanager
+	def handle_stop_signals(self, checkpoint_file):
+		"""Stops a run with a checkpoint file on SIGTERM and SIGINT, restoring the previous handlers when it ends.
+		"""
+		# a first signal stops the run at the end of the current step, and a second one stops it at once
+		def handle_signal(signum, frame):
+			if self.stop_requested:
+				raise KeyboardInterrupt
+			print("Stopping at the end of the current step...")
+			self.request_stop()
+		signal_handlers = {}
+		try:
+			if checkpoint_file and threading.current_thread() is threading.main_thread():
+				for signum in (signal.SIGTERM, signal.SIGINT):
+					signal_handlers[signum] = signal.signal(signum, handle_signal)
+			yield
+		finally:
+			for signum, handler in signal_handlers.items():
+				signal.signal(signum, handler)
+			self.stop_requested = False
+
 	def run(self,
 			file_name,
 			locus_model = LOCUS_MODEL,
@@ -47,35 +125,697 @@ class Application(object):
 			writeOutput3 = WRITE_OUTPUT_3,
 			writeOutput4 = WRITE_OUTPUT_4,
 			ignore_genotyping_errors = IGNORE_GENOTYPING_ERRORS,
-			seed = SEED):
+			seed = SEED,
+			engine = ENGINE,
+			cross_check = CROSS_CHECK,
+			checkpoint_file = CHECKPOINT_FILE,
+			checkpoint_interval = CHECKPOINT_INTERVAL,
+			resume_file = None,
+			extend_steps = 0,
+			chains = CHAINS,
+			jobs = JOBS,
+			chain_outputs = CHAIN_OUTPUTS,
+			target_ess = TARGET_ESS,
+			target_mcse = TARGET_MCSE,
+			time_budget = TIME_BUDGET,
+			adapt_tuning = ADAPT_TUNING,
+			auto_burn_in = AUTO_BURN_IN,
+			temperatures = TEMPERATURES,
+			heat_increment = HEAT_INCREMENT,
+			swap_interval = SWAP_INTERVAL,
+			t_move = T_MOVE,
+			ih_move = IH_MOVE,
+			mom_move = MOM_MOVE,
+			write_summary = WRITE_SUMMARY):
+
+		# parallel tempering couples this chain to heated chains in worker processes, which write no files of their own
+		if temperatures > 1 and (chains > 1 or checkpoint_file or resume_file):
+			sys.exit("Parallel tempering cannot be combined with several chains, checkpoints or resumed runs!")
+
+		# the settings of the chain are kept in its checkpoints; the options of the run may change when it is resumed
+		settings = {
+			'file_name': file_name,
+			'locus_model': list(locus_model),
+			'num_steps': num_steps,
+			'burn_in': burn_in,
+			'auto_burn_in': auto_burn_in,
+			'outcrossing_rate_tuning_parameter': outcrossing_rate_tuning_parameter,
+			'allele_freq_tuning_parameter': allele_freq_tuning_parameter,
+			'initial_outcrossing_rate': initial_outcrossing_rate,
+			'ignore_genotyping_errors': ignore_genotyping_errors,
+			'adapt_tuning': adapt_tuning,
+			'seed': seed,
+			'engine': engine,
+			'target_ess': target_ess,
+			'target_mcse': target_mcse,
+			'time_budget': time_budget,
+			't_move': t_move,
+			'ih_move': ih_move,
+			'mom_move': mom_move,
+		}
+		options = {
+			'writeOutput2': writeOutput2,
+			'writeOutput3': writeOutput3,
+			'writeOutput4': writeOutput4,
+			'write_summary': write_summary,
+			'cross_check': cross_check,
+			'checkpoint_interval': checkpoint_interval,
+			'extend_steps': extend_steps,
+		}
+
+		# several chains are run by def run_chains, each of them with this method in a worker process
+		if chains > 1:
+			run_args = dict(settings, file_name = file_name and os.path.abspath(file_name), **options)
+			del run_args['seed']
+			return self.run_chains(run_args, chains, jobs, chain_outputs, seed, checkpoint_file, resume_file)
+
+		# a resumed run continues the chain of a checkpoint with the settings of that chain
+		checkpoint = None
+		if resume_file:
+			checkpoint, settings = self.read_resumed_checkpoint(resume_file, settings, extend_steps)
+			if not checkpoint_file:
+				checkpoint_file = resume_file
+		elif extend_steps:
+			sys.exit("Only a run resumed from a checkpoint can be extended!")
+		self.settings = settings
+		self.print_settings(settings, options, checkpoint_file, resume_file)
+
+		self.current_step = 0
+		self.stopped = False
+		self.cross_check = cross_check
+		self.start_chain(settings, checkpoint)
+
+		#creates the output file 3, which is written during the chain; the other output files are written at the end
+		# a resumed run writes the samples of its checkpoint first
+		self.borice_output3 = None
+		if(writeOutput3):
+			self.borice_output3 = open('BORICE_output3.txt', 'w')
+			self.borice_output3.write(self.OUTPUT_3_HEADER)
+			write_output_3_lines(self.borice_output3, self.t_list, self.F_list, self.pop_lnL_list)
+
+		# SIGTERM and SIGINT stop the chain with a final checkpoint (see def handle_stop_signals)
+		heated_chains = []
+		with self.handle_stop_signals(checkpoint_file):
+			try:
+				heats = swap_rng = None
+				if temperatures > 1:
+					heats, swap_rng = self.start_heated_chains(heated_chains, temperatures, heat_increment, swap_interval)
+				stop_reason, start_time = self._run_steps(checkpoint_file, checkpoint_interval, swap_interval, heated_chains, heats, swap_rng)
+			finally:
+				# the heated chains are only there for the swaps, and end with the cold chain, however it ends
+				for process, connection in heated_chains:
+					process.terminate()
+					process.join()
+					connection.close()
+
+		state = self.chain_state
+		# a chain ended by a stopping rule is finished, and can be extended from that step
+		if stop_reason:
+			settings['num_steps'] = state.step
+		self.diagnostics.steps = state.step
+		self.diagnostics.burn_in = settings['burn_in']
+		self.diagnostics.stop_reason = stop_reason
+		self.tallies = get_tallies(self.t_list, self.F_list, self.pop_lnL_list, self.diagnostics, self.tuners, self.families, self.all_alleles)
+		# the final checkpoint of a finished run can be extended
+		if checkpoint_file:
+			self.save_checkpoint(checkpoint_file)
+		else:
+			state.capture(self.population, self.all_alleles, self.likelihood)
+		end_time = time.time()
+
+		# a stopped run writes no output files; it can be resumed from its checkpoint
+		if state.step < settings['num_steps']:
+			if(writeOutput3):
+				self.borice_output3.close()
+			self.stopped = True
+			if checkpoint_file:
+				print("stopped after %s steps; the run can be resumed from the checkpoint %s" % (state.step, checkpoint_file))
+			else:
+				print("stopped after %s steps" % state.step)
+			return
+
+		print("end time was %s" % time.asctime())
+		print("executed in %ss" % str(round(end_time - start_time, 2)))
+
+		# main code dealing with file output begins here
+		if(writeOutput3):
+			self.borice_output3.close()
+		self.write_output_files(self.population, self.families, self.all_alleles, settings['locus_model'], self.t_list, self.F_list, self.ih_list, self.pop_lnL_list, [self.diagnostics], [self.tuners], writeOutput2, writeOutput4, write_summary)
 
+		#Progress complete
+		self.current_step += 1
+
+	def _run_steps(self, checkpoint_file, checkpoint_interval, swap_interval, heated_chains = (), heats = None, swap_rng = None, swap_connection = None):
+		"""Runs the steps of a started chain until it ends.
+		"""
+		print("start time was %s" % time.asctime())
+		start_time = time.time()
+		# the stopping rules end the chain early once t and F are sampled well enough, or when the time budget runs out
+		# the burn-in gets at most a fraction of the time budget, so that the chain has time left for samples
+		stop_reason = None
+		deadline = None
+		burn_in_deadline = None
+		if self.settings['time_budget'] is not None:
+			deadline = start_time + self.settings['time_budget']
+			burn_in_deadline = start_time + self.BURN_IN_TIME_FRACTION * self.settings['time_budget']
+
+		# below is the code to perform Bayesian inference of outcrossing rate (t), inbreeding history, allele frequencies, maternal genotypes
+		for step in range(self.chain_state.step, self.settings['num_steps']):
+			if step != 0:
+				self.current_step = step - 1
+			if self.step_chain(step):
+				stop_reason = check_stopping_rules(self.diagnostics, self.settings['target_ess'], self.settings['target_mcse'], deadline, self.STOPPING_RULE_MIN_SAMPLES)
+			self.update_burn_in(step, burn_in_deadline)
+			self.chain_state.step = step + 1
+			# the chains of parallel tempering meet every swap_interval steps
+			if (heated_chains or swap_connection) and (self.chain_state.step % swap_interval) == 0:
+				self.swap_chain_states(heated_chains, swap_connection, heats, swap_rng, swap_interval)
+			if self.stop_requested:
+				break
+			if stop_reason:
+				print("stopping after %s steps: %s" % (self.chain_state.step, stop_reason))
+				break
+			if checkpoint_file and (self.chain_state.step % checkpoint_interval) == 0:
+				self.save_checkpoint(checkpoint_file)
+		return stop_reason, start_time
+
+	def read_resumed_checkpoint(self, resume_file, settings, extend_steps):
+		"""Reads the checkpoint of a resumed run, and returns it with the settings the chain continues with.
+		"""
+		# the data file may have moved; the stopping rules carry on unless the run gives new ones
+		try:
+			checkpoint = read_checkpoint(resume_file)
+		except CheckpointException as x:
+			sys.exit(str(x))
+		resumed_settings = dict(checkpoint['settings'])
+		if settings['file_name']:
+			resumed_settings['file_name'] = settings['file_name']
+		resumed_settings['num_steps'] += extend_steps
+		for name in ('target_ess', 'target_mcse', 'time_budget'):
+			if extend_steps:
+				resumed_settings[name] = settings[name]
+			else:
+				resumed_settings[name] = settings[name] or resumed_settings[name]
+		return checkpoint, resumed_settings
+
+	def print_settings(self, settings, options, checkpoint_file, resume_file):
+		"""Prints the settings and options of a run (see def run).
+		"""
 		print('')
 		print("Running BORICE with the following settings:")
-		print('- Data file: ' + file_name)
-		print('- Locus Model: ' + str(locus_model))
-		print('- Number of Steps: ' + str(num_steps))
-		print('- Burn-in Steps: ' + str(burn_in))
-		print('- Outcrossing Tuning Parameter: ' + str(outcrossing_rate_tuning_parameter))
-		print('- Allele Frequency Tuning Parameter: ' + str(allele_freq_tuning_parameter))
-		print('- Initial Outcrossing Rate: ' + str(initial_outcrossing_rate))
-		print('- Ignore Genotyping Errors: ' + str(ignore_genotyping_errors))
-		print('- Write Output 2: ' + str(writeOutput2))
-		print('- Write Output 3: ' + str(writeOutput3))
-		print('- Write Output 4: ' + str(writeOutput4))
-		print('- Seed: ' + str(seed))
+		print('- Data file: ' + settings['file_name'])
+		print('- Locus Model: ' + str(settings['locus_model']))
+		print('- Number of Steps: ' + str(settings['num_steps']))
+		print('- Burn-in Steps: ' + str(settings['burn_in']))
+		print('- Automatic Burn-in: ' + str(settings['auto_burn_in']))
+		print('- Outcrossing Tuning Parameter: ' + str(settings['outcrossing_rate_tuning_parameter']))
+		print('- Allele Frequency Tuning Parameter: ' + str(settings['allele_freq_tuning_parameter']))
+		print('- Adapt Tuning Parameters: ' + str(settings['adapt_tuning']))
+		print('- Outcrossing Rate Move: ' + str(settings['t_move']))
+		print('- Inbreeding History Move: ' + str(settings['ih_move']))
+		print('- Maternal Genotype Move: ' + str(settings['mom_move']))
+		print('- Initial Outcrossing Rate: ' + str(settings['initial_outcrossing_rate']))
+		print('- Ignore Genotyping Errors: ' + str(settings['ignore_genotyping_errors']))
+		print('- Write Output 2: ' + str(options['writeOutput2']))
+		print('- Write Output 3: ' + str(options['writeOutput3']))
+		print('- Write Output 4: ' + str(options['writeOutput4']))
+		print('- Write Summary: ' + str(options['write_summary']))
+		print('- Seed: ' + str(settings['seed']))
+		print('- Engine: ' + str(settings['engine']))
+		print('- Cross-check Steps: ' + str(options['cross_check']))
+		print('- Checkpoint File: ' + str(checkpoint_file))
+		print('- Checkpoint Interval: ' + str(options['checkpoint_interval']))
+		print('- Target ESS: ' + str(settings['target_ess']))
+		print('- Target MC SE: ' + str(settings['target_mcse']))
+		print('- Time Budget: ' + str(settings['time_budget']))
+		if resume_file:
+			print('- Resumed From: ' + resume_file)
 		print('')
 
-		self.current_step = 0
-
+	def start_chain(self, settings, checkpoint, heat = 1.0):
+		"""Loads the data of a run and sets up its chain, from the checkpoint of a resumed run if there is one.
+		"""
 		# If a custom seed has been provided, initialize the random number generator with this seed.
-		if seed:
-			random.seed(seed)
+		# The same seed is given to the engine, which may have random number generators of its own.
+		engineSeed = None
+		if settings['seed']:
+			random.seed(settings['seed'])
+			engineSeed = settings['seed']
 		else:
 			environmentSeed = os.environ.get('BORICE_RAND_SEED')
 			# If no custom seed has been provided and an environment seed exists, initialize the random number generator with this seed.
 			if environmentSeed:
 				random.seed(int(environmentSeed))
+				engineSeed = int(environmentSeed)
+
+		locus_model = settings['locus_model']
+		self.population, self.families, self.all_alleles = self.load_population(settings['file_name'], locus_model, settings['ignore_genotyping_errors'], settings['initial_outcrossing_rate'])
+
+		# the engine holds the likelihood of the data and steps the inbreeding histories and maternal genotypes
+		if settings['engine'] not in self.ENGINES:
+			sys.exit("Unknown engine %s! Available engines are: %s" % (settings['engine'], ', '.join(self.ENGINES)))
+		if settings['t_move'] not in self.T_MOVES:
+			sys.exit("Unknown outcrossing rate move %s! Available moves are: %s" % (settings['t_move'], ', '.join(self.T_MOVES)))
+		if settings['ih_move'] not in self.IH_MOVES:
+			sys.exit("Unknown inbreeding history move %s! Available moves are: %s" % (settings['ih_move'], ', '.join(self.IH_MOVES)))
+		if settings['mom_move'] not in self.MOM_MOVES:
+			sys.exit("Unknown maternal genotype move %s! Available moves are: %s" % (settings['mom_move'], ', '.join(self.MOM_MOVES)))
+		# the chain state carries the ln likelihood from move to move; a resumed run starts from its checkpoint
+		self.chain_state = ChainState()
+		if checkpoint:
+			self.chain_state = ChainState.from_dict(checkpoint['state'])
+			self.chain_state.restore(self.population, self.all_alleles)
+		self.heat = heat
+		self.likelihood = self.ENGINES[settings['engine']](self.population, locus_model, engineSeed)
+		self.likelihood.heat = heat
+
+		# below lists needed for storage of t, ih, and F before output to text files
+		self.t_list = []
+		self.ih_list = []
+		self.F_list = []
+		self.pop_lnL_list = []
+		# the convergence diagnostics follow the samples of the chain without keeping their trace
+		self.diagnostics = ChainDiagnostics(self.population.allele_freq_list)
+		# an automatic burn-in ends once the t and ln likelihood trace is stationary, at the latest after the burn-in steps
+		self.burn_in_detector = None
+		# the windows are a fraction of the burn-in (one sample every 10 steps), so that it can end early whatever its length
+		burn_in = settings['burn_in']
+		if settings['auto_burn_in']:
+			burn_in_window = max(self.AUTO_BURN_IN_MIN_WINDOW, burn_in // (10 * self.AUTO_BURN_IN_WINDOWS))
+			self.burn_in_detector = BurnInDetector(burn_in_window)
+			if burn_in < 2 * 10 * burn_in_window:
+				print("warning: the burn-in of %s steps is shorter than the two windows of %s steps needed to detect it automatically, so it will not end early" % (burn_in, 10 * burn_in_window))
+		# the tuning parameters of the t and y value moves (one for each locus), adapted during the burn-in if asked for
+		self.tuners = {
+			't': ProposalTuner(settings['outcrossing_rate_tuning_parameter'], self.TARGET_ACCEPTANCE_RATE, 1e-4, 2.0),
+			'y': [ProposalTuner(settings['allele_freq_tuning_parameter'], self.TARGET_ACCEPTANCE_RATE, 1e-4, 10.0) for locus_alleles in self.all_alleles],
+			'swaps': [],
+			'mom': ProposalTuner(None, None, None, None),
+		}
+		# the grid move of t has no tuning parameter; the width of its cells is listed instead
+		if settings['t_move'] == 'grid':
+			self.tuners['t'] = ProposalTuner(1.0 / self.T_GRID_SIZE, None, 1.0 / self.T_GRID_SIZE, 1.0 / self.T_GRID_SIZE)
+
+		if checkpoint:
+			self.restore_checkpoint(checkpoint)
+
+	def save_checkpoint(self, checkpoint_file):
+		"""Writes a checkpoint with everything needed to continue the chain.
+		"""
+		self.chain_state.capture(self.population, self.all_alleles, self.likelihood)
+		tallies = get_tallies(self.t_list, self.F_list, self.pop_lnL_list, self.diagnostics, self.tuners, self.families, self.all_alleles)
+		write_checkpoint(checkpoint_file, {
+			'settings': self.settings,
+			'state': self.chain_state.to_dict(),
+			'random_state': random.getstate(),
+			'engine_random_state': self.likelihood.get_random_state(),
+			'burn_in_detector': self.burn_in_detector,
+			'tallies': tallies,
+		})
+
+	def restore_checkpoint(self, checkpoint):
+		"""Restores the random number generator states and the posterior tallies of a checkpoint.
+		"""
+		random.setstate(checkpoint['random_state'])
+		self.likelihood.set_random_state(checkpoint['engine_random_state'])
+		self.t_list, self.F_list, self.ih_list, self.pop_lnL_list = set_tallies(checkpoint['tallies'], self.families, self.all_alleles)
+		self.diagnostics = checkpoint['tallies']['diagnostics'][0]
+		self.tuners = checkpoint['tallies']['tuners'][0]
+		self.burn_in_detector = checkpoint['burn_in_detector']
+
+	def start_heated_chains(self, heated_chains, temperatures, heat_increment, swap_interval):
+		"""Starts the heated chains of parallel tempering, and returns the heats and the random number generator of the swaps.
+		"""
+		# the swaps draw from a generator of their own, so that the cold chain keeps its random stream
+		heats = calc_heats(temperatures, heat_increment)
+		seed = self.settings['seed']
+		if not seed and os.environ.get('BORICE_RAND_SEED'):
+			seed = int(os.environ.get('BORICE_RAND_SEED'))
+		seed_sequences = np.random.SeedSequence(seed or None).spawn(temperatures)
+		swap_rng = np.random.default_rng(seed_sequences[0])
+		self.tuners['swaps'] = [ProposalTuner(hotter_heat, None, hotter_heat, hotter_heat) for hotter_heat in heats[1:]]
+		context = multiprocessing.get_context()
+		for heated_heat, seed_sequence in zip(heats[1:], seed_sequences[1:]):
+			heated_settings = dict(self.settings,
+				seed = int(seed_sequence.generate_state(1)[0]) + 1,
+				file_name = os.path.abspath(self.settings['file_name']),
+				auto_burn_in = False,
+				target_ess = None,
+				target_mcse = None,
+				time_budget = None)
+			connection, heated_connection = context.Pipe()
+			process = context.Process(target = run_heated_chain, args = (heated_settings, heated_heat, swap_interval, heated_connection), daemon = True)
+			process.start()
+			heated_connection.close()
+			heated_chains.append((process, connection))
+		print("parallel tempering with heats %s, swapping every %s steps" % (', '.join("%.4g" % heated_heat for heated_heat in heats), swap_interval))
+		return heats, swap_rng
+
+	def step_chain(self, step):
+		"""Performs a step of the chain, and returns whether it was sampled.
+		"""
+		settings = self.settings
+		# proposals of the burn-in adapt the tuning parameters; they are frozen after it
+		adapting = settings['adapt_tuning'] and step <= settings['burn_in']
+
+		self.step_outcrossing_rate(adapting)
+		self.check_engine(step, 'outcrossing rate')
+
+		# changes inbreeding history
+		population = self.population
+		population.calc_ih_prob()
+		if settings['ih_move'] == 'gibbs':
+			f_list, lnL_change = self.likelihood.update_inbreeding_histories_gibbs(population.ih_prob_list)
+		else:
+			f_list, lnL_change = self.likelihood.update_inbreeding_histories(population.ih_prob_list)
+		self.chain_state.change_lnL(lnL_change)
+		self.check_engine(step, 'inbreeding history')
+		pop_inbreeding_coefficient = sum(f_list)/len(f_list)
+		del population.ih_prob_list[:]
+
+		if (step % 10) == 0:
+			self.step_allele_frequencies(step, adapting)
+			self.check_engine(step, 'allele frequency')
+
+		#changes the genotype at a random maternal locus; families without imputed genotypes are skipped
+		# the maternal genotype moves count the families whose genotype changed as accepted
+		if settings['mom_move'] == 'gibbs':
+			stepped, changed, lnL_change = self.likelihood.update_mom_genotypes_gibbs(population.outcrossing_rate)
+		else:
+			stepped, changed, lnL_change = self.likelihood.update_mom_genotypes(population.outcrossing_rate)
+		self.tuners['mom'].record_many(stepped, changed)
+		self.chain_state.change_lnL(lnL_change)
+		self.check_engine(step, 'maternal genotype')
+
+		if step > settings['burn_in'] and (step % 10) == 0:
+			self.sample_step(pop_inbreeding_coefficient)
+			return True
+		return False
+
+	def check_engine(self, step, move):
+		"""Cross-checks the engine against another kind of engine during the first cross-check steps.
+		"""
+		if step >= self.cross_check:
+			return
+		engine = self.settings['engine']
+		check_engine = self.CROSS_CHECK_ENGINE
+		if engine == check_engine:
+			check_engine = [name for name in self.ENGINES if name != engine][0]
+		cross_check_engine(self.likelihood, engine, self.ENGINES[check_engine], check_engine, self.population, self.settings['locus_model'], step, move, self.CROSS_CHECK_TOLERANCE)
+
+	def step_outcrossing_rate(self, adapting):
+		"""Steps the outcrossing rate with the t move of the run.
+		"""
+		population = self.population
+		likelihood = self.likelihood
+		state = self.chain_state
+		heat = self.heat
+		tuners = self.tuners
+		if self.settings['t_move'] == 'grid':
+			accepted = update_outcrossing_rate_grid(population, likelihood, state, heat, self.T_GRID_SIZE)
+		else:
+			prev_t = population.outcrossing_rate
+			prev_lnL = state.get_lnL(likelihood, prev_t)
+			# changes outcrossing rate
+			t_prime = (prev_t + ((random.random() - 0.5) * tuners['t'].scale))
+			if t_prime < 0.0:
+				t_prime = (0.0 - t_prime)
+			if t_prime > 1.0:
+				t_prime = (2.0 - t_prime)
+			population.outcrossing_rate = t_prime
+			lnL_components = likelihood.calc_pop_lnL_components(t_prime)
+			lnL = lnL_components[0]
+			accepted = False
+			if (lnL == float('-inf')):
+				population.outcrossing_rate = prev_t
+			else:
+				lnL_ratio = (lnL - prev_lnL)
+				if heat != 1.0:
+					# heated chains raise the offspring likelihood to their heat; t does not change the maternal likelihood
+					lnL_ratio = heat * (lnL_components[1] - state.progeny_lnL)
+				if (lnL_ratio > 0):
+					prev_t = population.outcrossing_rate
+					prev_lnL = lnL
+					state.set_lnL(lnL_components)
+					accepted = True
+				else:
+					random_number = random.random()
+					value = math.exp(lnL_ratio)
+					if (random_number < value):
+						prev_t = population.outcrossing_rate
+						prev_lnL = lnL
+						state.set_lnL(lnL_components)
+						accepted = True
+					else:
+						population.outcrossing_rate = prev_t
+		if adapting and self.settings['t_move'] != 'grid':
+			tuners['t'].adapt(accepted)
+		else:
+			tuners['t'].record(accepted)
 
+	def step_allele_frequencies(self, step, adapting):
+		"""Steps the y value of a random allele at each locus with a Metropolis move.
+		"""
+		population = self.population
+		likelihood = self.likelihood
+		state = self.chain_state
+		heat = self.heat
+		all_alleles = self.all_alleles
+		locus_model = self.settings['locus_model']
+		burn_in = self.settings['burn_in']
+		# changes allele frequencies
+		for locus_index, locus in enumerate(all_alleles):
+			allele_freq = population.allele_freq_list[locus_index]
+			prev_allele_freq = list(allele_freq)
+			locus_alleles = all_alleles[locus_index]
+			null = locus_model[locus_index]
+			if null:
+				random_allele = random.randint(0, len(locus_alleles) - 1)
+				allele = locus_alleles[random_allele]
+			elif len(allele_freq) == 1: # this is to account for single-offspring families with missing data at a locus with no null alleles
+				continue
+			else:
+				random_allele = random.randint(1, len(locus_alleles) - 1) # skips allele zero, which should remain at a frequency of zero with no null alleles
+				allele = locus_alleles[random_allele]
+
+			prev_y = allele.y
+			prev_lnL = state.get_lnL(likelihood, population.outcrossing_rate)
+			new_y = (prev_y + ((random.random() - 0.5) * self.tuners['y'][locus_index].scale))
+			if new_y < 0:
+				new_y = (0.0 - new_y)
+			allele.y = new_y
+			new_af_list = population.calculate_new_af_list(locus_alleles, locus_index, step, burn_in, locus_model)
+			#calculates new lnL based on new allele frequencies
+			population.allele_freq_list[locus_index] = new_af_list
+			prev_likelihood = likelihood.update_locus(locus_index)
+			lnL_components = likelihood.calc_pop_lnL_components(population.outcrossing_rate)
+			lnL = lnL_components[0]
+			population.y_values[locus_index] = []
+
+			# decide to step forward or back based on value
+			accepted = False
+			if (lnL == float('-inf')):
+				population.allele_freq_list[locus_index] = prev_allele_freq
+				allele.y = prev_y
+				likelihood.restore_locus(prev_likelihood)
+			else:
+				lnL_ratio = (lnL - prev_lnL)
+				if heat != 1.0:
+					lnL_ratio = heat * (lnL_components[1] - state.progeny_lnL) + (lnL_components[2] - state.mom_lnL)
+				value = math.exp(lnL_ratio) * math.exp(prev_y - new_y)
+				if (value > 1):
+					prev_y = allele.y
+					prev_lnL = lnL
+					state.set_lnL(lnL_components)
+					accepted = True
+				else:
+					random_number = random.random()
+					if (random_number < value):
+						prev_y = allele.y
+						prev_lnL = lnL
+						state.set_lnL(lnL_components)
+						accepted = True
+					else:
+						population.allele_freq_list[locus_index] = prev_allele_freq
+						allele.y = prev_y
+						likelihood.restore_locus(prev_likelihood)
+			if adapting:
+				self.tuners['y'][locus_index].adapt(accepted)
+			else:
+				self.tuners['y'][locus_index].record(accepted)
+
+	def sample_step(self, pop_inbreeding_coefficient):
+		"""Samples the current step of the chain.
+		"""
+		population = self.population
+		self.t_list.append(population.outcrossing_rate)
+		self.F_list.append(pop_inbreeding_coefficient)
+		self.likelihood.sync_families()
+		for fam in self.families:
+			self.ih_list.append(fam.inbreeding_history)
+			fam.inbreeding_history_list.append(fam.inbreeding_history)
+		for fam in population.imputed_family_list:
+			for n, genotype in enumerate(fam.mom.genotype_list):
+				fam.locus_genotypes[n].append(get_genotype_key(genotype))
+		pop_lnL = self.chain_state.get_lnL(self.likelihood, population.outcrossing_rate)
+		self.pop_lnL_list.append(pop_lnL)
+		if self.borice_output3:
+			write_output_3_lines(self.borice_output3, [population.outcrossing_rate], [pop_inbreeding_coefficient], [pop_lnL])
+		self.diagnostics.add(population.outcrossing_rate, pop_inbreeding_coefficient, pop_lnL, population.allele_freq_list)
+
+	def update_burn_in(self, step, burn_in_deadline):
+		"""Ends the burn-in at this step if its time budget ran out or the chain looks stationary.
+		"""
+		settings = self.settings
+		diagnostics = self.diagnostics
+		if burn_in_deadline is not None and (step % 10) == 0 and step < settings['burn_in'] and time.time() >= burn_in_deadline:
+			settings['burn_in'] = step
+			diagnostics.burn_in_stop_reason = "time budget"
+			print("burn-in ended early at step %s: time budget" % step)
+		# the automatic burn-in ends at the step where the chain is found stationary, which becomes the burn-in of the run
+		if self.burn_in_detector and (step % 10) == 0 and step < settings['burn_in']:
+			if self.burn_in_detector.add(self.population.outcrossing_rate, self.chain_state.get_lnL(self.likelihood, self.population.outcrossing_rate)):
+				settings['burn_in'] = step
+				diagnostics.burn_in_detected = True
+				print("burn-in detected at step %s" % step)
+		if step == settings['burn_in'] and self.burn_in_detector:
+			if not diagnostics.burn_in_detected:
+				diagnostics.burn_in_detected = False
+				print("the chain did not become stationary during the burn-in of %s steps" % settings['burn_in'])
+			self.burn_in_detector = None
+		# the tuning parameters are frozen at the end of the burn-in, and the acceptance rates are counted anew
+		if step == settings['burn_in']:
+			tuners = self.tuners
+			for tuner in [tuners['t']] + tuners['y'] + tuners['swaps'] + [tuners['mom']]:
+				tuner.freeze()
+			if settings['adapt_tuning']:
+				print("adapted tuning parameters: t %.4g, y %s" % (tuners['t'].scale, ', '.join("%.4g" % tuner.scale for tuner in tuners['y'])))
+
+	def swap_chain_states(self, heated_chains, swap_connection, heats, swap_rng, swap_interval):
+		"""Swaps states with the other chains of parallel tempering.
+		"""
+		state = self.chain_state
+		state.get_lnL(self.likelihood, self.population.outcrossing_rate)
+		state_dict = state.capture(self.population, self.all_alleles, self.likelihood).to_dict()
+		if swap_connection:
+			swap_connection.send(state_dict)
+			new_state_dict = swap_connection.recv()
+		else:
+			states = [state_dict] + [connection.recv() for process, connection in heated_chains]
+			new_states = swap_states(states, heats, swap_rng, self.tuners['swaps'], state.step // swap_interval)
+			for (process, connection), old_state_dict, heated_state_dict in zip(heated_chains, states[1:], new_states[1:]):
+				connection.send(heated_state_dict if heated_state_dict is not old_state_dict else None)
+			new_state_dict = new_states[0] if new_states[0] is not state_dict else None
+		if new_state_dict is not None:
+			self.adopt_state(new_state_dict)
+
+	def run_chains(self, run_args, chains, jobs, chain_outputs, seed, checkpoint_file, resume_file):
+		"""Runs several independent chains over a pool of worker processes, and pools their output.
+		"""
+		# each chain runs in its own directory: BORICE_chainN when its outputs or checkpoints are kept, a temporary directory otherwise
+		keep_directories = chain_outputs or checkpoint_file or resume_file
+		temp_directory = None
+		if keep_directories:
+			directories = [os.path.abspath('BORICE_chain%d' % (chain + 1)) for chain in range(chains)]
+		else:
+			temp_directory = tempfile.TemporaryDirectory(prefix = 'BORICE_chains_')
+			directories = [os.path.join(temp_directory.name, 'chain%d' % (chain + 1)) for chain in range(chains)]
+		for directory in directories:
+			os.makedirs(directory, exist_ok = True)
+
+		# every chain gets its own seed from the seed of the run (or from fresh entropy), so that chains are independent but reproducible
+		if not seed and os.environ.get('BORICE_RAND_SEED'):
+			seed = int(os.environ.get('BORICE_RAND_SEED'))
+		self.chain_seeds = [int(seed_sequence.generate_state(1)[0]) + 1 for seed_sequence in np.random.SeedSequence(seed or None).spawn(chains)]
+		# the chains share the stopping rules: their pooled ESS and MC SE reach the targets when each chain reaches its share of them
+		chain_args = []
+		for chain_seed in self.chain_seeds:
+			args = dict(run_args, seed = chain_seed)
+			if run_args['target_ess']:
+				args['target_ess'] = run_args['target_ess'] / float(chains)
+			if run_args['target_mcse']:
+				args['target_mcse'] = run_args['target_mcse'] * math.sqrt(chains)
+			if checkpoint_file:
+				args['checkpoint_file'] = os.path.basename(checkpoint_file)
+			if resume_file:
+				args['resume_file'] = os.path.basename(resume_file)
+			chain_args.append(args)
+
+		print('')
+		print("Running %s chains of BORICE over %s worker processes" % (chains, jobs))
+		if resume_file:
+			print('- Resumed From: ' + ', '.join(os.path.join(directory, os.path.basename(resume_file)) for directory in directories))
+		else:
+			print('- Chain Seeds: ' + ', '.join(str(chain_seed) for chain_seed in self.chain_seeds))
+		if keep_directories:
+			print('- Chain Directories: ' + ', '.join(directories))
+		print('')
+
+		self.current_step = 0
+		self.stopped = False
+		# SIGTERM and SIGINT (which also reach the chains) stop every chain with a final checkpoint (see def handle_stop_signals)
+		with self.handle_stop_signals(checkpoint_file):
+			try:
+				print("start time was %s" % time.asctime())
+				start_time = time.time()
+				# the time budget is that of the whole run, so chains that wait for a worker get what is left of it
+				deadline = None
+				if run_args['time_budget'] is not None:
+					deadline = start_time + run_args['time_budget']
+				context = multiprocessing.get_context()
+				stop_event = context.Event()
+				chain_steps = context.Array('q', chains)
+				with concurrent.futures.ProcessPoolExecutor(max_workers = min(jobs, chains), mp_context = context, initializer = init_chain_worker, initargs = (stop_event, chain_steps)) as executor:
+					futures = [executor.submit(run_chain, chain, directory, args, deadline) for chain, (directory, args) in enumerate(zip(directories, chain_args))]
+					pending = futures
+					while pending:
+						done, pending = concurrent.futures.wait(pending, timeout = 0.5)
+						self.current_step = min(chain_steps)
+						if self.stop_requested:
+							stop_event.set()
+					results = [future.result() for future in futures]
+			finally:
+				if temp_directory:
+					temp_directory.cleanup()
+		end_time = time.time()
+
+		# stopped chains write no output files; each of them can be resumed from its checkpoint
+		if any(stopped for settings, tallies, stopped in results):
+			self.stopped = True
+			print("stopped; the chains can be resumed from their checkpoints in %s" % ', '.join(directories) if checkpoint_file else "stopped")
+			return
+		print("end time was %s" % time.asctime())
+		print("executed in %ss" % str(round(end_time - start_time, 2)))
+
+		# the posteriors are written from the pooled tallies; the output file 3 lists the samples one chain after another
+		settings = results[0][0]
+		locus_model = settings['locus_model']
+		population, families, all_alleles = self.load_population(settings['file_name'], locus_model, settings['ignore_genotyping_errors'], settings['initial_outcrossing_rate'])
+		tallies = merge_tallies([tallies for settings, tallies, stopped in results])
+		t_list, F_list, ih_list, pop_lnL_list = set_tallies(tallies, families, all_alleles)
+		if(run_args['writeOutput3']):
+			with open('BORICE_output3.txt', 'w') as borice_output3:
+				borice_output3.write(self.OUTPUT_3_HEADER)
+				write_output_3_lines(borice_output3, t_list, F_list, pop_lnL_list)
+		self.write_output_files(population, families, all_alleles, locus_model, t_list, F_list, ih_list, pop_lnL_list, tallies['diagnostics'], tallies['tuners'], run_args['writeOutput2'], run_args['writeOutput4'], run_args['write_summary'])
+
+		#Progress complete
+		self.current_step = max(settings['num_steps'] for settings, tallies, stopped in results) - 1
+
+	def adopt_state(self, state_dict):
+		"""Continues the chain from the state of another chain of parallel tempering.
+		"""
+		# the engine is built again from the state, keeping its heat and random number generator state
+		random_state = self.likelihood.get_random_state()
+		self.chain_state = ChainState.from_dict(state_dict)
+		self.chain_state.restore(self.population, self.all_alleles)
+		self.likelihood = self.ENGINES[self.settings['engine']](self.population, self.settings['locus_model'])
+		self.likelihood.heat = self.heat
+		self.likelihood.set_random_state(random_state)
+
+	def load_population(self, file_name, locus_model, ignore_genotyping_errors, initial_outcrossing_rate):
+		"""Parses a data file, and returns the population, its sorted families and the Allele objects of each locus.
+		"""
 		with open(file_name, 'r') as input:
 			try:
 				marker_names, families = parse_csv(input, ',')	
@@ -90,15 +830,8 @@ class Application(object):
 		index = 0
 		for marker in marker_names:
 			null = locus_model[index]
-			# alleles at each locus are identified and missing values eliminated
-			num_alleles = marker[1]
-			unique_alleles = set(num_alleles)
-			unique_alleles.discard(-9)
-			#unique_alleles.discard(0)
-			# allele list is created and sorted
-			sorted_alleles = [0] # need to start the list with zero here; 0 is the null allele (not observed)
-			al = list(sorted(unique_alleles))
-			sorted_alleles.extend(al)
+			# the allele list of each locus was built by parse_csv; allele zero is the null allele (not observed)
+			sorted_alleles = marker[1]
 			sorted_alleles_all_loci.append(sorted_alleles)
 			# initial allele frequencies are set
 			if null:
@@ -107,7 +840,7 @@ class Application(object):
 				assert freq
 				af = [] # the initial allele frequency list; allele zero is the null allele
 			else:
-				alleles = len(unique_alleles)
+				alleles = len(sorted_alleles) - 1
 				freq = 1.0 / alleles
 				assert freq
 				af = [0.0] # if no null allele, then allele zero has a frequency of zero
@@ -121,11 +854,7 @@ class Application(object):
 			index = index + 1
 		assert len(sorted_alleles_all_loci) == len(allele_freq_all_loci) == len(initial_y_values_all_loci)
 		population = Population(sorted_alleles_all_loci, allele_freq_all_loci, initial_y_values_all_loci, initial_outcrossing_rate)
-		
-		#print(population.allele_list)
-		#print(population.allele_freq_list)
-		#print(population.y_values)
-		
+
 		all_alleles = []
 		for n, locus in enumerate(population.allele_list):
 			alleles = population.allele_list[n]
@@ -138,307 +867,27 @@ class Application(object):
 		families = sorted(families)
 		# calls the function to initially impute maternal genotypes; also lists families in a population
 		for fam in families:
-			fam.infer_mom(locus_model, ignore_genotyping_errors) #this gives the initial inference of missing maternal loci; tags loci as imputed
+			fam.infer_mom(locus_model, ignore_genotyping_errors, population.allele_list) #this gives the initial inference of missing maternal loci; tags loci as imputed
 			fam.population_name = population
-			population.family_list.append(fam)
-			#print(fam)
-			#mom_lnL = fam.calc_mom_lnL()
-			#print("Log-likelihood of mom = %s" % mom_lnL)
-			#progeny_lnL = fam.calc_progeny_lnL(population.outcrossing_rate, locus_model)
-			#print("Log-likelihood of progeny = %s" % progeny_lnL)
-			#print("Family = %s mom likelihood = %s progeny likelihood = %s" % (fam.name, mom_lnL, progeny_lnL))
-			# the below function is called here to catch errors in the progeny genotypes prior to imputing parameters
-			#for child in fam.offspring:
-			#	child.calc_prob_offspring_geno(fam.population_name.outcrossing_rate, fam.population_name, fam.mom, is_stepping)
-		
-		#print(population.allele_freq_list)
-		#prev_lnL = population.calc_pop_lnL(locus_model)
-		#print("Log-likelihood of data = %s" % prev_lnL)
-		
+			population.add_family(fam)
+
 		# creates a list of lists for each family for storage of imputed genotypes at each locus
 		for fam in families:
 			for n, locus in enumerate(fam.mom.genotype_list):
 				fam.locus_genotypes.append([])
 				fam.possible_genotypes.append([])
 
-		#creates four output files
+		return population, families, all_alleles
+
+	def write_output_files(self, population, families, all_alleles, locus_model, t_list, F_list, ih_list, pop_lnL_list, chain_diagnostics, chain_tuners, writeOutput2, writeOutput4, write_summary = WRITE_SUMMARY):
+		"""Writes the posterior distributions of a run to the output files 1, 2 and 4.
+		"""
 		borice_output1 = open('BORICE_output1.txt', 'w')
 		if(writeOutput2):
 			borice_output2 = open('BORICE_output2.txt', 'w')
-		if(writeOutput3):
-			borice_output3 = open('BORICE_output3.txt', 'w')
-			borice_output3.write("List of t, F, and ln likelihoood values from every 10 steps in the chain beyond the burn-in\nt\tF\tLn Likelihood of the Data\n")
 		if(writeOutput4):
 			borice_output4 = open('BORICE_output4.txt', 'w')
-	
-		# below lists needed for storage of t, ih, and F before output to text files
-		t_list = []
-		ih_list = []
-		F_list = []
-		pop_lnL_list = []
-		
-		print("start time was %s" % time.asctime())
-		start_time = time.time()
-		
-		# below is the code to perform Bayesian inference of outcrossing rate (t), inbreeding history, allele frequencies, maternal genotypes
-		for step in range(num_steps):
-			if step != 0:
-				self.current_step = step - 1
-			
-			prev_t = population.outcrossing_rate
-			prev_lnL = population.calc_pop_lnL(locus_model)
-			#print(prev_lnL)
-			# changes outcrossing rate
-			t_prime = (prev_t + ((random.random() - 0.5) * float(outcrossing_rate_tuning_parameter)))
-			if t_prime < 0.0:
-				t_prime = (0.0 - t_prime)
-			if t_prime > 1.0:
-				t_prime = (2.0 - t_prime)
-			population.outcrossing_rate = t_prime
-			#print(population.outcrossing_rate)
-			lnL = population.calc_pop_lnL(locus_model)
-			#print(lnL)
-			if (lnL == float('-inf')):
-				population.outcrossing_rate = prev_t
-				prev_lnL = prev_lnL
-				#print("1")
-			else:
-				lnL_ratio = (lnL - prev_lnL)
-				if (lnL_ratio > 0):
-					prev_t = population.outcrossing_rate
-					prev_lnL = lnL
-					#print("2")
-				else:
-					random_number = random.random()
-					value = math.exp(lnL_ratio)
-					if (random_number < value):
-						prev_t = population.outcrossing_rate
-						prev_lnL = lnL
-						#print("2")
-					else:
-						population.outcrossing_rate = prev_t
-						prev_lnL = prev_lnL
-						#print("1")
-	
-			if step > burn_in:
-				if (step % 10) == 0:
-					t_list.append(population.outcrossing_rate)
-					if(writeOutput3):
-						borice_output3.write("%.2f" % population.outcrossing_rate + "\t")
-			
-			# changes inbreeding history
-			population.calc_ih_prob()
-			f_list = []
-			for fam in families:
-				#print(fam)
-				prev_ih = fam.inbreeding_history
-				#print(prev_ih)
-				prev_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
-				#print(prev_f)
-				prev_mom_lnL = fam.mom.calc_prob_mom_geno(fam.population_name)
- 				#print(prev_mom_lnL)
- 				
-				rand_num = random.random()
-				cumulative_prob = 0
-				ih_value = 0
-				i = 0
-				# choose new inbreeding history value
-				while i == 0:
-					cumulative_prob = cumulative_prob + population.ih_prob_list[ih_value]
-					if rand_num < cumulative_prob:
-						new_ih = ih_value
-						i = 1
-					else:
-						ih_value = ih_value + 1
- 		
-				fam.inbreeding_history = new_ih
-				#print(fam.inbreeding_history)
-				new_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
-				#print(new_f)
-				lnL = fam.mom.calc_prob_mom_geno(fam.population_name)
-				#print(lnL)
-				if (lnL == float('-inf')):
-					fam.inbreeding_history = prev_ih
-					prev_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
-					f_list.append(prev_f)
-					#print("1")
-				else:
-					lnL_ratio = (lnL - prev_mom_lnL)
-					if (lnL_ratio > 0):
-						prev_ih = fam.inbreeding_history
-						new_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
-						f_list.append(new_f)
-						#print("2")
-					else:
-						rand = random.random()
-						value = math.exp(lnL_ratio)
-						if (rand < value):
-							prev_ih = fam.inbreeding_history
-							new_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
-							f_list.append(new_f)
-							#print("2")
-						else:
-							fam.inbreeding_history = prev_ih
-							prev_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
-							f_list.append(prev_f)
-							#print("1")
-		
-				if step > burn_in:
-					if (step % 10) == 0:
-						ih_list.append(fam.inbreeding_history)
-						fam.inbreeding_history_list.append(fam.inbreeding_history)
- 			
-			pop_inbreeding_coefficient = sum(f_list)/len(f_list)
-
-			if step > burn_in:
-				if (step % 10) == 0:
-					F_list.append(pop_inbreeding_coefficient)
-					if(writeOutput3):
-						borice_output3.write("%.2f" % pop_inbreeding_coefficient + "\t")
-
-			del population.ih_prob_list[:]
-			
-			if (step % 10) == 0:
-				# changes allele frequencies
-				for locus_index, locus in enumerate(all_alleles):
-					allele_freq = population.allele_freq_list[locus_index]
-					prev_allele_freq = list(allele_freq)
-					#print(prev_allele_freq)
-					locus_alleles = all_alleles[locus_index]
-					null = locus_model[locus_index]
-					if null:
-						random_allele = random.randint(0, len(locus_alleles) - 1)
-						allele = locus_alleles[random_allele]
-					elif len(allele_freq) == 1: # this is to account for single-offspring families with missing data at a locus with no null alleles
-						continue
-					else:
-						random_allele = random.randint(1, len(locus_alleles) - 1) # skips allele zero, which should remain at a frequency of zero with no null alleles
-						allele = locus_alleles[random_allele]
-						#print(allele)
-						
-					prev_y = allele.y
-					#print(prev_y)
-					prev_lnL = population.calc_pop_lnL(locus_model)
-					#print(prev_lnL)
-					new_y = (prev_y + ((random.random() - 0.5) * float(allele_freq_tuning_parameter)))
-					if new_y < 0:
-						new_y = (0.0 - new_y)
-					allele.y = new_y
-					#print(allele.y)
-					new_af_list = population.calculate_new_af_list(locus_alleles, locus_index, step, burn_in, locus_model)
-					#print(new_af_list)
-					#calculates new lnL based on new allele frequencies
-					population.allele_freq_list[locus_index] = new_af_list	
-					lnL = population.calc_pop_lnL(locus_model)
-					#print(lnL)
-					population.y_values[locus_index] = []
-				
-					# decide to step forward or back based on value
-					if (lnL == float('-inf')):
-						population.allele_freq_list[locus_index] = prev_allele_freq
-						allele.y = prev_y
-						prev_lnL = prev_lnL
-						#print("1")
-					else:
-						value = math.exp(lnL - prev_lnL) * math.exp(prev_y - new_y)
-						if (value > 1):
-							prev_y = allele.y
-							prev_lnL = lnL
-							#print("2")
-						else:
-							random_number = random.random()
-							if (random_number < value):
-								prev_y = allele.y
-								prev_lnL = lnL
-								#print("2")
-							else:
-								population.allele_freq_list[locus_index] = prev_allele_freq
-								allele.y = prev_y
-								prev_lnL = prev_lnL
-								#print("1")
-			
-			#changes the genotype at a random maternal locus
-			for fam in families:
-				#print(fam)
-				# returns a tuple containing three lists; the first is the list of imputed genotypes 
-				# the second the alleles, and the third the allele frequencies at those imputed loci
-				imputed = fam.mom.get_imputed_loci(fam.population_name)
-				imputed_genotypes = imputed[0]
-				imputed_alleles = imputed[1]
-				imputed_af_list = imputed[2]
-				
-				# determines if there are imputed genotypes; if so, new genotypes are tried and
-				# likelihood values calculated for each family
-				if (len(imputed_genotypes) == 0):
-					continue # if no imputed genotypes are present, go on to the next family
-				else:
-					# one locus at a time is changed in each family; locus chosen randomly
-					random_locus = random.randint(0, len(imputed_genotypes) - 1)
-					genotype = imputed_genotypes[random_locus]
-					allele_list = imputed_alleles[random_locus]
-					allele_freq = imputed_af_list[random_locus]
-		
-					prev_first = genotype.first
-					#print(prev_first)
-					prev_second = genotype.second
-					#print(prev_second)
-					prev_fam_lnL = fam.calc_progeny_lnL(population.outcrossing_rate, locus_model)
-					#print(prev_fam_lnL)
-					# returns a tuple with new maternal alleles = (new_first, new_second)
-					new_mom = genotype.impute_new_mom(allele_list, allele_freq, fam.mom.inbreeding_coefficient, random_locus, locus_model)
-					new_first = new_mom[0]
-					new_second = new_mom[1]
-		
-					# sets new maternal alleles and calculates family lnL
-					genotype.first = new_first
-					genotype.second = new_second
-					#print(genotype.first)
-					#print(genotype.second)
-					new_fam_lnL = fam.calc_progeny_lnL(population.outcrossing_rate, locus_model)
-					#print(new_fam_lnL)
-					if (new_fam_lnL == float('-inf')):
-						genotype.first = prev_first
-						genotype.second = prev_second
-						#print("1")
-					else:
-						fam_lnL_ratio = (new_fam_lnL - prev_fam_lnL)
-						if (fam_lnL_ratio > 0):
-							prev_first = genotype.first
-							prev_second = genotype.second
-							#print("2")
-						else:
-							rand = random.random()
-							value = math.exp(fam_lnL_ratio)
-							if (rand < value):
-								prev_first = genotype.first
-								prev_second = genotype.second
-								#print("2")
-							else:
-								genotype.first = prev_first
-								genotype.second = prev_second
-								#print("1")
-								
-		
-				for n, genotype in enumerate(fam.mom.genotype_list):
-					if str(genotype) not in fam.possible_genotypes[n]:
-						fam.possible_genotypes[n].append(str(genotype))
-		
-				if step > burn_in:
-					if (step % 10) == 0:
-						for n, genotype in enumerate(fam.mom.genotype_list):
-							fam.locus_genotypes[n].append(str(fam.mom.genotype_list[n]))
-
-			if step > burn_in:
-				if (step % 10) == 0:
-					pop_lnL_list.append(population.calc_pop_lnL(locus_model))
-					if(writeOutput3):
-						borice_output3.write("%.6f" % population.calc_pop_lnL(locus_model) + "\n")
 
-		end_time = time.time()
-		print("end time was %s" % time.asctime())
-		print("executed in %ss" % str(round(end_time - start_time, 2)))
-
-		# main code dealing with file output begins here
 		borice_output1.write("Posterior distribution of population inbreeding history:\n")
 
 		for ih_value in range(0, 7):
@@ -483,7 +932,7 @@ class Application(object):
 			else:
 				continue
 		
-		t_list.sort()
+		t_list = sorted(t_list)
 		t_lower = int(len(t_list) * 0.025)
 		t_lower_percentile = t_list[t_lower]
 		t_upper = int(len(t_list) * 0.975)
@@ -501,7 +950,7 @@ class Application(object):
 			else:
 				continue
 
-		F_list.sort()
+		F_list = sorted(F_list)
 		F_lower = int(len(F_list) * 0.025)
 		F_lower_percentile = F_list[F_lower]
 		F_upper = int(len(F_list) * 0.975)
@@ -511,21 +960,11 @@ class Application(object):
 		mean_F = (sum_F/total_F)
 		borice_output1.write("Mean F = %.2f; F-max = %.2f; 2.5 percentile = %.2f; 97.5 percentile = %.2f\n\n" % (mean_F, F_max, F_lower_percentile, F_upper_percentile))
 		
-		new_likelihoods = []
 		sum_ln_likelihoods = math.fsum(pop_lnL_list)
 		total_n = len(pop_lnL_list)
 		arithmetic_mean = (sum_ln_likelihoods/total_n)
 		borice_output1.write("Ave LL = %s\n" % arithmetic_mean)
-# 		for n, ln_likelihood in enumerate(pop_lnL_list):
-# 			new_likelihood = Decimal(-(ln_likelihood)).exp()
-# 			new_likelihoods.append(new_likelihood)
-# 		new_sum = sum(new_likelihoods)
-# 		reciprocal_n = math.pow(total_n, -1)
-# 		new_reciprocal_n = Decimal(reciprocal_n)
-# 		reciprocal_harmonic = new_sum * new_reciprocal_n
-# 		harmonic_mean = Decimal(1/reciprocal_harmonic)
-# 		borice_output1.write("Harmonic mean of likelihood values = %s\n" % harmonic_mean)
-		
+
 		if(writeOutput2):
 			borice_output2.write("\nPosterior distributions of maternal inbreeding histories:\n")
 
@@ -596,19 +1035,207 @@ class Application(object):
 				possible_genotype_list = fam.possible_genotypes[n]
 				locus_list = fam.locus_genotypes[n]
 				for i, genotype in enumerate(possible_genotype_list):
-					genotype_count = locus_list.count(str(genotype))
+					genotype_count = locus_list.count(genotype)
 					genotype_percent = float(genotype_count)/len(locus_list)
 					if(writeOutput4):
-						borice_output4.write("possible genotype = \t%s\tproportion =\t%.2f\n" % (genotype, genotype_percent))
-		
-		#Progress complete
-		self.current_step += 1
-		
+						borice_output4.write("possible genotype = \t%s\tproportion =\t%.2f\n" % (get_genotype_name(genotype, population.allele_list[n]), genotype_percent))
+
+		summaries = summarize_chains(chain_diagnostics)
+		borice_output1.write("\nConvergence diagnostics:\n")
+		borice_output1.write("\nESS is the effective sample size and MC SE the Monte Carlo standard error of the posterior mean, from the batch means of each chain.\nSplit R-hat compares the first and second halves of each chain; values close to 1 mean the chain(s) converged. NA values could not be estimated.\n\n")
+		for chain, diagnostics in enumerate(chain_diagnostics):
+			chain_name = "Chain %s" % (chain + 1) if len(chain_diagnostics) > 1 else "Chain"
+			burn_in_kind = {None: "fixed", True: "detected automatically", False: "automatic, but the chain did not become stationary"}[diagnostics.burn_in_detected]
+			if diagnostics.burn_in_stop_reason:
+				burn_in_kind = "%s, ended early by the %s" % (burn_in_kind, diagnostics.burn_in_stop_reason)
+			borice_output1.write("%s ran %s steps (stopped by %s), with a burn-in of %s steps (%s)\n" % (chain_name, diagnostics.steps, diagnostics.stop_reason or "number of steps", diagnostics.burn_in, burn_in_kind))
+		borice_output1.write("\n")
+		borice_output1.write("Parameter\tMean\tSD\tESS\tMC SE\tSplit R-hat\n")
+		write_diagnostics_line(borice_output1, "t", summaries['t'])
+		write_diagnostics_line(borice_output1, "F", summaries['F'])
+		write_diagnostics_line(borice_output1, "ln likelihood", summaries['lnL'])
+		for locus_index, locus_alleles in enumerate(all_alleles):
+			for n, allele in enumerate(locus_alleles):
+				if n == 0 and not locus_model[locus_index]: # skips allele zero, which is a dummy allele that remains at a frequency of zero
+					continue
+				write_diagnostics_line(borice_output1, "Locus %s Allele %s" % (locus_index + 1, allele.name), summaries['allele_freqs'][locus_index][n])
+
+		borice_output1.write("\nProposal tuning:\n")
+		borice_output1.write("\nTuning parameters of the t and y value moves after the burn-in, and the fraction of their proposals accepted after the burn-in; for the maternal genotype move, the fraction of its updates that changed the genotype.\n\n")
+		borice_output1.write("Chain\tMove\tTuning Parameter\tAcceptance Rate\n")
+		for chain, tuners in enumerate(chain_tuners):
+			write_tuning_line(borice_output1, chain + 1, "t", tuners['t'])
+			for locus_index, tuner in enumerate(tuners['y']):
+				write_tuning_line(borice_output1, chain + 1, "Locus %s y" % (locus_index + 1), tuner)
+			# the swaps of parallel tempering are listed with the heat of the hotter chain of each pair as their tuning parameter
+			for colder_tuner, tuner in zip([None] + tuners['swaps'], tuners['swaps']):
+				write_tuning_line(borice_output1, chain + 1, "Swap heats %.4g and %.4g" % (colder_tuner.scale if colder_tuner else 1.0, tuner.scale), tuner)
+			write_tuning_line(borice_output1, chain + 1, "Maternal genotypes", tuners['mom'])
+
+		# the same diagnostics, for other programs
+		if write_summary:
+			summaries['chains'] = len(chain_diagnostics)
+			summaries['steps'] = [diagnostics.steps for diagnostics in chain_diagnostics]
+			summaries['stop_reasons'] = [diagnostics.stop_reason for diagnostics in chain_diagnostics]
+			summaries['burn_in'] = [diagnostics.burn_in for diagnostics in chain_diagnostics]
+			summaries['burn_in_detected'] = [diagnostics.burn_in_detected for diagnostics in chain_diagnostics]
+			summaries['burn_in_stop_reasons'] = [diagnostics.burn_in_stop_reason for diagnostics in chain_diagnostics]
+			summaries['tuning'] = [{'t': {'tuning_parameter': tuners['t'].scale, 'acceptance_rate': tuners['t'].calc_acceptance_rate()}, 'y': [{'tuning_parameter': tuner.scale, 'acceptance_rate': tuner.calc_acceptance_rate()} for tuner in tuners['y']], 'swaps': [{'heat': tuner.scale, 'acceptance_rate': tuner.calc_acceptance_rate()} for tuner in tuners['swaps']], 'mom': {'acceptance_rate': tuners['mom'].calc_acceptance_rate()}} for tuners in chain_tuners]
+			summaries['allele_freqs'] = [{str(allele.name): summary for n, (allele, summary) in enumerate(zip(locus_alleles, locus_summaries)) if n > 0 or null} for locus_alleles, locus_summaries, null in zip(all_alleles, summaries['allele_freqs'], locus_model)]
+			with open('BORICE_summary.json', 'w') as summary_file:
+				json.dump(summaries, summary_file, indent = '\t')
+
 		borice_output1.close()
 		if(writeOutput2):
 			borice_output2.close()
-		if(writeOutput3):
-			borice_output3.close()
 		if(writeOutput4):
 			borice_output4.close()
 
+def check_stopping_rules(diagnostics, target_ess, target_mcse, deadline, min_samples):
+	"""Returns the stopping rule met by a chain from its convergence diagnostics, or None.
+	"""
+	# batch means estimates of the first few samples are unreliable, so the targets wait for min_samples samples
+	if deadline is not None and time.time() >= deadline:
+		return "time budget"
+	parameters = [diagnostics.outcrossing_rate, diagnostics.inbreeding_coefficient]
+	if parameters[0].count < min_samples:
+		return None
+	if target_ess:
+		ess_list = [parameter.calc_ess() for parameter in parameters]
+		if all(ess is not None and ess >= target_ess for ess in ess_list):
+			return "target ESS"
+	if target_mcse:
+		mcse_list = [parameter.calc_mcse() for parameter in parameters]
+		if all(mcse is not None and mcse <= target_mcse for mcse in mcse_list):
+			return "target MC SE"
+	return None
+
+def update_outcrossing_rate_grid(population, likelihood, state, heat, grid_size):
+	"""Steps the outcrossing rate with a Metropolized griddy Gibbs move, and returns whether it was accepted.
+	"""
+	# t is drawn from a grid of its conditional posterior; the Metropolis-Hastings test corrects for the grid
+	prev_t = population.outcrossing_rate
+	state.get_lnL(likelihood, prev_t)
+	grid_lnL = heat * np.asarray(likelihood.calc_progeny_lnL_grid((np.arange(grid_size) + 0.5) / grid_size), dtype = float)
+	max_lnL = grid_lnL.max()
+	if max_lnL == -np.inf:
+		return False
+	cell_lnL = grid_lnL - (max_lnL + math.log(np.exp(grid_lnL - max_lnL).sum()))
+	cell = min(int(np.searchsorted(np.cumsum(np.exp(cell_lnL)), random.random(), side = 'right')), grid_size - 1)
+	t_prime = (cell + random.random()) / grid_size
+	lnL_components = likelihood.calc_pop_lnL_components(t_prime)
+	if lnL_components[0] == float('-inf'):
+		return False
+	prev_cell = min(int(prev_t * grid_size), grid_size - 1)
+	lnL_ratio = heat * (lnL_components[1] - state.progeny_lnL) + (cell_lnL[prev_cell] - cell_lnL[cell])
+	if lnL_ratio > 0 or random.random() < math.exp(lnL_ratio):
+		population.outcrossing_rate = t_prime
+		state.set_lnL(lnL_components)
+		return True
+	return False
+
+def write_diagnostics_line(output, name, summary):
+	"""Writes the convergence diagnostics of a parameter to the output file 1.
+	"""
+	values = [summary['mean'], summary['sd'], summary['ess'], summary['mcse'], summary['split_rhat']]
+	formats = ["%.4f", "%.4f", "%.0f", "%.5f", "%.3f"]
+	output.write(name + "\t" + "\t".join("NA" if value is None else format % value for value, format in zip(values, formats)) + "\n")
+
+def write_tuning_line(output, chain, name, tuner):
+	"""Writes the tuning parameter and acceptance rate of a move to the output file 1.
+	"""
+	acceptance_rate = tuner.calc_acceptance_rate()
+	output.write("%s\t%s\t%s\t%s\n" % (chain, name, "NA" if tuner.scale is None else "%.4g" % tuner.scale, "NA" if acceptance_rate is None else "%.3f" % acceptance_rate))
+
+def get_tallies(t_list, F_list, pop_lnL_list, diagnostics, tuners, families, all_alleles):
+	"""Returns the posterior tallies of a chain.
+	"""
+	tallies = {'t_list': t_list, 'F_list': F_list, 'pop_lnL_list': pop_lnL_list, 'diagnostics': [diagnostics], 'tuners': [tuners]}
+	tallies['families'] = [(fam.inbreeding_history_list, fam.locus_genotypes, fam.possible_genotypes) for fam in families]
+	tallies['af_lists'] = [[allele.af_list for allele in locus_alleles] for locus_alleles in all_alleles]
+	return tallies
+
+def set_tallies(tallies, families, all_alleles):
+	"""Copies posterior tallies into the families and alleles, and returns the sampled t, F, inbreeding history and ln likelihood lists.
+	"""
+	for fam, (inbreeding_history_list, locus_genotypes, possible_genotypes) in zip(families, tallies['families']):
+		fam.inbreeding_history_list = inbreeding_history_list
+		fam.locus_genotypes = locus_genotypes
+		fam.possible_genotypes = possible_genotypes
+	for locus_alleles, af_lists in zip(all_alleles, tallies['af_lists']):
+		for allele, af_list in zip(locus_alleles, af_lists):
+			allele.af_list = af_list
+	ih_list = [ih for sample in zip(*[fam.inbreeding_history_list for fam in families]) for ih in sample]
+	return tallies['t_list'], tallies['F_list'], ih_list, tallies['pop_lnL_list']
+
+def write_output_3_lines(borice_output3, t_list, F_list, pop_lnL_list):
+	"""Writes sampled t, F and ln likelihood values to the output file 3.
+	"""
+	for t, F, pop_lnL in zip(t_list, F_list, pop_lnL_list):
+		borice_output3.write("%.2f\t%.2f\t%.6f\n" % (t, F, pop_lnL))
+
+def merge_tallies(tallies_list):
+	"""Pools the posterior tallies of several chains, one chain after another.
+	"""
+	merged = {'t_list': [], 'F_list': [], 'pop_lnL_list': [], 'diagnostics': [], 'tuners': [], 'families': None, 'af_lists': None}
+	for tallies in tallies_list:
+		merged['diagnostics'].extend(tallies['diagnostics'])
+		merged['tuners'].extend(tallies['tuners'])
+		merged['t_list'].extend(tallies['t_list'])
+		merged['F_list'].extend(tallies['F_list'])
+		merged['pop_lnL_list'].extend(tallies['pop_lnL_list'])
+		if merged['families'] is None:
+			merged['families'] = [([], [[] for locus in locus_genotypes], [list(locus) for locus in possible_genotypes]) for inbreeding_history_list, locus_genotypes, possible_genotypes in tallies['families']]
+			merged['af_lists'] = [[[] for af_list in af_lists] for af_lists in tallies['af_lists']]
+		for (merged_ih_list, merged_locus_genotypes, merged_possible_genotypes), (inbreeding_history_list, locus_genotypes, possible_genotypes) in zip(merged['families'], tallies['families']):
+			merged_ih_list.extend(inbreeding_history_list)
+			for merged_locus, locus in zip(merged_locus_genotypes, locus_genotypes):
+				merged_locus.extend(locus)
+			for merged_locus, locus in zip(merged_possible_genotypes, possible_genotypes):
+				merged_locus.extend(genotype for genotype in locus if genotype not in merged_locus)
+		for merged_af_lists, af_lists in zip(merged['af_lists'], tallies['af_lists']):
+			for merged_af_list, af_list in zip(merged_af_lists, af_lists):
+				merged_af_list.extend(af_list)
+	return merged
+
+# the stop event and progress array shared by the chains of Application.run_chains (see def init_chain_worker)
+chain_stop_event = None
+chain_progress = None
+
+def init_chain_worker(stop_event, chain_steps):
+	"""Keeps the stop event and the progress array of Application.run_chains in a worker process.
+	"""
+	global chain_stop_event, chain_progress
+	chain_stop_event = stop_event
+	chain_progress = chain_steps
+
+def run_heated_chain(settings, heat, swap_interval, connection):
+	"""Runs a heated chain of parallel tempering in a worker process.
+	"""
+	app = Application()
+	app.settings = settings
+	with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+		app.start_chain(settings, None, heat)
+		app._run_steps(None, None, swap_interval, swap_connection = connection)
+
+def run_chain(chain, directory, run_args, deadline = None):
+	"""Runs one chain of Application.run_chains in its directory, and returns its settings, tallies and whether it was stopped.
+	"""
+	# a monitor thread reports the progress of the chain and passes a stop of the pooled run on to it
+	if deadline is not None:
+		run_args = dict(run_args, time_budget = max(0.0, deadline - time.time()))
+	os.chdir(directory)
+	app = Application()
+	done = threading.Event()
+	def monitor():
+		while not done.wait(0.5):
+			chain_progress[chain] = app.getStep()
+			if chain_stop_event.is_set():
+				app.request_stop()
+	threading.Thread(target = monitor, daemon = True).start()
+	try:
+		with open('BORICE_log.txt', 'w') as log, contextlib.redirect_stdout(log):
+			app.run(**run_args)
+	finally:
+		done.set()
+	return app.settings, app.tallies, app.stopped
@@ -0,0 +1,623 @@
+import math
+
+import numpy as np
+
+from .engine import *
+from . import kernels
+
+# inbreeding coefficient of each inbreeding history value (see Individual.calc_inbreeding_coefficient)
+INBREEDING_COEFFICIENTS = np.array([1.0 - math.pow(0.5, ih) for ih in range(0, 6)] + [1.0])
+
+class ArrayEngine(Engine):
+	"""An ArrayEngine calculates the likelihood of a population with NumPy arrays of its offspring patterns and moms.
+	"""
+	# given t and the allele frequencies, families are independent, so all of them are stepped at once in one batch
+	# the batched steps draw from a NumPy generator, so the chain differs from the reference chain but samples the same posterior
+	def __init__(self, population, null_loci, seed = None):
+		self.population = population
+		self.families = population.family_list
+		self.rng = np.random.default_rng(seed)
+		num_families = len(self.families)
+		num_loci = len(population.allele_list)
+		self.num_loci = num_loci
+		self.null = np.array([bool(null_loci[n]) for n in range(num_loci)])
+
+		# allele indices, family, count and missing-data mask of the offspring patterns; rows are patterns, not offspring
+		# the patterns of a family are consecutive rows, which self.family_offspring maps each family to
+		offspring_alleles = []
+		offspring_family = []
+		offspring_count = []
+		self.family_offspring = {}
+		for f, family in enumerate(self.families):
+			first_row = len(offspring_family)
+			for offspring, count in zip(family.patterns, family.pattern_counts):
+				offspring_alleles.append([(genotype.first, genotype.second) for genotype in offspring.genotype_list])
+				offspring_family.append(f)
+				offspring_count.append(count)
+			self.family_offspring[family] = slice(first_row, len(offspring_family))
+		self.offspring_alleles = np.array(offspring_alleles, dtype = np.int64).reshape(len(offspring_family), num_loci, 2)
+		self.offspring_family = np.array(offspring_family, dtype = np.int64)
+		self.offspring_count = np.array(offspring_count, dtype = float)
+		self.missing = (self.offspring_alleles[:, :, 0] == -9)
+		# patterns with data at each locus; missing loci keep a factor of 0.0 and are never recalculated
+		self.observed_offspring = [np.flatnonzero(~self.missing[:, n]) for n in range(num_loci)]
+
+		# maternal allele indices; loci without a maternal genotype (single-offspring families with missing data) are masked
+		self.mom_alleles = np.zeros((num_families, num_loci, 2), dtype = np.int64)
+		self.no_mom = np.zeros((num_families, num_loci), dtype = bool)
+		self.imputed = np.zeros((num_families, num_loci), dtype = bool)
+		self.observed_imputed = np.zeros((num_families, num_loci), dtype = bool)
+		for f, family in enumerate(self.families):
+			for n, genotype in enumerate(family.mom.genotype_list):
+				if genotype == None:
+					self.no_mom[f, n] = True
+				else:
+					self.mom_alleles[f, n] = (genotype.first, genotype.second)
+					self.imputed[f, n] = genotype.imputed
+					self.observed_imputed[f, n] = genotype.observed_imputed
+
+		# families with imputed maternal loci, their imputed loci (padded) and their offspring
+		imputed_families = [f for f, family in enumerate(self.families) if family.imputed_loci]
+		self.imputed_families = np.array(imputed_families, dtype = np.int64)
+		self.num_imputed_loci = np.array([len(self.families[f].imputed_loci) for f in imputed_families], dtype = np.int64)
+		self.imputed_loci = np.zeros((len(imputed_families), num_loci), dtype = np.int64)
+		for i, f in enumerate(imputed_families):
+			loci = self.families[f].imputed_loci
+			self.imputed_loci[i, :len(loci)] = loci
+		imputed_position = np.full(num_families, -1, dtype = np.int64)
+		imputed_position[self.imputed_families] = np.arange(len(imputed_families))
+		self.imputed_offspring = np.flatnonzero(imputed_position[self.offspring_family] >= 0)
+		self.imputed_offspring_family = imputed_position[self.offspring_family[self.imputed_offspring]]
+		self.recorded_possible_genotypes = False
+
+		# allele frequencies of every locus, padded with zeros; cumulative frequencies are padded with inf so padding is never drawn
+		max_alleles = max(len(allele_list) for allele_list in population.allele_list)
+		self.num_alleles = np.array([len(allele_list) for allele_list in population.allele_list], dtype = np.int64)
+		self.allele_freq = np.zeros((num_loci, max_alleles))
+		self.cumulative_allele_freq = np.full((num_loci, max_alleles), np.inf)
+		for n in range(num_loci):
+			self.set_allele_freq(n)
+
+		self.inbreeding_history = np.array([family.inbreeding_history for family in self.families], dtype = np.int64)
+		self.inbreeding_coefficient = INBREEDING_COEFFICIENTS[self.inbreeding_history]
+
+		# maternal genotype count table (loci x genotype codes x inbreeding histories) and the alleles of each genotype code
+		self.genotype_second = np.repeat(np.arange(max_alleles), np.arange(1, max_alleles + 1))
+		self.genotype_first = np.concatenate([np.arange(second + 1) for second in range(max_alleles)])
+		self.mom_counts = np.zeros((num_loci, len(self.genotype_first), len(INBREEDING_COEFFICIENTS)))
+		self.stale_mom_loci = set()
+		# ln probabilities of the maternal genotypes under every inbreeding history (families x loci x inbreeding histories), built on first use
+		self.ih_factors = None
+		self.stale_ih_factors = np.ones((num_families, num_loci), dtype = bool)
+		# possible maternal genotypes at the imputed loci (families x imputed loci, padded, x genotype codes), built on first use
+		self.compatible_genotypes = None
+		self.refresh()
+
+	def set_allele_freq(self, locus):
+		"""Copies the allele frequencies of a locus from the population.
+		"""
+		allele_freq = self.population.allele_freq_list[locus]
+		self.allele_freq[locus, :len(allele_freq)] = allele_freq
+		self.cumulative_allele_freq[locus, :len(allele_freq)] = np.cumsum(allele_freq)
+
+	def refresh(self):
+		"""Recalculates the ln factors and their sums for every offspring and mom at every locus.
+		"""
+		num_offspring = len(self.offspring_family)
+		offspring, loci = np.nonzero(~self.missing)
+		families = self.offspring_family[offspring]
+		selfing, outcrossing = self.calc_offspring_factors(offspring, loci, self.mom_alleles[families, loci, 0], self.mom_alleles[families, loci, 1], self.no_mom[families, loci])
+		self.selfing_factors = np.zeros((num_offspring, self.num_loci))
+		self.selfing_factors[offspring, loci] = calc_log_probs(selfing)
+		self.outcrossing_factors = np.zeros((num_offspring, self.num_loci))
+		self.outcrossing_factors[offspring, loci] = calc_log_probs(outcrossing)
+		self.selfing_lnL = calc_row_sums(self.selfing_factors)
+		self.outcrossing_lnL = calc_row_sums(self.outcrossing_factors)
+		self.mom_factors, self.mom_lnL = self.calc_mom_lnL(self.inbreeding_coefficient)
+		num_families = len(self.families)
+		self.mom_counts[:] = 0.0
+		self.count_moms(np.repeat(np.arange(num_families), self.num_loci), np.tile(np.arange(self.num_loci), num_families), 1.0)
+		self.locus_mom_lnL = self.calc_locus_mom_lnL(np.arange(self.num_loci))
+		self.stale_mom_loci.clear()
+		self.stale_ih_factors[:] = True
+
+	def count_moms(self, families, loci, weight):
+		"""Adds a weight (1.0 or -1.0) to the count table entries of a set of (family, locus) pairs.
+		"""
+		codes = calc_genotype_codes(self.mom_alleles[families, loci, 0], self.mom_alleles[families, loci, 1])
+		np.add.at(self.mom_counts, (loci, codes, self.inbreeding_history[families]), np.where(self.no_mom[families, loci], 0.0, weight))
+
+	def calc_locus_mom_lnL(self, loci):
+		"""Returns the maternal ln likelihood summed over families at each of a set of loci.
+		"""
+		first = self.genotype_first
+		second = self.genotype_second
+		allele_freq = self.allele_freq[loci]
+		probs = calc_mom_probs(first[None, :, None], second[None, :, None], allele_freq[:, first, None], allele_freq[:, second, None], INBREEDING_COEFFICIENTS[None, None, :])
+		counts = self.mom_counts[loci]
+		with np.errstate(invalid = 'ignore'):
+			return np.where(counts > 0.0, counts * calc_log_probs(probs), 0.0).sum(axis = (1, 2))
+
+	def refresh_mom_factors(self):
+		"""Recalculates the maternal factors of every family at the loci whose allele frequencies changed.
+		"""
+		# allele frequency moves only update the count table, so the per-family factors are brought up to date here
+		if not self.stale_mom_loci:
+			return
+		loci = np.array(sorted(self.stale_mom_loci), dtype = np.int64)
+		num_families = len(self.families)
+		families = np.repeat(np.arange(num_families), len(loci))
+		loci = np.tile(loci, num_families)
+		self.mom_factors[families, loci] = calc_log_probs(self.calc_mom_factors(families, loci, self.mom_alleles[families, loci, 0], self.mom_alleles[families, loci, 1], self.inbreeding_coefficient[families]))
+		self.mom_lnL = calc_row_sums(self.mom_factors)
+		self.stale_mom_loci.clear()
+
+	def refresh_ih_factors(self):
+		"""Recalculates the ln probabilities of the maternal genotypes under every inbreeding history where they changed.
+		"""
+		num_histories = len(INBREEDING_COEFFICIENTS)
+		if self.ih_factors is None:
+			self.ih_factors = np.zeros((len(self.families), self.num_loci, num_histories))
+		families, loci = np.nonzero(self.stale_ih_factors)
+		if len(families) == 0:
+			return
+		histories = np.tile(np.arange(num_histories), len(families))
+		families = np.repeat(families, num_histories)
+		loci = np.repeat(loci, num_histories)
+		factors = self.calc_mom_factors(families, loci, self.mom_alleles[families, loci, 0], self.mom_alleles[families, loci, 1], INBREEDING_COEFFICIENTS[histories])
+		self.ih_factors[families, loci, histories] = calc_log_probs(factors)
+		self.stale_ih_factors[:] = False
+
+	def index_compatible_genotypes(self):
+		"""Builds the table of the maternal genotypes possible given the offspring at the imputed loci.
+		"""
+		self.compatible_genotypes = np.zeros(self.imputed_loci.shape + self.genotype_first.shape, dtype = bool)
+		for i, f in enumerate(self.imputed_families.tolist()):
+			family = self.families[f]
+			for j, n in enumerate(family.imputed_loci):
+				compatible = family.mom_compatibility[n].list_compatible(self.num_alleles[n], self.null[n])
+				self.compatible_genotypes[i, j, :len(compatible)] = compatible
+
+	def calc_offspring_factors(self, offspring, loci, mom_first, mom_second, no_mom):
+		"""Returns the single-locus genotype probabilities given selfing and given outcrossing of a set of offspring.
+		"""
+		first = self.offspring_alleles[offspring, loci, 0]
+		second = self.offspring_alleles[offspring, loci, 1]
+		skip = self.missing[offspring, loci] | no_mom
+		# missing data (-9) is not an allele index; any index will do since the locus is skipped
+		first = np.where(skip, 0, first)
+		second = np.where(skip, 0, second)
+		allele_freq = self.allele_freq
+		null = self.null[loci]
+		selfing = calc_selfing_probs(mom_first, mom_second, first, second, null)
+		outcrossing = calc_outcrossing_probs(mom_first, mom_second, first, second, null, allele_freq[loci, first], allele_freq[loci, second], allele_freq[loci, 0])
+		return np.where(skip, 1.0, selfing), np.where(skip, 1.0, outcrossing)
+
+	def calc_mom_factors(self, families, loci, mom_first, mom_second, inbreeding_coefficient):
+		"""Returns the single-locus genotype probabilities of a set of moms given inbreeding coefficients.
+		"""
+		allele_freq = self.allele_freq
+		probs = calc_mom_probs(mom_first, mom_second, allele_freq[loci, mom_first], allele_freq[loci, mom_second], inbreeding_coefficient)
+		return np.where(self.no_mom[families, loci], 1.0, probs)
+
+	def calc_mom_lnL(self, inbreeding_coefficient):
+		"""Returns the single-locus and multilocus ln likelihoods of every mom.
+		"""
+		num_families = len(self.families)
+		families = np.repeat(np.arange(num_families), self.num_loci)
+		loci = np.tile(np.arange(self.num_loci), num_families)
+		factors = self.calc_mom_factors(families, loci, self.mom_alleles[families, loci, 0], self.mom_alleles[families, loci, 1], inbreeding_coefficient[families])
+		factors = calc_log_probs(factors).reshape(num_families, self.num_loci)
+		return factors, calc_row_sums(factors)
+
+	def calc_progeny_lnL(self, family, outcrossing_rate):
+		"""Calculates the ln likelihood value for only the offspring of a family.
+		"""
+		offspring = self.family_offspring[family]
+		return float((self.offspring_count[offspring] * calc_mixture_lnL(outcrossing_rate, self.selfing_lnL[offspring], self.outcrossing_lnL[offspring])).sum())
+
+	def calc_pop_lnL(self, outcrossing_rate):
+		"""Calculates the ln likelihood of the population summed over families.
+		"""
+		return self.calc_pop_lnL_components(outcrossing_rate)[0]
+
+	def calc_pop_lnL_components(self, outcrossing_rate):
+		"""Returns the (total, progeny, maternal) ln likelihood of the population.
+		"""
+		progeny_lnL = (self.offspring_count * calc_mixture_lnL(outcrossing_rate, self.selfing_lnL, self.outcrossing_lnL)).sum()
+		mom_lnL = self.locus_mom_lnL.sum()
+		return float(progeny_lnL + mom_lnL), float(progeny_lnL), float(mom_lnL)
+
+	def calc_progeny_lnL_grid(self, outcrossing_rates):
+		"""Returns the progeny ln likelihood of the population at each of a list of outcrossing rates.
+		"""
+		# the selfing and outcrossing probabilities do not depend on t, so every rate is mixed from them in one pass
+		outcrossing_rates = np.asarray(outcrossing_rates, dtype = float)[:, None]
+		return (self.offspring_count * calc_mixture_lnL(outcrossing_rates, self.selfing_lnL, self.outcrossing_lnL)).sum(axis = 1)
+
+	def update_locus(self, locus):
+		"""Recalculates the likelihood at one locus after its allele frequencies changed, and returns a snapshot for def restore_locus.
+		"""
+		snapshot = (locus, self.allele_freq[locus].copy(), self.cumulative_allele_freq[locus].copy(), self.outcrossing_factors[:, locus].copy(), self.outcrossing_lnL, self.locus_mom_lnL[locus], locus in self.stale_mom_loci, self.stale_ih_factors[:, locus].copy())
+		self.set_allele_freq(locus)
+		offspring = self.observed_offspring[locus]
+		families = self.offspring_family[offspring]
+		loci = np.full(len(offspring), locus)
+		selfing, outcrossing = self.calc_offspring_factors(offspring, loci, self.mom_alleles[families, locus, 0], self.mom_alleles[families, locus, 1], self.no_mom[families, locus])
+		self.outcrossing_factors[offspring, locus] = calc_log_probs(outcrossing)
+		self.outcrossing_lnL = self.outcrossing_lnL.copy()
+		self.outcrossing_lnL[offspring] = calc_row_sums(self.outcrossing_factors[offspring])
+		self.locus_mom_lnL[locus] = self.calc_locus_mom_lnL(np.array([locus]))[0]
+		self.stale_mom_loci.add(locus)
+		self.stale_ih_factors[:, locus] = True
+		return snapshot
+
+	def restore_locus(self, snapshot):
+		"""Undoes a call to def update_locus using the snapshot it returned.
+		"""
+		locus, allele_freq, cumulative_allele_freq, outcrossing_column, self.outcrossing_lnL, self.locus_mom_lnL[locus], stale, self.stale_ih_factors[:, locus] = snapshot
+		self.allele_freq[locus] = allele_freq
+		self.cumulative_allele_freq[locus] = cumulative_allele_freq
+		self.outcrossing_factors[:, locus] = outcrossing_column
+		if not stale:
+			self.stale_mom_loci.discard(locus)
+
+	def accept(self, lnL, prev_lnL):
+		"""Returns the Metropolis acceptance of a batch of proposals from their ln likelihoods.
+		"""
+		random_number = self.rng.random(len(lnL))
+		with np.errstate(over = 'ignore', invalid = 'ignore'):
+			lnL_ratio = (lnL - prev_lnL)
+			return (lnL != -np.inf) & ((lnL_ratio > 0) | (random_number < np.exp(lnL_ratio)))
+
+	def update_inbreeding_histories(self, ih_prob_list):
+		"""Steps the inbreeding history of every family with a Metropolis move.
+		"""
+		self.refresh_mom_factors()
+		cumulative_prob = np.cumsum(ih_prob_list)
+		new_ih = np.searchsorted(cumulative_prob, self.rng.random(len(self.families)), side = 'right')
+		new_ih = np.minimum(new_ih, len(ih_prob_list) - 1)
+		mom_factors, mom_lnL = self.calc_mom_lnL(INBREEDING_COEFFICIENTS[new_ih])
+		accepted = self.accept(mom_lnL, self.mom_lnL)
+		mom_lnL_change = calc_lnL_change(mom_lnL[accepted], self.mom_lnL[accepted])
+		accepted_families = np.repeat(np.flatnonzero(accepted), self.num_loci)
+		accepted_loci = np.tile(np.arange(self.num_loci), np.count_nonzero(accepted))
+		self.count_moms(accepted_families, accepted_loci, -1.0)
+		self.inbreeding_history[accepted] = new_ih[accepted]
+		self.count_moms(accepted_families, accepted_loci, 1.0)
+		self.inbreeding_coefficient = INBREEDING_COEFFICIENTS[self.inbreeding_history]
+		self.mom_factors[accepted] = mom_factors[accepted]
+		self.mom_lnL[accepted] = mom_lnL[accepted]
+		self.locus_mom_lnL = self.calc_locus_mom_lnL(np.arange(self.num_loci))
+		return self.inbreeding_coefficient.tolist(), (0.0, mom_lnL_change)
+
+	def update_inbreeding_histories_gibbs(self, ih_prob_list):
+		"""Draws the inbreeding history of every family from its full conditional distribution.
+		"""
+		self.refresh_mom_factors()
+		self.refresh_ih_factors()
+		num_families = len(self.families)
+		ih_lnL = self.ih_factors.sum(axis = 1) + calc_log_probs(np.maximum(np.asarray(ih_prob_list), 0.0))
+		max_lnL = ih_lnL.max(axis = 1)
+		possible = (max_lnL != -np.inf)
+		cumulative_prob = np.cumsum(np.exp(ih_lnL[possible] - max_lnL[possible, None]), axis = 1)
+		new_ih = self.inbreeding_history.copy()
+		random_number = self.rng.random(num_families)[possible]
+		new_ih[possible] = np.minimum(np.count_nonzero(cumulative_prob <= (random_number * cumulative_prob[:, -1])[:, None], axis = 1), len(INBREEDING_COEFFICIENTS) - 1)
+
+		# only the families whose inbreeding history changed are counted again
+		changed = np.flatnonzero(new_ih != self.inbreeding_history)
+		changed_families = np.repeat(changed, self.num_loci)
+		changed_loci = np.tile(np.arange(self.num_loci), len(changed))
+		self.count_moms(changed_families, changed_loci, -1.0)
+		self.inbreeding_history = new_ih
+		self.count_moms(changed_families, changed_loci, 1.0)
+		self.inbreeding_coefficient = INBREEDING_COEFFICIENTS[self.inbreeding_history]
+		self.mom_factors[changed] = self.ih_factors[changed_families, changed_loci, new_ih[changed_families]].reshape(len(changed), self.num_loci)
+		prev_mom_lnL = self.mom_lnL[changed]
+		self.mom_lnL[changed] = calc_row_sums(self.mom_factors[changed])
+		self.locus_mom_lnL = self.calc_locus_mom_lnL(np.arange(self.num_loci))
+		return self.inbreeding_coefficient.tolist(), (0.0, calc_lnL_change(self.mom_lnL[changed], prev_mom_lnL))
+
+	def propose_mom_genotypes(self, families, loci):
+		"""Proposes a new maternal genotype at one imputed locus of each of a set of families.
+		"""
+		rng = self.rng
+		num = len(families)
+		first = self.mom_alleles[families, loci, 0]
+		second = self.mom_alleles[families, loci, 1]
+		inbreeding_coefficient = self.inbreeding_coefficient[families]
+		allele_freq = self.allele_freq
+
+		# imputed genotypes: the first allele is drawn from the allele frequencies, the second is identical by descent with probability F
+		cumulative_prob = self.cumulative_allele_freq[loci]
+		last_allele = np.count_nonzero(np.isfinite(cumulative_prob), axis = 1) - 1
+		new_first = np.minimum(np.count_nonzero(cumulative_prob <= rng.random(num)[:, None], axis = 1), last_allele)
+		new_second = np.minimum(np.count_nonzero(cumulative_prob <= rng.random(num)[:, None], axis = 1), last_allele)
+		new_second = np.where(rng.random(num) < inbreeding_coefficient, new_first, new_second)
+
+		# observed homozygotes: step between the homozygote and the null heterozygote
+		random_number = rng.random(num)
+		inb = (1.0 - inbreeding_coefficient)
+		af_second = allele_freq[loci, second]
+		null_het_prob = inb * (2.0 * af_second * allele_freq[loci, 0])
+		homozygote_prob = (inb * np.square(af_second)) + (inbreeding_coefficient * af_second)
+		homozygote = (first == second)
+		step = np.where(homozygote, random_number < null_het_prob, random_number < homozygote_prob)
+		observed_first = np.where(step, np.where(homozygote, 0, second), first)
+
+		imputed = self.imputed[families, loci]
+		new_first, new_second = np.where(imputed, new_first, observed_first), np.where(imputed, new_second, second)
+		return np.minimum(new_first, new_second), np.maximum(new_first, new_second)
+
+	def update_mom_genotypes(self, outcrossing_rate):
+		"""Steps the maternal genotype at a random imputed locus of every family with a Metropolis move.
+		"""
+		self.refresh_mom_factors()
+		families = self.imputed_families
+		num = len(families)
+		if num == 0:
+			return 0, 0, (0.0, 0.0)
+		# one locus at a time is changed in each family; locus chosen randomly among the imputed loci
+		choice = (self.rng.random(num) * self.num_imputed_loci).astype(np.int64)
+		loci = self.imputed_loci[np.arange(num), choice]
+		new_first, new_second = self.propose_mom_genotypes(families, loci)
+		offspring_lnL = self.calc_imputed_offspring_lnL(loci, new_first, new_second)
+		selfing_factors, outcrossing_factors, selfing_lnL, outcrossing_lnL = offspring_lnL
+
+		prev_lnL = self.calc_imputed_progeny_lnL(outcrossing_rate, self.selfing_lnL[self.imputed_offspring], self.outcrossing_lnL[self.imputed_offspring])
+		lnL = self.calc_imputed_progeny_lnL(outcrossing_rate, selfing_lnL, outcrossing_lnL)
+		accepted = self.accept(self.heat * lnL, self.heat * prev_lnL)
+		changed = accepted & ((new_first != self.mom_alleles[families, loci, 0]) | (new_second != self.mom_alleles[families, loci, 1]))
+		prev_mom_lnL = self.mom_lnL[families[changed]]
+		self.set_mom_genotypes(loci, new_first, new_second, accepted, offspring_lnL)
+		return num, int(np.count_nonzero(changed)), (calc_lnL_change(lnL[changed], prev_lnL[changed]), calc_lnL_change(self.mom_lnL[families[changed]], prev_mom_lnL))
+
+	def update_mom_genotypes_gibbs(self, outcrossing_rate):
+		"""Draws the maternal genotype at a random imputed locus of every family from its full conditional distribution.
+		"""
+		# only the factors of the chosen locus change, so the offspring at the other loci are summed once per family
+		self.refresh_mom_factors()
+		families = self.imputed_families
+		num = len(families)
+		if num == 0:
+			return 0, 0, (0.0, 0.0)
+		choice = (self.rng.random(num) * self.num_imputed_loci).astype(np.int64)
+		loci = self.imputed_loci[np.arange(num), choice]
+		first = self.mom_alleles[families, loci, 0]
+		second = self.mom_alleles[families, loci, 1]
+		num_codes = len(self.genotype_first)
+		candidate_first = np.broadcast_to(self.genotype_first, (num, num_codes))
+		candidate_second = np.broadcast_to(self.genotype_second, (num, num_codes))
+		# imputed genotypes may be any genotype of the locus, with the null allele only at null loci
+		# observed homozygotes at null loci only step between the homozygote and the null heterozygote
+		imputed = self.imputed[families, loci]
+		locus_genotypes = (candidate_second < self.num_alleles[loci, None]) & ((candidate_first > 0) | self.null[loci, None])
+		candidates = np.where(imputed[:, None], locus_genotypes, (candidate_second == second[:, None]) & ((candidate_first == second[:, None]) | (candidate_first == 0)))
+		# candidates the offspring cannot have come from have a likelihood of zero, and are left out (see class MomCompatibility)
+		if self.compatible_genotypes is None:
+			self.index_compatible_genotypes()
+		candidates = candidates & self.compatible_genotypes[np.arange(num), choice]
+		candidate_families, candidate_codes = np.nonzero(candidates)
+		candidate_loci = loci[candidate_families]
+		mom_lnL = calc_log_probs(self.calc_mom_factors(families[candidate_families], candidate_loci, self.genotype_first[candidate_codes], self.genotype_second[candidate_codes], self.inbreeding_coefficient[families[candidate_families]]))
+
+		# offspring ln probabilities at the other loci, and the factors of each candidate at the chosen locus
+		offspring = self.imputed_offspring
+		offspring_family = self.imputed_offspring_family
+		offspring_loci = loci[offspring_family]
+		selfing_factors = self.selfing_factors[offspring]
+		selfing_factors[np.arange(len(offspring)), offspring_loci] = 0.0
+		outcrossing_factors = self.outcrossing_factors[offspring]
+		outcrossing_factors[np.arange(len(offspring)), offspring_loci] = 0.0
+		other_selfing_lnL = calc_row_sums(selfing_factors)
+		other_outcrossing_lnL = calc_row_sums(outcrossing_factors)
+		# pairs of an offspring with data at the chosen locus and a candidate genotype of its mom
+		candidate_index = np.full((num, num_codes), -1, dtype = np.int64)
+		candidate_index[candidate_families, candidate_codes] = np.arange(len(candidate_families))
+		pair_offspring, pair_codes = np.nonzero(candidates[offspring_family] & ~self.missing[offspring, offspring_loci][:, None])
+		pair_family = offspring_family[pair_offspring]
+		selfing, outcrossing = self.calc_offspring_factors(offspring[pair_offspring], offspring_loci[pair_offspring], self.genotype_first[pair_codes], self.genotype_second[pair_codes], np.zeros(len(pair_offspring), dtype = bool))
+		pair_lnL = self.offspring_count[offspring[pair_offspring]] * calc_mixture_lnL(outcrossing_rate, other_selfing_lnL[pair_offspring] + calc_log_probs(selfing), other_outcrossing_lnL[pair_offspring] + calc_log_probs(outcrossing))
+		progeny_lnL = np.bincount(candidate_index[pair_family, pair_codes], weights = pair_lnL, minlength = len(candidate_families))
+		# offspring without data at the chosen locus are the same for every candidate
+		missing = np.flatnonzero(self.missing[offspring, offspring_loci])
+		progeny_lnL = progeny_lnL + np.bincount(offspring_family[missing], weights = self.offspring_count[offspring[missing]] * calc_mixture_lnL(outcrossing_rate, other_selfing_lnL[missing], other_outcrossing_lnL[missing]), minlength = num)[candidate_families]
+
+		# draws a candidate of each family from its full conditional distribution
+		lnL = np.full((num, num_codes), -np.inf)
+		lnL[candidate_families, candidate_codes] = mom_lnL + self.heat * progeny_lnL
+		max_lnL = lnL.max(axis = 1)
+		possible = (max_lnL != -np.inf)
+		with np.errstate(invalid = 'ignore'):
+			cumulative_prob = np.cumsum(np.exp(lnL - max_lnL[:, None]), axis = 1)
+		random_number = self.rng.random(num) * cumulative_prob[:, -1]
+		codes = np.minimum(np.count_nonzero(cumulative_prob <= random_number[:, None], axis = 1), num_codes - 1)
+		new_first = np.where(possible, self.genotype_first[codes], first)
+		new_second = np.where(possible, self.genotype_second[codes], second)
+		changed = (new_first != first) | (new_second != second)
+		prev_lnL = self.calc_imputed_progeny_lnL(outcrossing_rate, self.selfing_lnL[offspring], self.outcrossing_lnL[offspring])
+		prev_mom_lnL = self.mom_lnL[families[changed]]
+		offspring_lnL = self.calc_imputed_offspring_lnL(loci, new_first, new_second)
+		new_lnL = self.calc_imputed_progeny_lnL(outcrossing_rate, offspring_lnL[2], offspring_lnL[3])
+		self.set_mom_genotypes(loci, new_first, new_second, changed, offspring_lnL)
+		return num, int(np.count_nonzero(changed)), (calc_lnL_change(new_lnL[changed], prev_lnL[changed]), calc_lnL_change(self.mom_lnL[families[changed]], prev_mom_lnL))
+
+	def calc_imputed_offspring_lnL(self, loci, new_first, new_second):
+		"""Returns the offspring ln likelihoods of the families with imputed loci, with their maternal genotype at one locus changed.
+		"""
+		offspring = self.imputed_offspring
+		offspring_family = self.imputed_offspring_family
+		offspring_loci = loci[offspring_family]
+		rows = np.flatnonzero(~self.missing[offspring, offspring_loci])
+		observed_family = offspring_family[rows]
+		selfing, outcrossing = self.calc_offspring_factors(offspring[rows], offspring_loci[rows], new_first[observed_family], new_second[observed_family], np.zeros(len(rows), dtype = bool))
+		selfing_factors = self.selfing_factors[offspring]
+		selfing_factors[rows, offspring_loci[rows]] = calc_log_probs(selfing)
+		outcrossing_factors = self.outcrossing_factors[offspring]
+		outcrossing_factors[rows, offspring_loci[rows]] = calc_log_probs(outcrossing)
+		return selfing_factors, outcrossing_factors, calc_row_sums(selfing_factors), calc_row_sums(outcrossing_factors)
+
+	def calc_imputed_progeny_lnL(self, outcrossing_rate, selfing_lnL, outcrossing_lnL):
+		"""Returns the ln likelihood of the offspring of each family with imputed loci.
+		"""
+		offspring_count = self.offspring_count[self.imputed_offspring]
+		return np.bincount(self.imputed_offspring_family, weights = offspring_count * calc_mixture_lnL(outcrossing_rate, selfing_lnL, outcrossing_lnL), minlength = len(self.imputed_families))
+
+	def set_mom_genotypes(self, loci, new_first, new_second, accepted, offspring_lnL):
+		"""Keeps the accepted new maternal genotypes of the families with imputed loci.
+		"""
+		families = self.imputed_families
+		num = len(families)
+		selfing_factors, outcrossing_factors, selfing_lnL, outcrossing_lnL = offspring_lnL
+		accepted_families = families[accepted]
+		accepted_loci = loci[accepted]
+		self.count_moms(accepted_families, accepted_loci, -1.0)
+		self.mom_alleles[accepted_families, accepted_loci, 0] = new_first[accepted]
+		self.mom_alleles[accepted_families, accepted_loci, 1] = new_second[accepted]
+		self.count_moms(accepted_families, accepted_loci, 1.0)
+		self.stale_ih_factors[accepted_families, accepted_loci] = True
+		offspring = self.imputed_offspring
+		offspring_accepted = accepted[self.imputed_offspring_family]
+		accepted_offspring = offspring[offspring_accepted]
+		self.selfing_factors[accepted_offspring] = selfing_factors[offspring_accepted]
+		self.outcrossing_factors[accepted_offspring] = outcrossing_factors[offspring_accepted]
+		self.selfing_lnL[accepted_offspring] = selfing_lnL[offspring_accepted]
+		self.outcrossing_lnL[accepted_offspring] = outcrossing_lnL[offspring_accepted]
+		self.mom_factors[accepted_families, accepted_loci] = calc_log_probs(self.calc_mom_factors(accepted_families, accepted_loci, new_first[accepted], new_second[accepted], self.inbreeding_coefficient[accepted_families]))
+		self.mom_lnL[accepted_families] = calc_row_sums(self.mom_factors[accepted_families])
+		changed_loci = np.unique(accepted_loci)
+		self.locus_mom_lnL[changed_loci] = self.calc_locus_mom_lnL(changed_loci)
+
+		if self.recorded_possible_genotypes:
+			self.record_possible_genotypes(accepted_families, accepted_loci)
+		else:
+			self.record_possible_genotypes(np.repeat(families, self.num_loci), np.tile(np.arange(self.num_loci), num))
+			self.recorded_possible_genotypes = True
+
+	def record_possible_genotypes(self, families, loci):
+		"""Adds the current maternal genotypes of a set of (family, locus) pairs to the possible genotypes of the families.
+		"""
+		first = self.mom_alleles[families, loci, 0].tolist()
+		second = self.mom_alleles[families, loci, 1].tolist()
+		no_mom = self.no_mom[families, loci].tolist()
+		for f, n, mom_first, mom_second, skip in zip(families.tolist(), loci.tolist(), first, second, no_mom):
+			genotype_key = None if skip else (mom_first, mom_second)
+			possible_genotypes = self.families[f].possible_genotypes[n]
+			if genotype_key not in possible_genotypes:
+				possible_genotypes.append(genotype_key)
+
+	def sync_families(self):
+		"""Copies the inbreeding histories and the imputed maternal genotypes back into the Family and Individual objects.
+		"""
+		for family, ih in zip(self.families, self.inbreeding_history.tolist()):
+			family.inbreeding_history = ih
+			family.mom.calc_inbreeding_coefficient(ih)
+		mom_alleles = self.mom_alleles.tolist()
+		for f in self.imputed_families.tolist():
+			family = self.families[f]
+			for n in family.imputed_loci:
+				genotype = family.mom.genotype_list[n]
+				genotype.first, genotype.second = mom_alleles[f][n]
+
+	def get_random_state(self):
+		"""Returns the state of the random number generator of the engine.
+		"""
+		return self.rng.bit_generator.state
+
+	def set_random_state(self, random_state):
+		"""Restores the state of the random number generator of the engine.
+		"""
+		self.rng.bit_generator.state = random_state
+
+class JitEngine(ArrayEngine):
+	"""A JitEngine is an ArrayEngine whose inner loops are the kernels of borice/kernels.py, compiled with Numba when it is installed.
+	"""
+	# logs and sums are still taken with NumPy, so both engines give identical results for a given seed
+	def calc_offspring_factors(self, offspring, loci, mom_first, mom_second, no_mom):
+		"""Returns the single-locus genotype probabilities given selfing and given outcrossing of a set of offspring.
+		"""
+		return kernels.calc_offspring_factors(self.offspring_alleles, self.missing, offspring, loci, mom_first, mom_second, no_mom, self.null, self.allele_freq)
+
+	def calc_mom_factors(self, families, loci, mom_first, mom_second, inbreeding_coefficient):
+		"""Returns the single-locus genotype probabilities of a set of moms given inbreeding coefficients.
+		"""
+		return kernels.calc_mom_factors(families, loci, mom_first, mom_second, self.no_mom, self.allele_freq, inbreeding_coefficient)
+
+	def accept(self, lnL, prev_lnL):
+		"""Returns the Metropolis acceptance of a batch of proposals from their ln likelihoods.
+		"""
+		return kernels.metropolis_accept(lnL, prev_lnL, self.rng.random(len(lnL)))
+
+def calc_genotype_codes(first, second):
+	"""Returns the genotype codes of arrays of first and second allele indices.
+	"""
+	return ((second * (second + 1)) // 2) + first
+
+def calc_lnL_change(lnL, prev_lnL):
+	"""Returns the change in a ln likelihood summed over the entries of an array that changed.
+	"""
+	# unchanged entries are left out so that a -inf is never subtracted from itself
+	changed = (lnL != prev_lnL)
+	return float((lnL[changed] - prev_lnL[changed]).sum())
+
+def calc_row_sums(factors):
+	"""Returns the sum of each row of a matrix of ln probabilities.
+	"""
+	return factors.sum(axis = 1)
+
+def calc_mixture_lnL(outcrossing_rate, selfing_lnL, outcrossing_lnL):
+	"""Returns the ln likelihoods of offspring genotypes from their ln probabilities given selfing and given outcrossing.
+	"""
+	return np.logaddexp(calc_log_probs(1.0 - outcrossing_rate) + selfing_lnL, calc_log_probs(outcrossing_rate) + outcrossing_lnL)
+
+def calc_log_probs(probs):
+	"""Returns the ln of an array of probabilities, with -inf for probabilities of zero.
+	"""
+	with np.errstate(divide = 'ignore'):
+		return np.log(probs)
+
+def calc_selfing_probs(mom_first, mom_second, first, second, null):
+	"""Calculates the probabilities of offspring genotypes given selfing and their maternal genotypes.
+	"""
+	# allele 0 (the null allele) is never observed in an offspring
+	sh = (first == second)
+	mh = (mom_first == mom_second)
+	null_het = (~mh) & null & (mom_first == 0)
+	impossible = (first != mom_first) & (first != mom_second) & (second != mom_first) & (second != mom_second)
+	return np.select(
+		[mh, null_het, impossible, sh, (first == mom_first) & (second == mom_second)],
+		[np.where(sh & (first == mom_first), 1.0, 0.0), np.where(sh & (first == mom_second), 1.0, 0.0), 0.0, 0.25, 0.5],
+		0.0)
+
+def calc_outcrossing_probs(mom_first, mom_second, first, second, null, af_first, af_second, af_null):
+	"""Calculates the probabilities of offspring genotypes given outcrossing and their maternal genotypes.
+	"""
+	sh = (first == second)
+	mh = (mom_first == mom_second)
+	null_mom = null & (mom_first == 0)
+	first_in_mom = (first == mom_first) | (first == mom_second)
+	second_in_mom = (second == mom_first) | (second == mom_second)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		null_share = af_first / (1.0 - af_null)
+	# mom is homozygous
+	hom_prob = np.select(
+		[null_mom, null & sh & (first == mom_first), null & sh, first == mom_first, second == mom_first],
+		[np.where(sh, null_share, 0.0), af_first + af_null, 0.0, af_second, af_first],
+		0.0)
+	# mom is heterozygous
+	het_prob = np.select(
+		[null_mom & sh & (first == mom_second), null_mom & sh, null_mom & (first == mom_second), null_mom & (second == mom_second), null_mom,
+			null & sh & first_in_mom, sh & (first == mom_first), sh & (first == mom_second), sh,
+			(~first_in_mom) & (~second_in_mom), ~first_in_mom, ~second_in_mom],
+		[(null_share * 0.5) + ((af_first + af_null) * 0.5), null_share * 0.5, af_second * 0.5, af_first * 0.5, 0.0,
+			(af_first + af_null) * 0.5, af_first * 0.5, af_second * 0.5, 0.0,
+			0.0, af_first * 0.5, af_second * 0.5],
+		0.5 * (af_first + af_second))
+	return np.where(mh, hom_prob, het_prob)
+
+def calc_mom_probs(mom_first, mom_second, af_first, af_second, inbreeding_coefficient):
+	"""Calculates the probabilities of maternal genotypes given their inbreeding coefficients.
+	"""
+	inb = (1.0 - inbreeding_coefficient)
+	return np.where(mom_first == mom_second, (inb * np.square(af_first)) + (inbreeding_coefficient * af_first), inb * (2.0 * af_first * af_second))
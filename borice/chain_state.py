@@ -0,0 +1,111 @@
+import copy
+import math
+
+class ChainState(object):
+	"""A ChainState holds the step, the sampled parameters and the cached ln likelihood of a chain.
+	"""
+	# the parameters live in the Population, Allele, Family and engine objects, and are copied by def capture and def restore
+	__slots__ = ('step', 'outcrossing_rate', 'allele_y_values', 'allele_freq_list', 'inbreeding_histories', 'mom_genotypes', 'lnL', 'progeny_lnL', 'mom_lnL')
+
+	def __init__(self, step = 0, outcrossing_rate = None, allele_y_values = None, allele_freq_list = None, inbreeding_histories = None, mom_genotypes = None, lnL = None, progeny_lnL = None, mom_lnL = None):
+		self.step = step
+		self.outcrossing_rate = outcrossing_rate
+		self.allele_y_values = allele_y_values
+		self.allele_freq_list = allele_freq_list
+		self.inbreeding_histories = inbreeding_histories
+		self.mom_genotypes = mom_genotypes
+		self.lnL = lnL
+		self.progeny_lnL = progeny_lnL
+		self.mom_lnL = mom_lnL
+
+	def get_lnL(self, engine, outcrossing_rate):
+		"""Returns the cached ln likelihood of the data, asking the engine for it if a move invalidated it.
+		"""
+		if self.lnL is None:
+			self.set_lnL(engine.calc_pop_lnL_components(outcrossing_rate))
+		return self.lnL
+
+	def set_lnL(self, lnL_components):
+		"""Caches the ln likelihood of the data from a (total, progeny, maternal) tuple.
+		"""
+		self.lnL, self.progeny_lnL, self.mom_lnL = lnL_components
+
+	def change_lnL(self, lnL_change):
+		"""Updates the cached ln likelihood of the data by a (progeny, maternal) change.
+		"""
+		# a change that cannot be added to the cached value (a -inf ln likelihood that became finite again) discards it instead
+		if self.lnL is None:
+			return
+		progeny_change, mom_change = lnL_change
+		lnL_components = (self.lnL + (progeny_change + mom_change), self.progeny_lnL + progeny_change, self.mom_lnL + mom_change)
+		if any(math.isnan(lnL) for lnL in lnL_components):
+			self.invalidate()
+		else:
+			self.set_lnL(lnL_components)
+
+	def invalidate(self):
+		"""Discards the cached ln likelihood, so that the engine calculates it again.
+		"""
+		self.lnL = None
+		self.progeny_lnL = None
+		self.mom_lnL = None
+
+	def capture(self, population, all_alleles, engine):
+		"""Copies the sampled parameters of the chain from the population, its alleles and families, and the engine.
+		"""
+		engine.sync_families()
+		self.outcrossing_rate = population.outcrossing_rate
+		self.allele_y_values = [[allele.y for allele in locus_alleles] for locus_alleles in all_alleles]
+		self.allele_freq_list = [list(allele_freq) for allele_freq in population.allele_freq_list]
+		self.inbreeding_histories = [fam.inbreeding_history for fam in population.family_list]
+		self.mom_genotypes = []
+		for fam in population.family_list:
+			genotype_list = fam.mom.genotype_list
+			self.mom_genotypes.append([(n, genotype_list[n].first, genotype_list[n].second) for n in fam.imputed_loci])
+		return self
+
+	def restore(self, population, all_alleles):
+		"""Copies the sampled parameters of the state back into the population, its alleles and families.
+		"""
+		# engines must be built again from the population afterwards
+		population.outcrossing_rate = self.outcrossing_rate
+		for locus_alleles, y_values in zip(all_alleles, self.allele_y_values):
+			for allele, y in zip(locus_alleles, y_values):
+				allele.y = y
+		population.allele_freq_list[:] = [list(allele_freq) for allele_freq in self.allele_freq_list]
+		for fam, ih, genotypes in zip(population.family_list, self.inbreeding_histories, self.mom_genotypes):
+			fam.inbreeding_history = ih
+			fam.mom.calc_inbreeding_coefficient(ih)
+			for n, first, second in genotypes:
+				genotype = fam.mom.genotype_list[n]
+				genotype.first, genotype.second = first, second
+
+	def copy(self):
+		"""Returns a deep copy of the state.
+		"""
+		return copy.deepcopy(self)
+
+	def to_dict(self):
+		"""Returns the state as a dictionary of plain Python values.
+		"""
+		state = {name: copy.deepcopy(getattr(self, name)) for name in self.__slots__}
+		if state['mom_genotypes'] is not None:
+			state['mom_genotypes'] = [[list(genotype) for genotype in genotypes] for genotypes in state['mom_genotypes']]
+		return state
+
+	@classmethod
+	def from_dict(cls, state):
+		"""Builds a state from a dictionary returned by def to_dict.
+		"""
+		state = dict(state)
+		if state.get('mom_genotypes') is not None:
+			state['mom_genotypes'] = [[tuple(genotype) for genotype in genotypes] for genotypes in state['mom_genotypes']]
+		return cls(**state)
+
+	def __getstate__(self):
+		return self.to_dict()
+
+	def __setstate__(self, state):
+		other = ChainState.from_dict(state)
+		for name in self.__slots__:
+			setattr(self, name, getattr(other, name))
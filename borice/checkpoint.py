@@ -0,0 +1,38 @@
+import os
+import pickle
+
+CHECKPOINT_VERSION = 10
+
+class CheckpointException(Exception):
+	"""Makes a CheckpointException class for checkpoints that cannot be read.
+	"""
+	def __init__(self, file_name, message):
+		self.file_name = file_name
+		self.message = message
+
+	def __str__(self):
+		return "Cannot resume from checkpoint %s: %s" % (self.file_name, self.message)
+
+def write_checkpoint(file_name, checkpoint):
+	"""Writes a checkpoint of a run to a file.
+	"""
+	# the checkpoint replaces the file from a temporary file, so an interrupted write never leaves a truncated checkpoint
+	checkpoint = dict(checkpoint, version = CHECKPOINT_VERSION)
+	temp_file_name = file_name + '.tmp'
+	with open(temp_file_name, 'wb') as output:
+		pickle.dump(checkpoint, output, protocol = pickle.HIGHEST_PROTOCOL)
+		output.flush()
+		os.fsync(output.fileno())
+	os.replace(temp_file_name, file_name)
+
+def read_checkpoint(file_name):
+	"""Reads a checkpoint written by def write_checkpoint.
+	"""
+	try:
+		with open(file_name, 'rb') as input:
+			checkpoint = pickle.load(input)
+	except (OSError, pickle.UnpicklingError, EOFError) as x:
+		raise CheckpointException(file_name, str(x))
+	if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION:
+		raise CheckpointException(file_name, "unknown checkpoint format")
+	return checkpoint
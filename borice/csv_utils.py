@@ -6,6 +6,7 @@ from .family import *
 def parse_csv(stream, sep):
 	"""Reads a CSV file and returns marker names, families, and genotypes.
 	"""
+	# alleles in genotypes are coded as their index in the allele list of their marker
 	import csv
 	reader = csv.reader(stream, delimiter = sep) # file object passed in
 	line_iterator = iter(reader)
@@ -41,18 +42,19 @@ def parse_csv(stream, sep):
 	second_row = line_iterator.__next__()
 	if len(second_row) < num_markers:
 		raise CSVFileParseException(stream, 2, "Expecting at least %s columns of marker names in the second row")
-	# the lists within marker_names each contain two index positions, index 0 = marker name, index 1 = empty
+	# the lists within marker_names each contain two index positions, index 0 = marker name, index 1 = observed alleles (replaced by the allele list once all rows are read)
 	marker_names = []
 	for n, marker in enumerate(second_row):
 		if n >= num_markers:
 			break
 		if not marker.strip():
 			raise CSVFileParseException(stream, 2, "Found an empty cell in column %d of line 2 (expected a marker name)" % (1 + n))
-		marker_names.append([marker.strip(), []]) # add the marker names from the second row of the file to the list of marker names
+		marker_names.append([marker.strip(), set()]) # add the marker names from the second row of the file to the list of marker names
 	
 	
 	expected_column_number = 2 + 2*num_markers
 	families_in_pop = {}
+	rows = []
 	for n, row in enumerate(line_iterator):
 		if not row:
 			continue # allow blank lines by skipping them
@@ -81,7 +83,7 @@ def parse_csv(stream, sep):
 		assert population_name == family.pop_name
 
 		offset = 2	# the first 2 columns in the csv file are not genotype data
-		genotype_list = []
+		allele_pairs = []
 		for i in range(num_markers):
 			first = None
 			second = None
@@ -99,17 +101,46 @@ def parse_csv(stream, sep):
 			except:
 				if row[offset + 1] != '?':
 					raise CSVFileParseException(stream, 3 + n, "Expecting a number for an allele in column %d, but found %s" % (offset + 2, row[offset + 1]))
+
+			# a locus is either fully observed or fully missing
+			if ((first == -9) or (second == -9)) and (first != second):
+				raise CSVFileParseException(stream, 3 + n, "Expecting both alleles in columns %d and %d to be missing (-9), but found %s and %s" % (offset + 1, offset + 2, row[offset], row[offset + 1]))
 			
-			# constructs a multilocus genotype_list
+			allele_pairs.append((first, second))
+			info_for_this_locus = marker_names[i]
+			info_for_this_locus[1].update((first, second))
+			offset = offset + 2
+		rows.append((family, allele_pairs, mom))
+
+	# the allele list of each locus starts with zero, the null allele (not observed), followed by the observed alleles in sorted order
+	allele_index_all_loci = []
+	for marker in marker_names:
+		observed_alleles = marker[1]
+		observed_alleles.discard(-9)
+		observed_alleles.discard(None)
+		allele_list = [0]
+		allele_list.extend(sorted(observed_alleles))
+		marker[1] = allele_list
+		allele_index_all_loci.append(get_allele_index(allele_list))
+
+	# constructs the multilocus genotype_list of each individual, with alleles coded as their index in the allele list of their locus
+	# identical genotypes share an instance from a table kept only while the file is parsed
+	observed_genotypes = {}
+	for family, allele_pairs, mom in rows:
+		genotype_list = []
+		for (first, second), allele_index in zip(allele_pairs, allele_index_all_loci):
 			if (first is not None) and (second is not None):
-				genotype_list.append(SingleLocusGenotype(first, second))
+				genotype_list.append(get_observed_genotype(allele_index[first], allele_index[second], observed_genotypes))
 			else:
 				genotype_list.append(None)
-			alleles_per_locus = [first, second]
-			info_for_this_locus = marker_names[i]
-			info_for_this_locus[1] = (alleles_per_locus + info_for_this_locus[1])
-			offset = offset + 2
 		individual = Individual(family, genotype_list, mom)
+
+	# indexes the offspring with data at each locus, so that missing data is skipped up front (see Individual.observed_loci),
+	# collapses offspring with identical genotypes into weighted patterns, and indexes the maternal alleles the offspring require
+	for family in families_in_pop.values():
+		family.index_observed_offspring(num_markers)
+		family.index_offspring_patterns(num_markers)
+		family.index_mom_compatibility(num_markers)
 	return marker_names, families_in_pop.values()	
     
 class CSVFileParseException(Exception):
@@ -0,0 +1,205 @@
+import math
+
+class RunningDiagnostic(object):
+	"""A RunningDiagnostic follows the samples of one parameter of a chain without keeping its trace.
+	"""
+	# pairs of batches are merged when there are more than max_batches, so memory stays constant however long the chain
+	__slots__ = ('max_batches', 'batch_size', 'batches', 'count', 'mean', 'm2')
+
+	def __init__(self, max_batches = 64):
+		assert max_batches % 2 == 0
+		self.max_batches = max_batches
+		self.batch_size = 1
+		self.batches = [] # [count, mean, sum of squared deviations] of each batch
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+
+	def add(self, value):
+		"""Adds a sample.
+		"""
+		self.count, self.mean, self.m2 = add_sample(self.count, self.mean, self.m2, value)
+		if not self.batches or self.batches[-1][0] == self.batch_size:
+			if len(self.batches) == self.max_batches:
+				self.batches = [merge_moments(*(first + second)) for first, second in zip(self.batches[0::2], self.batches[1::2])]
+				self.batch_size = self.batch_size * 2
+			if not self.batches or self.batches[-1][0] == self.batch_size:
+				self.batches.append([0, 0.0, 0.0])
+		batch = self.batches[-1]
+		batch[0], batch[1], batch[2] = add_sample(batch[0], batch[1], batch[2], value)
+
+	def calc_variance(self):
+		"""Returns the variance of the samples.
+		"""
+		if self.count < 2:
+			return None
+		return self.m2 / (self.count - 1)
+
+	def calc_batch_variance(self):
+		"""Returns the batch means estimate of the asymptotic variance of the samples.
+		"""
+		batch_means = [batch[1] for batch in self.batches if batch[0] == self.batch_size]
+		# short chains have more batches than the square root of their length, which is too short a batch to cover the autocorrelation of the samples
+		group_size = max(1, int(round(len(batch_means) / math.sqrt(self.count)))) if self.count else 1
+		batch_means = [math.fsum(batch_means[n:n + group_size]) / group_size for n in range(0, len(batch_means) - group_size + 1, group_size)]
+		if len(batch_means) < 2:
+			return None
+		mean = math.fsum(batch_means) / len(batch_means)
+		return group_size * self.batch_size * math.fsum((batch_mean - mean) ** 2 for batch_mean in batch_means) / (len(batch_means) - 1)
+
+	def calc_ess(self):
+		"""Returns the effective sample size of the samples, or None if it cannot be estimated.
+		"""
+		variance = self.calc_variance()
+		batch_variance = self.calc_batch_variance()
+		if not variance or not batch_variance:
+			return None
+		return self.count * variance / batch_variance
+
+	def calc_mcse(self):
+		"""Returns the Monte Carlo standard error of the mean of the samples, or None if it cannot be estimated.
+		"""
+		batch_variance = self.calc_batch_variance()
+		if batch_variance is None:
+			return None
+		return math.sqrt(batch_variance / self.count)
+
+	def calc_halves(self):
+		"""Returns the (count, mean, sum of squared deviations) of the first and second halves of the samples.
+		"""
+		half = 0
+		first_count = 0
+		while half < len(self.batches) and abs(first_count + self.batches[half][0] - self.count / 2.0) < abs(first_count - self.count / 2.0):
+			first_count = first_count + self.batches[half][0]
+			half = half + 1
+		halves = []
+		for batches in (self.batches[:half], self.batches[half:]):
+			moments = (0, 0.0, 0.0)
+			for batch in batches:
+				moments = merge_moments(*(list(moments) + batch))
+			halves.append(moments)
+		return halves
+
+def add_sample(count, mean, m2, value):
+	"""Adds a sample to a running (count, mean, sum of squared deviations).
+	"""
+	count = count + 1
+	delta = value - mean
+	mean = mean + delta / count
+	m2 = m2 + delta * (value - mean)
+	return count, mean, m2
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+	"""Returns the (count, mean, sum of squared deviations) of two sets of samples together.
+	"""
+	count = count_a + count_b
+	if count == 0:
+		return [0, 0.0, 0.0]
+	delta = mean_b - mean_a
+	mean = mean_a + delta * count_b / count
+	m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+	return [count, mean, m2]
+
+def calc_split_rhat(diagnostics):
+	"""Returns the split-R-hat of a parameter from the RunningDiagnostic of each chain, or None.
+	"""
+	halves = [half for diagnostic in diagnostics for half in diagnostic.calc_halves()]
+	if any(count < 2 for count, mean, m2 in halves):
+		return None
+	num_halves = len(halves)
+	length = math.fsum(count for count, mean, m2 in halves) / num_halves
+	within = math.fsum(m2 / (count - 1) for count, mean, m2 in halves) / num_halves
+	if within == 0.0:
+		return None
+	overall_mean = math.fsum(mean for count, mean, m2 in halves) / num_halves
+	between = math.fsum((mean - overall_mean) ** 2 for count, mean, m2 in halves) / (num_halves - 1)
+	pooled_variance = ((length - 1) / length) * within + between
+	return math.sqrt(pooled_variance / within)
+
+def summarize_diagnostics(diagnostics):
+	"""Returns the mean, standard deviation, ESS, MC SE and split-R-hat of a parameter over its chains, as a dictionary.
+	"""
+	count, mean, m2 = 0, 0.0, 0.0
+	for diagnostic in diagnostics:
+		count, mean, m2 = merge_moments(count, mean, m2, diagnostic.count, diagnostic.mean, diagnostic.m2)
+	chain_ess = [diagnostic.calc_ess() for diagnostic in diagnostics]
+	summary = {'samples': count, 'mean': mean if count else None, 'sd': math.sqrt(m2 / (count - 1)) if count > 1 else None, 'ess': None, 'mcse': None, 'split_rhat': calc_split_rhat(diagnostics)}
+	if count > 1 and all(ess is not None for ess in chain_ess):
+		summary['ess'] = math.fsum(chain_ess)
+		summary['mcse'] = summary['sd'] / math.sqrt(summary['ess'])
+	elif count > 1 and summary['sd'] == 0.0:
+		summary['mcse'] = 0.0
+	return summary
+
+class BurnInDetector(object):
+	"""A BurnInDetector tells when the t and ln likelihood trace of the burn-in has become stationary.
+	"""
+	# the chain is stationary when the means of the last two windows agree within max_z of their Monte Carlo standard errors
+	__slots__ = ('window_size', 'max_z', 'previous', 'current')
+
+	def __init__(self, window_size = 100, max_z = 2.0):
+		self.window_size = window_size
+		self.max_z = max_z
+		self.previous = None
+		self.current = [RunningDiagnostic(), RunningDiagnostic()]
+
+	def add(self, outcrossing_rate, lnL):
+		"""Adds a sample of the burn-in, and returns True if the chain is stationary.
+		"""
+		for diagnostic, value in zip(self.current, (outcrossing_rate, lnL)):
+			diagnostic.add(value)
+		if self.current[0].count < self.window_size:
+			return False
+		stationary = self.previous is not None and all(abs(calc_z_score(previous, current)) < self.max_z for previous, current in zip(self.previous, self.current))
+		self.previous = self.current
+		self.current = [RunningDiagnostic(), RunningDiagnostic()]
+		return stationary
+
+def calc_z_score(first, second):
+	"""Returns the difference between the means of two RunningDiagnostic in units of its standard error.
+	"""
+	difference = second.mean - first.mean
+	mcse_list = [first.calc_mcse(), second.calc_mcse()]
+	if None in mcse_list:
+		return float('inf')
+	standard_error = math.sqrt(mcse_list[0] ** 2 + mcse_list[1] ** 2)
+	if standard_error == 0.0:
+		return 0.0 if difference == 0.0 else float('inf')
+	return difference / standard_error
+
+class ChainDiagnostics(object):
+	"""A ChainDiagnostics holds a RunningDiagnostic for each parameter sampled by a chain, and how its steps and burn-in ended.
+	"""
+	__slots__ = ('outcrossing_rate', 'inbreeding_coefficient', 'lnL', 'allele_freqs', 'steps', 'stop_reason', 'burn_in', 'burn_in_detected', 'burn_in_stop_reason')
+
+	def __init__(self, allele_freq_list):
+		self.steps = 0
+		self.stop_reason = None
+		self.burn_in = 0
+		self.burn_in_detected = None
+		self.burn_in_stop_reason = None
+		self.outcrossing_rate = RunningDiagnostic()
+		self.inbreeding_coefficient = RunningDiagnostic()
+		self.lnL = RunningDiagnostic()
+		self.allele_freqs = [[RunningDiagnostic() for allele_freq in locus_allele_freqs] for locus_allele_freqs in allele_freq_list]
+
+	def add(self, outcrossing_rate, inbreeding_coefficient, lnL, allele_freq_list):
+		"""Adds the parameters of a sample of the chain.
+		"""
+		self.outcrossing_rate.add(outcrossing_rate)
+		self.inbreeding_coefficient.add(inbreeding_coefficient)
+		self.lnL.add(lnL)
+		for locus_diagnostics, locus_allele_freqs in zip(self.allele_freqs, allele_freq_list):
+			for diagnostic, allele_freq in zip(locus_diagnostics, locus_allele_freqs):
+				diagnostic.add(allele_freq)
+
+def summarize_chains(chain_diagnostics):
+	"""Returns the summaries of t, F, the ln likelihood and each allele frequency over the chains.
+	"""
+	summaries = {}
+	summaries['t'] = summarize_diagnostics([chain.outcrossing_rate for chain in chain_diagnostics])
+	summaries['F'] = summarize_diagnostics([chain.inbreeding_coefficient for chain in chain_diagnostics])
+	summaries['lnL'] = summarize_diagnostics([chain.lnL for chain in chain_diagnostics])
+	allele_freqs = chain_diagnostics[0].allele_freqs
+	summaries['allele_freqs'] = [[summarize_diagnostics([chain.allele_freqs[locus][n] for chain in chain_diagnostics]) for n in range(len(allele_freqs[locus]))] for locus in range(len(allele_freqs))]
+	return summaries
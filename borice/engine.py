@@ -0,0 +1,312 @@
+import abc
+import math
+import random
+
+from .genotype import *
+from .likelihood_cache import *
+
+class EngineMismatchError(Exception):
+	"""Makes an EngineMismatchError class for engines that disagree on a cross-check.
+	"""
+	def __init__(self, step, move, engine_name, lnL, check_engine_name, check_lnL, outcrossing_rate):
+		self.step = step
+		self.move = move
+		self.engine_name = engine_name
+		self.lnL = lnL
+		self.check_engine_name = check_engine_name
+		self.check_lnL = check_lnL
+		self.outcrossing_rate = outcrossing_rate
+
+	def __str__(self):
+		return "Engine mismatch at step %s after the %s move: ln likelihood at t = %s is %r with the %s engine but %r with the %s engine!" % (self.step, self.move, self.outcrossing_rate, self.lnL, self.engine_name, self.check_lnL, self.check_engine_name)
+
+class Engine(abc.ABC):
+	"""An Engine holds the ln likelihood of the data during a chain, and steps the inbreeding histories and maternal genotypes.
+	"""
+	# the heat raises the offspring likelihood to a power; it is below 1 only for the heated chains of parallel tempering
+	heat = 1.0
+
+	@abc.abstractmethod
+	def calc_pop_lnL(self, outcrossing_rate):
+		"""Calculates the ln likelihood of the population summed over families (see Population.calc_pop_lnL).
+		"""
+
+	@abc.abstractmethod
+	def calc_pop_lnL_components(self, outcrossing_rate):
+		"""Returns the (total, progeny, maternal) ln likelihood of the population.
+		"""
+
+	def calc_progeny_lnL_grid(self, outcrossing_rates):
+		"""Returns the progeny ln likelihood of the population at each of a list of outcrossing rates.
+		"""
+		return [self.calc_pop_lnL_components(outcrossing_rate)[1] for outcrossing_rate in outcrossing_rates]
+
+	@abc.abstractmethod
+	def update_locus(self, locus):
+		"""Recalculates the likelihood after the allele frequencies of a locus changed, and returns a snapshot for def restore_locus.
+		"""
+
+	@abc.abstractmethod
+	def restore_locus(self, snapshot):
+		"""Undoes a call to def update_locus using the snapshot it returned.
+		"""
+
+	@abc.abstractmethod
+	def update_inbreeding_histories(self, ih_prob_list):
+		"""Steps the inbreeding history of every family, and returns the inbreeding coefficients and the change in the ln likelihood.
+		"""
+
+	@abc.abstractmethod
+	def update_inbreeding_histories_gibbs(self, ih_prob_list):
+		"""Draws the inbreeding histories from their full conditional distribution, like def update_inbreeding_histories.
+		"""
+
+	@abc.abstractmethod
+	def update_mom_genotypes(self, outcrossing_rate):
+		"""Steps the maternal genotype at a random imputed locus of every family, and returns the families stepped and changed and the ln likelihood change.
+		"""
+
+	@abc.abstractmethod
+	def update_mom_genotypes_gibbs(self, outcrossing_rate):
+		"""Draws the maternal genotypes from their full conditional distribution, like def update_mom_genotypes.
+		"""
+
+	@abc.abstractmethod
+	def sync_families(self):
+		"""Copies the inbreeding histories and maternal genotypes of the engine into the Family and Individual objects.
+		"""
+
+	@abc.abstractmethod
+	def get_random_state(self):
+		"""Returns the state of the random number generators of the engine, other than the random module.
+		"""
+
+	@abc.abstractmethod
+	def set_random_state(self, random_state):
+		"""Restores the state of the random number generators of the engine returned by def get_random_state.
+		"""
+
+class ReferenceEngine(LikelihoodCache, Engine):
+	"""The ReferenceEngine steps the Family and Individual objects one family at a time, and gives the reference output of BORICE.
+	"""
+	def __init__(self, population, null_loci, seed = None):
+		LikelihoodCache.__init__(self, population, null_loci)
+
+	def update_inbreeding_histories(self, ih_prob_list):
+		"""Steps the inbreeding history of every family with a Metropolis move.
+		"""
+		f_list = []
+		old_mom_lnL = dict(self.mom_lnL)
+		for fam in self.population.family_list:
+			prev_ih = fam.inbreeding_history
+			prev_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
+			prev_mom_lnL = self.mom_lnL[fam]
+
+			rand_num = random.random()
+			cumulative_prob = 0
+			ih_value = 0
+			i = 0
+			# choose new inbreeding history value
+			while i == 0:
+				cumulative_prob = cumulative_prob + ih_prob_list[ih_value]
+				if rand_num < cumulative_prob:
+					new_ih = ih_value
+					i = 1
+				else:
+					ih_value = ih_value + 1
+
+			fam.inbreeding_history = new_ih
+			new_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
+			lnL = fam.mom.calc_prob_mom_geno(fam.population_name)
+			if (lnL == float('-inf')):
+				fam.inbreeding_history = prev_ih
+				prev_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
+				f_list.append(prev_f)
+			else:
+				lnL_ratio = (lnL - prev_mom_lnL)
+				if (lnL_ratio > 0):
+					prev_ih = fam.inbreeding_history
+					new_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
+					self.refresh_mom(fam)
+					f_list.append(new_f)
+				else:
+					rand = random.random()
+					value = math.exp(lnL_ratio)
+					if (rand < value):
+						prev_ih = fam.inbreeding_history
+						new_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
+						self.refresh_mom(fam)
+						f_list.append(new_f)
+					else:
+						fam.inbreeding_history = prev_ih
+						prev_f = fam.mom.calc_inbreeding_coefficient(fam.inbreeding_history)
+						f_list.append(prev_f)
+		return f_list, (0.0, self.calc_mom_lnL_change(old_mom_lnL))
+
+	def update_inbreeding_histories_gibbs(self, ih_prob_list):
+		"""Draws the inbreeding history of every family from its full conditional distribution.
+		"""
+		f_list = []
+		old_mom_lnL = dict(self.mom_lnL)
+		for fam in self.population.family_list:
+			prev_ih = fam.inbreeding_history
+			ih_lnL = []
+			for ih, ih_prob in enumerate(ih_prob_list):
+				fam.mom.calc_inbreeding_coefficient(ih)
+				ih_lnL.append(calc_log(ih_prob) + fam.mom.calc_prob_mom_geno(self.population))
+			max_lnL = max(ih_lnL)
+			new_ih = prev_ih
+			if max_lnL != float('-inf'):
+				ih_probs = [math.exp(lnL - max_lnL) for lnL in ih_lnL]
+				rand_num = random.random() * sum(ih_probs)
+				cumulative_prob = 0.0
+				for ih, ih_prob in enumerate(ih_probs):
+					cumulative_prob = cumulative_prob + ih_prob
+					if rand_num < cumulative_prob:
+						new_ih = ih
+						break
+			fam.inbreeding_history = new_ih
+			f_list.append(fam.mom.calc_inbreeding_coefficient(new_ih))
+			if new_ih != prev_ih:
+				self.refresh_mom(fam)
+		return f_list, (0.0, self.calc_mom_lnL_change(old_mom_lnL))
+
+	def update_mom_genotypes(self, outcrossing_rate):
+		"""Steps the maternal genotype at a random imputed locus of every family with a Metropolis move.
+		"""
+		population = self.population
+		null_loci = self.null_loci
+		changed = 0
+		progeny_lnL_change = 0.0
+		old_mom_lnL = dict(self.mom_lnL)
+		for fam in population.imputed_family_list:
+			# one locus at a time is changed in each family; locus chosen randomly among the imputed loci
+			random_locus = random.randint(0, len(fam.imputed_loci) - 1)
+			locus_index = fam.imputed_loci[random_locus]
+			genotype = fam.mom.genotype_list[locus_index]
+			allele_freq = population.allele_freq_list[locus_index]
+			old_genotype = (genotype.first, genotype.second)
+
+			prev_first = genotype.first
+			prev_second = genotype.second
+			prev_fam_lnL = self.calc_progeny_lnL(fam, outcrossing_rate)
+			# returns a tuple with new maternal alleles = (new_first, new_second)
+			new_mom = genotype.impute_new_mom(allele_freq, fam.mom.inbreeding_coefficient, locus_index, null_loci)
+			new_first = new_mom[0]
+			new_second = new_mom[1]
+
+			# a genotype the offspring cannot have come from has a likelihood of zero, and is rejected without recalculating the family
+			if fam.mom_compatibility[locus_index].is_compatible(new_first, new_second, null_loci[locus_index]):
+				# sets new maternal alleles and calculates family lnL; only the changed locus is recalculated
+				genotype.first = new_first
+				genotype.second = new_second
+				prev_fam_likelihood = self.update_family_locus(fam, locus_index)
+				new_fam_lnL = self.calc_progeny_lnL(fam, outcrossing_rate)
+				if (new_fam_lnL == float('-inf')):
+					genotype.first = prev_first
+					genotype.second = prev_second
+					self.restore_family_locus(fam, prev_fam_likelihood)
+				else:
+					fam_lnL_ratio = self.heat * (new_fam_lnL - prev_fam_lnL)
+					if (fam_lnL_ratio > 0):
+						prev_first = genotype.first
+						prev_second = genotype.second
+					else:
+						rand = random.random()
+						value = math.exp(fam_lnL_ratio)
+						if (rand < value):
+							prev_first = genotype.first
+							prev_second = genotype.second
+						else:
+							genotype.first = prev_first
+							genotype.second = prev_second
+							self.restore_family_locus(fam, prev_fam_likelihood)
+			if (genotype.first, genotype.second) != old_genotype:
+				changed = changed + 1
+				progeny_lnL_change = progeny_lnL_change + (new_fam_lnL - prev_fam_lnL)
+
+			for n, genotype in enumerate(fam.mom.genotype_list):
+				genotype_key = get_genotype_key(genotype)
+				if genotype_key not in fam.possible_genotypes[n]:
+					fam.possible_genotypes[n].append(genotype_key)
+		return len(population.imputed_family_list), changed, (progeny_lnL_change, self.calc_mom_lnL_change(old_mom_lnL))
+
+	def update_mom_genotypes_gibbs(self, outcrossing_rate):
+		"""Draws the maternal genotype at a random imputed locus of every family from its full conditional distribution.
+		"""
+		# candidates incompatible with the offspring have a likelihood of zero, and are left out
+		population = self.population
+		changed = 0
+		progeny_lnL_change = 0.0
+		old_mom_lnL = dict(self.mom_lnL)
+		for fam in population.imputed_family_list:
+			random_locus = random.randint(0, len(fam.imputed_loci) - 1)
+			locus_index = fam.imputed_loci[random_locus]
+			genotype = fam.mom.genotype_list[locus_index]
+			old_genotype = (genotype.first, genotype.second)
+			if genotype.imputed:
+				# the null allele (allele zero) is only a candidate at null loci
+				min_allele = 0 if self.null_loci[locus_index] else 1
+				num_alleles = len(population.allele_freq_list[locus_index])
+				candidates = [(first, second) for second in range(min_allele, num_alleles) for first in range(min_allele, second + 1)]
+			else:
+				candidates = [(0, genotype.second), (genotype.second, genotype.second)]
+			# candidates the offspring cannot have come from are left out (see class MomCompatibility)
+			compatibility = fam.mom_compatibility[locus_index]
+			candidates = [(first, second) for first, second in candidates if compatibility.is_compatible(first, second, self.null_loci[locus_index])]
+			candidate_lnL = []
+			for first, second in candidates:
+				genotype.first, genotype.second = first, second
+				snapshot = self.update_family_locus(fam, locus_index)
+				candidate_lnL.append(calc_log(fam.mom.calc_prob_mom_locus(locus_index, population)) + self.heat * self.calc_progeny_lnL(fam, outcrossing_rate))
+				self.restore_family_locus(fam, snapshot)
+			max_lnL = max(candidate_lnL, default = float('-inf'))
+			new_genotype = old_genotype
+			if max_lnL != float('-inf'):
+				candidate_probs = [math.exp(lnL - max_lnL) for lnL in candidate_lnL]
+				rand_num = random.random() * sum(candidate_probs)
+				cumulative_prob = 0.0
+				for candidate, candidate_prob in zip(candidates, candidate_probs):
+					cumulative_prob = cumulative_prob + candidate_prob
+					if rand_num < cumulative_prob:
+						new_genotype = candidate
+						break
+			if new_genotype != old_genotype:
+				prev_fam_lnL = self.calc_progeny_lnL(fam, outcrossing_rate)
+			genotype.first, genotype.second = new_genotype
+			self.update_family_locus(fam, locus_index)
+			if new_genotype != old_genotype:
+				changed = changed + 1
+				progeny_lnL_change = progeny_lnL_change + (self.calc_progeny_lnL(fam, outcrossing_rate) - prev_fam_lnL)
+
+			for n, genotype in enumerate(fam.mom.genotype_list):
+				genotype_key = get_genotype_key(genotype)
+				if genotype_key not in fam.possible_genotypes[n]:
+					fam.possible_genotypes[n].append(genotype_key)
+		return len(population.imputed_family_list), changed, (progeny_lnL_change, self.calc_mom_lnL_change(old_mom_lnL))
+
+	def sync_families(self):
+		"""The Family and Individual objects are the state of the ReferenceEngine, and are always up to date.
+		"""
+		pass
+
+	def get_random_state(self):
+		"""The ReferenceEngine only draws from the random module.
+		"""
+		return None
+
+	def set_random_state(self, random_state):
+		"""The ReferenceEngine only draws from the random module.
+		"""
+		pass
+
+def cross_check_engine(engine, engine_name, check_engine_class, check_engine_name, population, null_loci, step, move, tolerance):
+	"""Checks that a new engine of another kind gives the same ln likelihood as the engine of the chain.
+	"""
+	engine.sync_families()
+	check_engine = check_engine_class(population, null_loci)
+	for outcrossing_rate in (population.outcrossing_rate, 0.0, 1.0):
+		lnL = engine.calc_pop_lnL(outcrossing_rate)
+		check_lnL = check_engine.calc_pop_lnL(outcrossing_rate)
+		if (lnL != check_lnL) and not math.isclose(lnL, check_lnL, rel_tol = tolerance):
+			raise EngineMismatchError(step, move, engine_name, lnL, check_engine_name, check_lnL, outcrossing_rate)
@@ -4,15 +4,25 @@ from .genotype import *
 class Family(object):
 	"""A Family object is a maternal individual, its offspring, and its inbreeding history.
 	"""
+	__slots__ = ('name', 'mom', 'pop_name', 'population_name', 'offspring', 'observed_offspring', 'patterns', 'pattern_counts', 'offspring_pattern', 'observed_patterns', 'inbreeding_history_list', 'inbreeding_history', 'locus_genotypes', 'possible_genotypes', 'imputed_loci', 'mom_compatibility')
+
 	def __init__(self, name):
 		self.name = name
 		self.mom = None
 		self.pop_name = None
+		self.population_name = None
 		self.offspring = []
+		self.observed_offspring = []
+		self.patterns = []
+		self.pattern_counts = []
+		self.offspring_pattern = []
+		self.observed_patterns = []
 		self.inbreeding_history_list = []
 		self.inbreeding_history = 0
 		self.locus_genotypes = []
 		self.possible_genotypes = []
+		self.imputed_loci = []
+		self.mom_compatibility = []
 	
 	def add_mom(self, mom):
 		"""Adds a mom to a family unless one's already there.
@@ -23,8 +33,49 @@ class Family(object):
 	def add_offspring(self, offspring):
 		"""Adds offspring to a family."""
 		self.offspring.append(offspring)
+
+	def index_observed_offspring(self, num_loci):
+		"""Builds, for each locus, the positions of the offspring with data at that locus.
+		"""
+		self.observed_offspring = [[] for n in range(num_loci)]
+		for i, child in enumerate(self.offspring):
+			for n in child.observed_loci:
+				self.observed_offspring[n].append(i)
+
+	def index_offspring_patterns(self, num_loci):
+		"""Collapses offspring with identical multilocus genotypes into patterns.
+		"""
+		pattern_index = {}
+		self.patterns = []
+		self.pattern_counts = []
+		self.offspring_pattern = []
+		for child in self.offspring:
+			# observed genotypes are shared instances (see def get_observed_genotype), so a pattern is the tuple of its genotypes
+			key = tuple(child.genotype_list)
+			p = pattern_index.get(key)
+			if p is None:
+				p = len(self.patterns)
+				pattern_index[key] = p
+				self.patterns.append(child)
+				self.pattern_counts.append(0)
+			self.pattern_counts[p] = self.pattern_counts[p] + 1
+			self.offspring_pattern.append(p)
+		self.observed_patterns = [[] for n in range(num_loci)]
+		for p, child in enumerate(self.patterns):
+			for n in child.observed_loci:
+				self.observed_patterns[n].append(p)
+
+	def index_mom_compatibility(self, num_loci):
+		"""Builds, for each locus, the MomCompatibility of the offspring with data at that locus.
+		"""
+		self.mom_compatibility = [MomCompatibility([self.patterns[p] for p in self.observed_patterns[n]], n) for n in range(num_loci)]
+
+	def get_observed_offspring(self, locus):
+		"""Returns the offspring with data at a locus.
+		"""
+		return [self.offspring[i] for i in self.observed_offspring[locus]]
 	
-	def infer_mom(self, null_loci, ignore_genotyping_errors):
+	def infer_mom(self, null_loci, ignore_genotyping_errors, allele_list):
 		"""Infers a maternal genotype for a family from offspring data.
 		"""
 		# constructs a list of observed alleles
@@ -34,17 +85,21 @@ class Family(object):
 		for i in range(num_loci):
 			observed_alleles.append(set())
 
-		# adds observed alleles at each locus 
+		# adds observed alleles at each locus; alleles are collected by name so that candidate maternal
+		# genotypes are tried in the same order as before genotypes were coded as allele indices
 		for child in self.offspring:
 			for i in range(num_loci):
 				cg = child.genotype_list[i]
 				allele_set = observed_alleles[i]
-				allele_set.add(cg.first)
-				allele_set.add(cg.second)
+				allele_set.add(get_allele_name(cg.first, allele_list[i]))
+				allele_set.add(get_allele_name(cg.second, allele_list[i]))
 				allele_set.discard(-9)
 				null = null_loci[i]
 				if null:
 					allele_set.add(0)
+		for i in range(num_loci):
+			allele_index = get_allele_index(allele_list[i])
+			observed_alleles[i] = [allele_index[allele] for allele in observed_alleles[i]]
 
 		# case for no mom genotype
 		if not self.mom:
@@ -54,7 +109,7 @@ class Family(object):
 				if len(allele_set) == 0:
 					mg = None
 				else:
-					mg = find_mom_genotype(allele_set, self.offspring, i, null_loci, self.name)
+					mg = find_mom_genotype(allele_set, self.mom_compatibility[i], i, null_loci, self.name, allele_list[i])
 					assert mg
 				mom_geno_list.append(mg)
 			assert len(mom_geno_list) == num_loci
@@ -68,7 +123,7 @@ class Family(object):
 				if (geno.first == -9) and (geno.second == -9):
 					missing.append(n)
 				else: # case for observed mom, but null allele possible
-					mg = tag_mom_genotype(geno.first, geno.second, self.offspring, n, null_loci, self.name, ignore_genotyping_errors)
+					mg = tag_mom_genotype(geno.first, geno.second, self.mom_compatibility[n], n, null_loci, self.name, ignore_genotyping_errors, allele_list[n])
 					assert mg
 					self.mom.genotype_list[n] = mg
 					
@@ -77,10 +132,22 @@ class Family(object):
 				if len(allele_set) == 0:
 					mg = None
 				else:
-					mg = find_mom_genotype(allele_set, self.offspring, i, null_loci, self.name)
+					mg = find_mom_genotype(allele_set, self.mom_compatibility[i], i, null_loci, self.name, allele_list[i])
 					assert mg
 				self.mom.genotype_list[i] = mg
 
+		self.index_imputed_loci()
+
+	def index_imputed_loci(self):
+		"""Builds the list of loci at which the maternal genotype was imputed.
+		"""
+		self.imputed_loci = []
+		for n, genotype in enumerate(self.mom.genotype_list):
+			if genotype == None:
+				continue
+			if genotype.imputed or genotype.observed_imputed:
+				self.imputed_loci.append(n)
+
 	def __lt__(self, other):
 		return str(self) < str(other)
 				
@@ -101,16 +168,14 @@ class Family(object):
 	def calc_family_lnL(self, outcrossing_rate, null_loci):
 		"""Calculates the ln likelihood value for the entire family (mom and offspring).
 		"""
-		lnL = 0.0
-		for offspring in self.offspring:
-			lnL = lnL + offspring.calc_prob_offspring_geno(outcrossing_rate, self.population_name, self.mom, null_loci)
+		lnL = self.calc_progeny_lnL(outcrossing_rate, null_loci)
 		lnL = lnL + self.mom.calc_prob_mom_geno(self.population_name)
 		return lnL
 	
 	def calc_progeny_lnL(self, outcrossing_rate, null_loci):
-		"""Calculates the ln likelihood value for only the offspring of a family.
+		"""Calculates the ln likelihood value for only the offspring of a family, once per offspring pattern.
 		"""
 		lnL = 0.0
-		for offspring in self.offspring:
-			lnL = lnL + offspring.calc_prob_offspring_geno(outcrossing_rate, self.population_name, self.mom, null_loci)
+		for offspring, count in zip(self.patterns, self.pattern_counts):
+			lnL = lnL + (count * offspring.calc_prob_offspring_geno(outcrossing_rate, self.population_name, self.mom, null_loci))
 		return lnL
\ No newline at end of file
@@ -1,7 +1,7 @@
 import math
 import random
 
-def tag_mom_genotype(momfirst, momsecond, offspring, locus_index, null_loci, family, ignore_genotyping_errors):
+def tag_mom_genotype(momfirst, momsecond, compatibility, locus_index, null_loci, family, ignore_genotyping_errors, allele_list):
 	"""Tags an observed maternal genotype as imputed if it is a homozygote, and returns a SingleLocusGenotype. This is for the purpose of dealing with null alleles.
 	"""
 # #	for testing only when moms need to be read in as is!
@@ -9,159 +9,130 @@ def tag_mom_genotype(momfirst, momsecond, offspring, locus_index, null_loci, fam
 #  	slg.imputed = True
 #  	return slg
 	
-	m_list = [momfirst, momsecond]
-	works = True
-	for child in offspring:
-		cg = child.genotype_list[locus_index]
-		# skips missing genotypes
-		if ignore_genotyping_errors or ((cg.first == -9) and (cg.second == -9)):
-			continue
-		# checks that the observed genotype is possible based on the progeny genotype
-		if (cg.first not in m_list) and (cg.second not in m_list):
-			works = False
-			break
-	
 	null = null_loci[locus_index]
-	if null:
-		if works:
-			if (momfirst == momsecond):
-				slg = SingleLocusGenotype(momfirst, momsecond)
-				slg.observed_imputed = True
-				return slg
-			else:
-				slg = SingleLocusGenotype(momfirst, momsecond)
-				return slg
-		else:
-			if (momfirst == momsecond):
-				null_allele = 0
-				momfirst = null_allele
-				m_list = [momfirst, momsecond]
-				works = True
-				for child in offspring:
-					cg = child.genotype_list[locus_index]
-					# skips missing genotypes
-					if ignore_genotyping_errors or ((cg.first == -9) and (cg.second == -9)):
-						continue
-					# checks that imputed null genotype is possible based on progeny genotype
-					if (cg.first == cg.second):
-						if (cg.first not in m_list) and (null_allele not in m_list):
-							works = False
-							break
-					else:
-						if (cg.first not in m_list) and (cg.second not in m_list):
-							works = False
-							break
-				if works:
-					slg = SingleLocusGenotype(momfirst, momsecond)
-					slg.observed_imputed = True
-					return slg
-				else:
-					raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family)
-			else:
-				if (momfirst == 0):
-					null_allele = 0
-					m_list = [momfirst, momsecond]
-					works = True
-					for child in offspring:
-						cg = child.genotype_list[locus_index]
-						# skips missing genotypes
-						if ignore_genotyping_errors or ((cg.first == -9) and (cg.second == -9)):
-							continue
-						# checks that null heterozygote genotype is possible based on progeny genotype
-						if (cg.first == cg.second):
-							if (cg.first not in m_list) and (null_allele not in m_list):
-								works = False
-								break
-						else:
-							if (cg.first not in m_list) and (cg.second not in m_list):
-								works = False
-								break
-					if works:
-						slg = SingleLocusGenotype(momfirst, momsecond)
-						return slg
-					else:
-						raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family)
-				else:
-					raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family)
-	else:
-		if works:
-			slg = SingleLocusGenotype(momfirst, momsecond)
-			return slg
-		else:
-			raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family)
+	homozygote = (momfirst == momsecond)
+	unmet = 0
+	# skips the checks when genotyping errors are ignored
+	if not ignore_genotyping_errors:
+		# checks that the observed genotype is possible based on the progeny genotypes
+		unmet = compatibility.find_unmet(momfirst, momsecond, False)
+	if unmet and null and (homozygote or (momfirst == 0)):
+		# an observed homozygote may be a null heterozygote; checks the null heterozygote, which observed homozygous progeny may have received the null allele from
+		momfirst = 0
+		unmet = compatibility.find_unmet(momfirst, momsecond, True)
+	if unmet:
+		cg = compatibility.get_first_genotype(unmet)
+		raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family, allele_list)
+	slg = SingleLocusGenotype(momfirst, momsecond)
+	slg.observed_imputed = bool(null and homozygote)
+	return slg
 
-def find_mom_genotype(allele_set, offspring, locus_index, null_loci, family, valid_geno_index = 0):
+def find_mom_genotype(allele_set, compatibility, locus_index, null_loci, family, allele_list):
 	"""Imputes a maternal genotype, tags it as imputed, and returns a SingleLocusGenotype.
 	"""
 	# selects the first maternal genotype that works for the family
 	null = null_loci[locus_index]
-	if null:
-		null_allele = 0
-		for momfirst in allele_set:
-			for momsecond in allele_set:
-				m_list = [momfirst, momsecond]
-				works = True
-				for child in offspring:
-					cg = child.genotype_list[locus_index]
-					# skips missing genotypes
-					if (cg.first == -9) and (cg.second == -9):
-						continue
-					# checks that imputed genotype is possible based on progeny genotype
-					if (cg.first == cg.second):
-						if (cg.first not in m_list) and (null_allele not in m_list):
-							if valid_geno_index == 0:
-								works = False
-								break
-							else:
-								valid_geno_index = valid_geno_index - 1
-					else:
-						if (cg.first not in m_list) and (cg.second not in m_list):
-							if valid_geno_index == 0:
-								works = False
-								break
-							else:
-								valid_geno_index = valid_geno_index - 1
-				if works:
-					slg = SingleLocusGenotype(momfirst, momsecond)
-					slg.imputed = True
-					return slg
-		
-		if works:
-			pass
-		else:
-			raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family)
-	else:
-		for momfirst in allele_set:
-			for momsecond in allele_set:
-				m_list = [momfirst, momsecond]
-				works = True
-				for child in offspring:
-					cg = child.genotype_list[locus_index]
-					# skips missing genotypes
-					if (cg.first == -9) and (cg.second == -9):
-						continue
-					# checks that imputed genotype is possible based on progeny genotype
-					if (cg.first not in m_list) and (cg.second not in m_list):
-						if valid_geno_index == 0:
-							works = False
-							break
-						else:
-							valid_geno_index = valid_geno_index - 1
-				if works:
-					slg = SingleLocusGenotype(momfirst, momsecond)
-					slg.imputed = True
-					return slg
-		if works:
-			pass
-		else:
-			raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family)
+	for momfirst in allele_set:
+		for momsecond in allele_set:
+			# checks that imputed genotype is possible based on progeny genotypes
+			unmet = compatibility.find_unmet(momfirst, momsecond, null)
+			if not unmet:
+				slg = SingleLocusGenotype(momfirst, momsecond)
+				slg.imputed = True
+				return slg
+	cg = compatibility.get_first_genotype(unmet)
+	raise SingleLocusGenotypeError(cg.first, cg.second, locus_index, family, allele_list)
+
+class MomCompatibility(object):
+	"""A MomCompatibility indexes the offspring genotypes of a family at one locus by the maternal alleles they could have received.
+	"""
+	# every distinct offspring genotype is a bit; a maternal genotype is possible when the bitsets of its two alleles cover them all
+	__slots__ = ('genotypes', 'all_genotypes', 'allele_bits', 'homozygote_bits')
+
+	def __init__(self, offspring, locus):
+		genotype_bits = {}
+		self.genotypes = []
+		self.allele_bits = {}
+		self.homozygote_bits = 0
+		for child in offspring:
+			cg = child.genotype_list[locus]
+			# observed genotypes are shared instances (see def get_observed_genotype)
+			if cg in genotype_bits:
+				continue
+			bit = 1 << len(self.genotypes)
+			genotype_bits[cg] = bit
+			self.genotypes.append(cg)
+			for allele in set((cg.first, cg.second)):
+				self.allele_bits[allele] = self.allele_bits.get(allele, 0) | bit
+			if cg.first == cg.second:
+				self.homozygote_bits = self.homozygote_bits | bit
+		self.all_genotypes = (1 << len(self.genotypes)) - 1
+
+	def find_unmet(self, first, second, null):
+		"""Returns the bitset of the offspring genotypes that a maternal genotype cannot have given.
+		"""
+		met = self.allele_bits.get(first, 0) | self.allele_bits.get(second, 0)
+		if null and ((first == 0) or (second == 0)):
+			met = met | self.homozygote_bits
+		return self.all_genotypes & ~met
+
+	def is_compatible(self, first, second, null):
+		"""Returns True if a maternal genotype is possible given the offspring genotypes.
+		"""
+		return not self.find_unmet(first, second, null)
+
+	def list_compatible(self, num_alleles, null):
+		"""Returns whether each genotype of a locus is a possible maternal genotype, in the order of their genotype codes.
+		"""
+		return [self.is_compatible(first, second, null) for second in range(num_alleles) for first in range(second + 1)]
+
+	def get_first_genotype(self, genotype_bits):
+		"""Returns the offspring genotype of the lowest bit of a bitset.
+		"""
+		return self.genotypes[(genotype_bits & -genotype_bits).bit_length() - 1]
+
+def get_allele_name(allele, allele_list):
+	"""Returns the name of an allele from its index in the allele list of its locus.
+	"""
+	if allele == -9:
+		return allele
+	return allele_list[allele]
+
+def get_genotype_code(first, second):
+	"""Returns the code of a genotype made up of two allele indices (first <= second), or -1 for missing data.
+	"""
+	if first == -9:
+		return -1
+	return ((second * (second + 1)) // 2) + first
+
+def get_allele_index(allele_list):
+	"""Returns a dictionary mapping the allele names of a locus to their index in its allele list.
+	"""
+	allele_index = {-9: -9}
+	for i, allele in reversed(list(enumerate(allele_list))):
+		allele_index[allele] = i
+	return allele_index
+
+def get_genotype_key(genotype):
+	"""Returns a (first, second) tuple of allele indices identifying a genotype, or None if there is no genotype.
+	"""
+	if genotype == None:
+		return None
+	return (genotype.first, genotype.second)
+
+def get_genotype_name(key, allele_list):
+	"""Returns the genotype string of a key returned by def get_genotype_key.
+	"""
+	if key == None:
+		return str(None)
+	return repr(get_allele_name(key[0], allele_list)) + '/' + repr(get_allele_name(key[1], allele_list))
 
 class SingleLocusGenotypeError(Exception):
 	"""Makes a SingleLocusGenotypeError class. If an impossible genotype is encountered in the data, it prints the genotype and identifies the family in which it occurs.
 	"""
-	def __init__(self, first, second, locus, family):
-		self.first = first
-		self.second = second
+	def __init__(self, first, second, locus, family, allele_list):
+		self.first = get_allele_name(first, allele_list)
+		self.second = get_allele_name(second, allele_list)
 		self.locus_number = locus
 		self.family = family
 		
@@ -171,6 +142,9 @@ class SingleLocusGenotypeError(Exception):
 class SingleLocusGenotype(object):
 	"""A SingleLocusGenotype is an object made up of two alleles, 'first' and 'second'. Alleles in a genotype are ordered smallest (first) to largest (second).
 	"""
+	# alleles are indices in the allele list of their locus: 0 is the null allele, and -9 is missing data
+	__slots__ = ('first', 'second', 'imputed', 'observed_imputed')
+
 	def __init__(self, first, second):
 		self.first = min(first, second)
 		self.second = max(first, second)
@@ -181,7 +155,46 @@ class SingleLocusGenotype(object):
 		"""Returns a genotype string with the first and second alleles separated by a slash.
 		"""
 		return repr(self.first) + '/' + repr(self.second)
-	
+
+	def get_code(self):
+		"""Returns the genotype code of this genotype (see def get_genotype_code).
+		"""
+		return get_genotype_code(self.first, self.second)
+
+	def calc_prob_offspring_given_selfing(self, mom_g, locus, null):
+		"""Calculates the probability of an offspring genotype given selfing and its maternal genotype.
+		"""
+		if mom_g == None:
+			return self.calc_prob_offspring_given_selfing_mom_homozygote_standard_model(mom_g, locus)
+		mh = (mom_g.first == mom_g.second)
+		if null:
+			if mh:
+				return self.calc_prob_offspring_given_selfing_mom_homozygote_null_model(mom_g, locus)
+			else:
+				return self.calc_prob_offspring_given_selfing_mom_heterozygote_null_model(mom_g, locus)
+		else:
+			if mh:
+				return self.calc_prob_offspring_given_selfing_mom_homozygote_standard_model(mom_g, locus)
+			else:
+				return self.calc_prob_offspring_given_selfing_mom_heterozygote_standard_model(mom_g, locus)
+
+	def calc_prob_offspring_given_outcrossing(self, allele_freq, mom_g, locus, null):
+		"""Calculates the probability of an offspring genotype given outcrossing and its maternal genotype.
+		"""
+		if mom_g == None:
+			return self.calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(allele_freq, mom_g, locus)
+		mh = (mom_g.first == mom_g.second)
+		if null:
+			if mh:
+				return self.calc_prob_offspring_given_outcrossing_mom_homozygote_null_model(allele_freq, mom_g, locus)
+			else:
+				return self.calc_prob_offspring_given_outcrossing_mom_heterozygote_null_model(allele_freq, mom_g, locus)
+		else:
+			if mh:
+				return self.calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(allele_freq, mom_g, locus)
+			else:
+				return self.calc_prob_offspring_given_outcrossing_mom_heterozygote_standard_model(allele_freq, mom_g, locus)
+
 	def calc_prob_offspring_given_selfing_mom_homozygote_standard_model(self, mom_g, locus):
 		"""Calculates the probability of a homozygous offspring genotype given selfing and its maternal genotype; no null alleles, no allelic drop-out.
 		"""
@@ -191,13 +204,10 @@ class SingleLocusGenotype(object):
 			mf = mom_g.first
 			sf, ss = self.first, self.second
 			sh = (sf == ss)
-			if (sf == -9) and (ss == -9): # missing data; effectively skips the locus
+			if sh and (sf == mf): # offspring is homozygous
 				return 1.0
-			else:
-				if sh and (sf == mf): # offspring is homozygous
-					return 1.0
-				else: # impossible genotype
-					return 0.0
+			else: # impossible genotype
+				return 0.0
 
 	def calc_prob_offspring_given_selfing_mom_homozygote_null_model(self, mom_g, locus):
 		"""Calculates the probability of a homozygous offspring genotype given selfing and its maternal genotype with null alleles.
@@ -205,19 +215,16 @@ class SingleLocusGenotype(object):
 		mf = mom_g.first
 		sf, ss = self.first, self.second
 		sh = (sf == ss)
-		if (sf == -9) and (ss == -9): # missing data; effectively skips the locus
-			return 1.0
-		else:
-			if (mf == 0): # mom is homozygous null
-				return 0.0
-			else: # mom is not homozygous null
-				if sh: # offspring is homozygous
-					if (sf == mf):
-						return 1.0
-					else: # impossible genotype
-						return 0.0
-				else: # offspring is het
+		if (mf == 0): # mom is homozygous null
+			return 0.0
+		else: # mom is not homozygous null
+			if sh: # offspring is homozygous
+				if (sf == mf):
+					return 1.0
+				else: # impossible genotype
 					return 0.0
+			else: # offspring is het
+				return 0.0
 	
 	def calc_prob_offspring_given_selfing_mom_heterozygote_standard_model(self, mom_g, locus):
 		"""Calculates the probability of a heterozygous offspring genotype given selfing and its maternal genotype; no null alleles, no allelic drop-out.
@@ -228,9 +235,7 @@ class SingleLocusGenotype(object):
 			mf, ms = mom_g.first, mom_g.second
 			sf, ss = self.first, self.second
 			sh = (sf == ss)
-			if (sf == -9) and (ss == -9): # missing data
-				return 1.0
-			elif (sf != mf) and (sf != ms) and (ss != mf) and (ss != ms): # impossible genotype
+			if (sf != mf) and (sf != ms) and (ss != mf) and (ss != ms): # impossible genotype
 				return 0.0
 			elif sh: # offspring is homozygous
 				return 0.25
@@ -245,25 +250,22 @@ class SingleLocusGenotype(object):
 		mf, ms = mom_g.first, mom_g.second
 		sf, ss = self.first, self.second
 		sh = (sf == ss)
-		if (sf == -9) and (ss == -9): # missing data
-			return 1.0
-		else:
-			if (mf == 0): # mom is het with null allele	
-				if sh and (sf == ms): # offspring is homozygous and not null
-					return 1.0
-				else: # impossible genotype
-					return 0.0
-			else: # mom is het without null allele
-				if (sf != mf) and (sf != ms) and (ss != mf) and (ss != ms): # impossible genotype
-					return 0.0
-				elif sh: # offspring is homozygous
-					return 0.25
-				elif (sf == mf) and (ss == ms): # offspring is identical het
-					return 0.5
-				else: # offspring is non-identical het
-					return 0.0
+		if (mf == 0): # mom is het with null allele	
+			if sh and (sf == ms): # offspring is homozygous and not null
+				return 1.0
+			else: # impossible genotype
+				return 0.0
+		else: # mom is het without null allele
+			if (sf != mf) and (sf != ms) and (ss != mf) and (ss != ms): # impossible genotype
+				return 0.0
+			elif sh: # offspring is homozygous
+				return 0.25
+			elif (sf == mf) and (ss == ms): # offspring is identical het
+				return 0.5
+			else: # offspring is non-identical het
+				return 0.0
 	
-	def calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(self, allele_list, allele_freq, mom_g, locus):
+	def calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(self, allele_freq, mom_g, locus):
 		"""Calculates the probability of a homozygous offspring genotype given outcrossing and its maternal genotype; no null alleles, no allelic drop-out.
 		"""
 		if mom_g == None: # this is the case for a single-offspring family with no maternal genotype missing data at this locus; effectively skips the locus
@@ -271,56 +273,41 @@ class SingleLocusGenotype(object):
 		else:
 			mf, ms = mom_g.first, mom_g.second
 			sf, ss = self.first, self.second
-		
-			# missing data (-9) is not in the allele list and must be skipped
-			if (sf == -9) and (ss == -9):
-				return 1.0
-			else:
-				allele1 = allele_list.index(sf)
-				allele2 = allele_list.index(ss)
 
 			if (sf == mf):
-				return allele_freq[allele2]
+				return allele_freq[ss]
 			elif (ss == mf):
-				return allele_freq[allele1]
+				return allele_freq[sf]
 			else: # impossible genotype
 				return 0.0
 
-	def calc_prob_offspring_given_outcrossing_mom_homozygote_null_model(self, allele_list, allele_freq, mom_g, locus):
+	def calc_prob_offspring_given_outcrossing_mom_homozygote_null_model(self, allele_freq, mom_g, locus):
 		"""Calculates the probability of a homozygous offspring genotype given outcrossing and its maternal genotype with null alleles.
 		"""
 		mf, ms = mom_g.first, mom_g.second
 		sf, ss = self.first, self.second
 		sh = (sf == ss)
-		null_allele = allele_list.index(0)
-		
-		# missing data (-9) is not in the allele list and must be skipped
-		if (sf == -9) and (ss == -9):
-			return 1.0
-		else:
-			allele1 = allele_list.index(sf)
-			allele2 = allele_list.index(ss)
 		
 		if (mf == 0): # mom is homozygous null
 			if sh: # offspring is homozygous
-				return (allele_freq[allele1])/(1.0 - allele_freq[null_allele])
+				return (allele_freq[sf])/(1.0 - allele_freq[0])
 			else: # offspring is het
 				return 0.0
 		else: # mom is homozygous not null
 			if sh: # offspring is homozygous
 				if (sf == mf):
-					return (allele_freq[allele1] + allele_freq[null_allele])
+					return (allele_freq[sf] + allele_freq[0])
 				else: # impossible genotype
 					return 0.0
 			else: # offspring is het
 				if (sf == mf):
-					return allele_freq[allele2]
+					return allele_freq[ss]
 				elif (ss == mf):
-					return allele_freq[allele1]
+					return allele_freq[sf]
 				else: # impossible genotype
 					return 0.0
 	
-	def calc_prob_offspring_given_outcrossing_mom_heterozygote_standard_model(self, allele_list, allele_freq, mom_g, locus):
+	def calc_prob_offspring_given_outcrossing_mom_heterozygote_standard_model(self, allele_freq, mom_g, locus):
 		"""Calculates the probability of a heterozygous offspring genotype given outcrossing and its maternal genotype; no null alleles, no allelic drop-out.
 		"""
 		if mom_g == None: # this is the case for a single-offspring family with no maternal genotype missing data at this locus; effectively skips the locus
@@ -330,90 +317,73 @@ class SingleLocusGenotype(object):
 			sf, ss = self.first, self.second
 			sh = (sf == ss)
 		
-			# missing data (-9) is not in the allele list and must be skipped
-			if (sf == -9) and (ss == -9):
-				return 1.0
-			else:
-				allele1 = allele_list.index(sf)
-				allele2 = allele_list.index(ss)
-		
 			if sh: # offspring is homozygote
 				if (sf == mf):
-					return allele_freq[allele1] * 0.5
+					return allele_freq[sf] * 0.5
 				elif (sf == ms):
-					return allele_freq[allele2] * 0.5
+					return allele_freq[ss] * 0.5
 				else: # impossible genotype
 					return 0.0
 			else: # offspring is het
 				if (sf != mf) and (sf != ms) and (ss != mf) and (ss != ms): # impossible genotype
 					return 0.0
 				elif (sf != mf) and (sf != ms):
-					return allele_freq[allele1] * 0.5
+					return allele_freq[sf] * 0.5
 				elif (ss != mf) and (ss != ms):
-					return allele_freq[allele2] * 0.5
+					return allele_freq[ss] * 0.5
 				else: # offspring is identical het
-					return 0.5 * (allele_freq[allele1] + allele_freq[allele2])
+					return 0.5 * (allele_freq[sf] + allele_freq[ss])
 
-	def calc_prob_offspring_given_outcrossing_mom_heterozygote_null_model(self, allele_list, allele_freq, mom_g, locus):
+	def calc_prob_offspring_given_outcrossing_mom_heterozygote_null_model(self, allele_freq, mom_g, locus):
 		"""Calculates the probability of a heterozygous offspring genotype given outcrossing and its maternal genotype with null alleles.
 		"""
 		mf, ms = mom_g.first, mom_g.second
 		sf, ss = self.first, self.second
 		sh = (sf == ss)
-		null_allele = allele_list.index(0)
-		
-		# missing data (-9) is not in the allele list and must be skipped
-		if (sf == -9) and (ss == -9):
-			return 1.0
-		else:
-			allele1 = allele_list.index(sf)
-			allele2 = allele_list.index(ss)
 		
 		if (mf == 0): # mom is het with null allele
 			if sh:
 				if (sf == ms): # offspring is homozygote and matches maternal allele 2
-					return (allele_freq[allele1]/(1.0 - allele_freq[null_allele]) * 0.5) + ((allele_freq[allele1] + allele_freq[null_allele]) * 0.5)
+					return (allele_freq[sf]/(1.0 - allele_freq[0]) * 0.5) + ((allele_freq[sf] + allele_freq[0]) * 0.5)
 				else: # offspring is homozygote and does not match maternal allele 2
-					return allele_freq[allele1]/(1.0 - allele_freq[null_allele]) * 0.5
+					return allele_freq[sf]/(1.0 - allele_freq[0]) * 0.5
 			else: # offspring is het
 				if (sf == ms):
-					return allele_freq[allele2] * 0.5
+					return allele_freq[ss] * 0.5
 				elif (ss == ms):
-					return allele_freq[allele1] * 0.5
+					return allele_freq[sf] * 0.5
 				else: # impossible genotype
 					return 0.0
 		else: # mom is het without null allele
 			if sh: # offspring is homozygous
 				if (sf == mf):
-					return (allele_freq[allele1] + allele_freq[null_allele]) * 0.5
+					return (allele_freq[sf] + allele_freq[0]) * 0.5
 				elif (sf == ms):
-					return (allele_freq[allele1] + allele_freq[null_allele]) * 0.5
+					return (allele_freq[sf] + allele_freq[0]) * 0.5
 				else: # impossible genotype
 					return 0.0
 			else: # offspring is het
 				if (sf != mf) and (sf != ms) and (ss != mf) and (ss != ms): # impossible genotype
 					return 0.0
 				elif (sf != mf) and (sf != ms):
-					return allele_freq[allele1] * 0.5
+					return allele_freq[sf] * 0.5
 				elif (ss != mf) and (ss != ms):
-					return allele_freq[allele2] * 0.5
+					return allele_freq[ss] * 0.5
 				else: # offspring is identical het
-					return 0.5 * (allele_freq[allele1] + allele_freq[allele2])
+					return 0.5 * (allele_freq[sf] + allele_freq[ss])
 
-	def calc_prob_mom(self, allele_list, allele_freq, inbreeding_coefficient):
+	def calc_prob_mom(self, allele_freq, inbreeding_coefficient):
 		"""Calculates the probability of a maternal genotype given its inbreeding coefficient.
 		"""
 		sf, ss = self.first, self.second
 		sh = (sf == ss)
-		allele1 = allele_list.index(sf)
-		allele2 = allele_list.index(ss)
 		inb = (1.0 - inbreeding_coefficient)
 		if sh:
-			return (inb * math.pow(allele_freq[allele1], 2)) + (inbreeding_coefficient * allele_freq[allele1])
+			return (inb * math.pow(allele_freq[sf], 2)) + (inbreeding_coefficient * allele_freq[sf])
 		else:
-			return (inb * (2.0 * allele_freq[allele1] * allele_freq[allele2]))
+			return (inb * (2.0 * allele_freq[sf] * allele_freq[ss]))
 				
-	def impute_new_mom(self, allele_list, allele_freq, inbreeding_coefficient, locus, null_loci):
+	def impute_new_mom(self, allele_freq, inbreeding_coefficient, locus, null_loci):
 		"""Selects a new maternal genotype based on allele frequencies if there is no observed genotype at this locus. If the maternal genotype is an observed homozygote at this locus, a choice is made whether or not to step from the current genotype (homozygote or null heterozygote) based on the probability of those genotypes.
 		"""
 		assert round(sum(allele_freq), 1) == 1.0
@@ -434,7 +404,7 @@ class SingleLocusGenotype(object):
 			while i == 0:
 				cumulative_prob = cumulative_prob + allele_freq[first_allele]
 				if rand_num < cumulative_prob:
-					new_first = allele_list[first_allele]
+					new_first = first_allele
 					i = 1
 				else:
 					first_allele = first_allele + 1
@@ -456,7 +426,7 @@ class SingleLocusGenotype(object):
 					# mom is new het
 					cum_prob = cum_prob + allele_freq[second_allele]
 					if random_number < cum_prob:
-						new_second = allele_list[second_allele]
+						new_second = second_allele
 						j = 1
 					else:
 						second_allele = second_allele + 1
@@ -467,12 +437,10 @@ class SingleLocusGenotype(object):
 			new_second = max(j, k)
 		else:
 			if self.observed_imputed: # this should only be true when the mom is an observed homozygote
-				null_allele = allele_list.index(0)
-				allele = allele_list.index(ss)
 				r_num = random.random()
 				inb = (1.0 - inbreeding_coefficient)
 				if sh: # current genotype is same as observed homozygote
-					null_het_prob = inb * (2.0 * allele_freq[allele] * allele_freq[null_allele]) # prob of null het
+					null_het_prob = inb * (2.0 * allele_freq[ss] * allele_freq[0]) # prob of null het
 					if r_num < null_het_prob:
 						new_first = 0
 						new_second = ss
@@ -480,11 +448,41 @@ class SingleLocusGenotype(object):
 						new_first = sf
 						new_second = ss
 				else: # current genotype is null heterozygote alternative to observed homozygote
-					homozygote_prob = (inb * math.pow(allele_freq[allele], 2)) + (inbreeding_coefficient * allele_freq[allele]) # prob of homozygote
+					homozygote_prob = (inb * math.pow(allele_freq[ss], 2)) + (inbreeding_coefficient * allele_freq[ss]) # prob of homozygote
 					if r_num < homozygote_prob:
 						new_first = ss
 						new_second = ss
 					else:
 						new_first = sf
 						new_second = ss
-		return new_first, new_second
\ No newline at end of file
+		return new_first, new_second
+
+class ObservedGenotype(SingleLocusGenotype):
+	"""An ObservedGenotype is an immutable SingleLocusGenotype read from the data file.
+	"""
+	# identical observed genotypes share a single instance (see def get_observed_genotype), which stores its genotype code
+	__slots__ = ('code',)
+
+	def __init__(self, first, second):
+		super().__init__(first, second)
+		self.code = get_genotype_code(self.first, self.second)
+
+	def get_code(self):
+		"""Returns the stored genotype code of this genotype.
+		"""
+		return self.code
+
+	def __setattr__(self, name, value):
+		if hasattr(self, name):
+			raise AttributeError("An ObservedGenotype cannot be modified")
+		super().__setattr__(name, value)
+
+def get_observed_genotype(first, second, observed_genotypes):
+	"""Returns the shared ObservedGenotype made up of two alleles from the table observed_genotypes.
+	"""
+	key = (min(first, second), max(first, second))
+	genotype = observed_genotypes.get(key)
+	if genotype is None:
+		genotype = ObservedGenotype(first, second)
+		observed_genotypes[key] = genotype
+	return genotype
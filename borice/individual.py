@@ -3,9 +3,13 @@ import math
 class Individual(object):
 	"""An Individual object is a set of multilocus genotypes. Individuals belong to families, and are either an offspring or a mom of the family. Individuals also have inbreeding coefficients.
 	"""
+	__slots__ = ('family', 'genotype_list', 'observed_loci', 'inbreeding_coefficient')
+
 	def __init__(self, family, genotype_list, is_mom = False):
 		self.family = family
 		self.genotype_list = genotype_list
+		# sparse index of the loci with data, so that missing loci (-9) are skipped up front rather than multiplied in as 1.0
+		self.observed_loci = tuple(n for n, genotype in enumerate(genotype_list) if (genotype is not None) and (genotype.first != -9))
 		self.inbreeding_coefficient = 0.0
 		
 		# designate individuals as either mom or offspring of a family
@@ -23,25 +27,6 @@ class Individual(object):
 			x = x + str(locus) + ','
 		return x + ']'
 			
-	def get_imputed_loci(self, population):
-		"""Returns a list of genotypes that were imputed by def infer_mom or def tag_mom_genotype, and a list of the allele frequencies at each of those loci.
-		"""
-		imp = []
-		alleles = []
-		afreq = []
-		for n, genotype in enumerate(self.genotype_list):
-			allele_list = population.allele_list[n]
-			allele_freq = population.allele_freq_list[n]
-			if genotype == None:
-				continue
-			else:
-				if (genotype.imputed == True) or (genotype.observed_imputed == True):
-					imp.append(genotype)
-					alleles.append(allele_list)
-					afreq.append(allele_freq)
-		assert len(imp) == len(alleles) == len(afreq)
-		return imp, alleles, afreq
-	
 	def calc_inbreeding_coefficient(self, ih):
 		"""Calculates the inbreeding coefficient (f) of an individual.
 		"""
@@ -52,110 +37,66 @@ class Individual(object):
 			self.inbreeding_coefficient = 1.0
 		return self.inbreeding_coefficient
 	
+	def calc_prob_locus_given_selfing(self, n, mom, null_loci):
+		"""Calculates an individual's single-locus genotype probability at locus n given selfing.
+		"""
+		return self.genotype_list[n].calc_prob_offspring_given_selfing(mom.genotype_list[n], n, null_loci[n])
+
+	def calc_prob_locus_given_outcrossing(self, n, population, mom, null_loci):
+		"""Calculates an individual's single-locus genotype probability at locus n given outcrossing.
+		"""
+		return self.genotype_list[n].calc_prob_offspring_given_outcrossing(population.allele_freq_list[n], mom.genotype_list[n], n, null_loci[n])
+
+	def calc_lnL_offspring_selfing_outcrossing(self, population, mom, null_loci):
+		"""Calculates the ln of an individual's multilocus genotype probability given selfing and given outcrossing.
+		"""
+		# single-locus probabilities are summed in log space so that they do not underflow with many loci; missing loci are skipped
+		multilocus_selfing_lnL = 0.0
+		multilocus_outcrossing_lnL = 0.0
+		for n in self.observed_loci:
+			multilocus_selfing_lnL = multilocus_selfing_lnL + calc_log(self.calc_prob_locus_given_selfing(n, mom, null_loci))
+			multilocus_outcrossing_lnL = multilocus_outcrossing_lnL + calc_log(self.calc_prob_locus_given_outcrossing(n, population, mom, null_loci))
+		return multilocus_selfing_lnL, multilocus_outcrossing_lnL
+
 	def calc_prob_offspring_geno(self, outcrossing_rate, population, mom, null_loci):
-		"""Calculates an individual's multilocus genotype probability given its single-locus genotype probabilities.
+		"""Calculates the ln of an individual's multilocus genotype probability given its single-locus genotype probabilities.
 		"""
-		multilocus_selfing_prob = 1.0
-		for n, genotype in enumerate(self.genotype_list):
-			mom_g = mom.genotype_list[n]
-			if mom_g == None:
-				multilocus_selfing_prob = multilocus_selfing_prob * genotype.calc_prob_offspring_given_selfing_mom_homozygote_standard_model(mom_g, n)
-			else:
-				mf, ms = mom_g.first, mom_g.second
-				mh = (mf == ms)
-				null = null_loci[n]
-				if null:
-					if mh:
-						multilocus_selfing_prob = multilocus_selfing_prob * genotype.calc_prob_offspring_given_selfing_mom_homozygote_null_model(mom_g, n)
-					else:
-						multilocus_selfing_prob = multilocus_selfing_prob * genotype.calc_prob_offspring_given_selfing_mom_heterozygote_null_model(mom_g, n)
-				else:
-					if mh:
-						multilocus_selfing_prob = multilocus_selfing_prob * genotype.calc_prob_offspring_given_selfing_mom_homozygote_standard_model(mom_g, n)
-					else:
-						multilocus_selfing_prob = multilocus_selfing_prob * genotype.calc_prob_offspring_given_selfing_mom_heterozygote_standard_model(mom_g, n)
-		
-		#for testing only!
-# 		for n, genotype in enumerate(self.genotype_list):
-# 			mom_g = mom.genotype_list[n]
-# 			mf, ms = mom_g.first, mom_g.second
-# 			mh = (mf == ms)
-# 			null = null_loci[n]
-# 			if null:
-# 				if mh:
-# 					prob = genotype.calc_prob_offspring_given_selfing_mom_homozygote_null_model(mom_g, n)
-# 				else:
-# 					prob = genotype.calc_prob_offspring_given_selfing_mom_heterozygote_null_model(mom_g, n)
-# 			else:
-# 				if mh:
-# 					prob = genotype.calc_prob_offspring_given_selfing_mom_homozygote_standard_model(mom_g, n)
-# 				else:
-# 					prob = genotype.calc_prob_offspring_given_selfing_mom_heterozygote_standard_model(mom_g, n)
-# 			print("Genotype probability of selfing = %s" % prob)
-# 			
-		multilocus_outcrossing_prob = 1.0
-		for n, genotype in enumerate(self.genotype_list):
-			allele_list = population.allele_list[n]
-			allele_freq = population.allele_freq_list[n]
-			mom_g = mom.genotype_list[n]
-			if mom_g == None:
-				multilocus_outcrossing_prob = multilocus_outcrossing_prob * genotype.calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(allele_list, allele_freq, mom_g, n)
-			else:
-				mf, ms = mom_g.first, mom_g.second
-				mh = (mf == ms)	
-				null = null_loci[n]
-				if null:
-					if mh:
-						multilocus_outcrossing_prob = multilocus_outcrossing_prob * genotype.calc_prob_offspring_given_outcrossing_mom_homozygote_null_model(allele_list, allele_freq, mom_g, n)
-					else:
-						multilocus_outcrossing_prob = multilocus_outcrossing_prob * genotype.calc_prob_offspring_given_outcrossing_mom_heterozygote_null_model(allele_list, allele_freq, mom_g, n)
-				else:
-					if mh:
-						multilocus_outcrossing_prob = multilocus_outcrossing_prob * genotype.calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(allele_list, allele_freq, mom_g, n)
-					else:
-						multilocus_outcrossing_prob = multilocus_outcrossing_prob * genotype.calc_prob_offspring_given_outcrossing_mom_heterozygote_standard_model(allele_list, allele_freq, mom_g, n)
-		
-		#for testing only!
-# 		for n, genotype in enumerate(self.genotype_list):
-# 			allele_list = population.allele_list[n]
-# 			allele_freq = population.allele_freq_list[n]
-# 			mom_g = mom.genotype_list[n]
-# 			mf, ms = mom_g.first, mom_g.second
-# 			mh = (mf == ms)	
-# 			null = null_loci[n]
-# 			if null:
-# 				if mh:
-# 					prob = genotype.calc_prob_offspring_given_outcrossing_mom_homozygote_null_model(allele_list, allele_freq, mom_g, n)
-# 				else:
-# 					prob = genotype.calc_prob_offspring_given_outcrossing_mom_heterozygote_null_model(allele_list, allele_freq, mom_g, n)
-# 			else:
-# 				if mh:
-# 					prob = genotype.calc_prob_offspring_given_outcrossing_mom_homozygote_standard_model(allele_list, allele_freq, mom_g, n)
-# 				else:
-# 					prob = genotype.calc_prob_offspring_given_outcrossing_mom_heterozygote_standard_model(allele_list, allele_freq, mom_g, n)
-# 			print("Genotype probability of outcrossing = %s" % prob)
-# 		
-		selfing_rate = (1.0 - outcrossing_rate)
-		prob_offspring_geno = (selfing_rate * multilocus_selfing_prob) + (outcrossing_rate * multilocus_outcrossing_prob)
-		try:
-			lnL = math.log(prob_offspring_geno)
-		except:
-			lnL = float('-inf')
-		return lnL
+		multilocus_selfing_lnL, multilocus_outcrossing_lnL = self.calc_lnL_offspring_selfing_outcrossing(population, mom, null_loci)
+		return calc_offspring_lnL(outcrossing_rate, multilocus_selfing_lnL, multilocus_outcrossing_lnL)
+
+	def calc_prob_mom_locus(self, n, population):
+		"""Calculates a maternal individual's single-locus genotype probability at locus n given its inbreeding coefficient.
+		"""
+		genotype = self.genotype_list[n]
+		if genotype == None: # this is for the case where it is a single-offspring family with missing data and no maternal genotype
+			return 1.0
+		return genotype.calc_prob_mom(population.allele_freq_list[n], self.inbreeding_coefficient)
 
 	def calc_prob_mom_geno(self, population):
-		"""Calculates a maternal individual's multilocus genotype probability given its single-locus genotype probabilities.
+		"""Calculates the ln of a maternal individual's multilocus genotype probability given its single-locus genotype probabilities.
 		"""
-		multilocus_mom_prob = 1.0
-		for n, genotype in enumerate(self.genotype_list):
-			if genotype == None: # this is for the case where it is a single-offspring family with missing data and no maternal genotype
-				multilocus_mom_prob = multilocus_mom_prob * 1.0
-			else:
-				allele_list = population.allele_list[n]
-				allele_freq = population.allele_freq_list[n]
-				multilocus_mom_prob = multilocus_mom_prob * genotype.calc_prob_mom(allele_list, allele_freq, self.inbreeding_coefficient)
-		try:
-			lnL = math.log(multilocus_mom_prob)
-		except:
-			lnL = float('-inf')
-		return lnL
\ No newline at end of file
+		lnL = 0.0
+		for n in range(len(self.genotype_list)):
+			lnL = lnL + calc_log(self.calc_prob_mom_locus(n, population))
+		return lnL
+
+def calc_log(prob):
+	"""Returns the ln of a probability, or -inf if it is zero.
+	"""
+	if prob > 0.0:
+		return math.log(prob)
+	return float('-inf')
+
+def calc_log_sum_exp(x, y):
+	"""Returns ln(exp(x) + exp(y)) without leaving log space.
+	"""
+	if x < y:
+		x, y = y, x
+	if x == float('-inf'):
+		return x
+	return x + math.log1p(math.exp(y - x))
+
+def calc_offspring_lnL(outcrossing_rate, multilocus_selfing_lnL, multilocus_outcrossing_lnL):
+	"""Calculates the ln likelihood of an offspring genotype from its ln probabilities given selfing and given outcrossing.
+	"""
+	return calc_log_sum_exp(calc_log(1.0 - outcrossing_rate) + multilocus_selfing_lnL, calc_log(outcrossing_rate) + multilocus_outcrossing_lnL)
@@ -0,0 +1,151 @@
+import math
+
+import numpy as np
+
+# Numba is optional: when it is installed the kernels below are compiled, otherwise they run as plain Python
+try:
+	import numba
+except ImportError:
+	numba = None
+
+JIT_AVAILABLE = numba is not None
+
+def jit(function):
+	"""Compiles a kernel with Numba if it is installed, and returns it unchanged otherwise.
+	"""
+	if numba is None:
+		return function
+	return numba.njit(cache = True, error_model = 'numpy')(function)
+
+@jit
+def calc_selfing_prob(mom_first, mom_second, first, second, null):
+	"""Calculates the probability of an observed offspring genotype given selfing and its maternal genotype.
+	"""
+	sh = (first == second)
+	if mom_first == mom_second:
+		if null and (mom_first == 0): # mom is homozygous null
+			return 0.0
+		if sh and (first == mom_first): # offspring is homozygous
+			return 1.0
+		return 0.0 # impossible genotype
+	if null and (mom_first == 0): # mom is het with null allele
+		if sh and (first == mom_second): # offspring is homozygous and not null
+			return 1.0
+		return 0.0 # impossible genotype
+	if (first != mom_first) and (first != mom_second) and (second != mom_first) and (second != mom_second): # impossible genotype
+		return 0.0
+	elif sh: # offspring is homozygous
+		return 0.25
+	elif (first == mom_first) and (second == mom_second): # offspring is identical het
+		return 0.5
+	else: # offspring is non-identical het
+		return 0.0
+
+@jit
+def calc_outcrossing_prob(mom_first, mom_second, first, second, null, allele_freq):
+	"""Calculates the probability of an observed offspring genotype given outcrossing and its maternal genotype.
+	"""
+	sh = (first == second)
+	if mom_first == mom_second:
+		if null:
+			if mom_first == 0: # mom is homozygous null
+				if sh:
+					return allele_freq[first] / (1.0 - allele_freq[0])
+				return 0.0
+			if sh: # offspring is homozygous
+				if first == mom_first:
+					return allele_freq[first] + allele_freq[0]
+				return 0.0 # impossible genotype
+		if first == mom_first:
+			return allele_freq[second]
+		elif second == mom_first:
+			return allele_freq[first]
+		return 0.0 # impossible genotype
+	if null and (mom_first == 0): # mom is het with null allele
+		if sh:
+			if first == mom_second: # offspring is homozygote and matches maternal allele 2
+				return (allele_freq[first] / (1.0 - allele_freq[0]) * 0.5) + ((allele_freq[first] + allele_freq[0]) * 0.5)
+			return allele_freq[first] / (1.0 - allele_freq[0]) * 0.5
+		if first == mom_second:
+			return allele_freq[second] * 0.5
+		elif second == mom_second:
+			return allele_freq[first] * 0.5
+		return 0.0 # impossible genotype
+	if sh: # offspring is homozygous
+		if null:
+			if (first == mom_first) or (first == mom_second):
+				return (allele_freq[first] + allele_freq[0]) * 0.5
+			return 0.0 # impossible genotype
+		if first == mom_first:
+			return allele_freq[first] * 0.5
+		elif first == mom_second:
+			return allele_freq[second] * 0.5
+		return 0.0 # impossible genotype
+	if (first != mom_first) and (first != mom_second) and (second != mom_first) and (second != mom_second): # impossible genotype
+		return 0.0
+	elif (first != mom_first) and (first != mom_second):
+		return allele_freq[first] * 0.5
+	elif (second != mom_first) and (second != mom_second):
+		return allele_freq[second] * 0.5
+	else: # offspring is identical het
+		return 0.5 * (allele_freq[first] + allele_freq[second])
+
+@jit
+def calc_offspring_factors(offspring_alleles, missing, offspring, loci, mom_first, mom_second, no_mom, null, allele_freq):
+	"""Calculates the single-locus genotype probabilities given selfing and given outcrossing of a set of offspring.
+	"""
+	# missing data and loci without a maternal genotype get a probability of 1.0
+	num = len(offspring)
+	selfing = np.empty(num)
+	outcrossing = np.empty(num)
+	for i in range(num):
+		o = offspring[i]
+		n = loci[i]
+		if missing[o, n] or no_mom[i]:
+			selfing[i] = 1.0
+			outcrossing[i] = 1.0
+		else:
+			first = offspring_alleles[o, n, 0]
+			second = offspring_alleles[o, n, 1]
+			selfing[i] = calc_selfing_prob(mom_first[i], mom_second[i], first, second, null[n])
+			outcrossing[i] = calc_outcrossing_prob(mom_first[i], mom_second[i], first, second, null[n], allele_freq[n])
+	return selfing, outcrossing
+
+@jit
+def calc_mom_prob(first, second, allele_freq, inbreeding_coefficient):
+	"""Calculates the probability of a maternal genotype given its inbreeding coefficient.
+	"""
+	inb = (1.0 - inbreeding_coefficient)
+	if first == second:
+		return (inb * math.pow(allele_freq[first], 2)) + (inbreeding_coefficient * allele_freq[first])
+	return (inb * (2.0 * allele_freq[first] * allele_freq[second]))
+
+@jit
+def calc_mom_factors(families, loci, mom_first, mom_second, no_mom, allele_freq, inbreeding_coefficient):
+	"""Calculates the single-locus genotype probabilities of a set of moms given inbreeding coefficients.
+	"""
+	num = len(families)
+	factors = np.empty(num)
+	for i in range(num):
+		n = loci[i]
+		if no_mom[families[i], n]:
+			factors[i] = 1.0
+		else:
+			factors[i] = calc_mom_prob(mom_first[i], mom_second[i], allele_freq[n], inbreeding_coefficient[i])
+	return factors
+
+@jit
+def metropolis_accept(lnL, prev_lnL, random_numbers):
+	"""Returns the Metropolis acceptance of a batch of proposals from their ln likelihoods and uniform random numbers.
+	"""
+	num = len(lnL)
+	accepted = np.zeros(num, dtype = np.bool_)
+	for i in range(num):
+		if lnL[i] == -math.inf:
+			continue
+		lnL_ratio = (lnL[i] - prev_lnL[i])
+		if lnL_ratio > 0:
+			accepted[i] = True
+		elif random_numbers[i] < math.exp(lnL_ratio):
+			accepted[i] = True
+	return accepted
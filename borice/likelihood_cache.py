@@ -0,0 +1,190 @@
+from .transmission import *
+
+class LikelihoodCache(object):
+	"""A LikelihoodCache keeps the ln genotype probabilities of every offspring pattern and mom of a population, locus by locus.
+	"""
+	# everything is kept in log space so that nothing underflows with many loci
+	# t only enters when the selfing and outcrossing sums of an offspring are mixed, so no locus is revisited to change t
+	def __init__(self, population, null_loci):
+		self.population = population
+		self.null_loci = null_loci
+		self.selfing_factors = {}
+		self.outcrossing_factors = {}
+		self.progeny_lnL = {}
+		self.mom_factors = {}
+		self.mom_lnL = {}
+		self.tables = []
+		for n, allele_list in enumerate(population.allele_list):
+			offspring_genotypes = set()
+			for family in population.family_list:
+				for offspring in family.get_observed_offspring(n):
+					offspring_genotypes.add(offspring.genotype_list[n])
+			table = TransmissionTable(n, len(allele_list), null_loci[n], offspring_genotypes)
+			table.refresh(population.allele_freq_list[n])
+			self.tables.append(table)
+		self.refresh()
+
+	def refresh(self):
+		"""Recalculates the cached probabilities of every family in the population.
+		"""
+		for family in self.population.family_list:
+			self.refresh_family(family)
+
+	def refresh_family(self, family):
+		"""Recalculates the cached probabilities of the offspring and the mom of a family at every locus.
+		"""
+		population = self.population
+		mom = family.mom
+		tables = self.tables
+		mom_genotypes = mom.genotype_list
+		num_loci = len(mom_genotypes)
+		selfing_factors = []
+		outcrossing_factors = []
+		progeny_lnL = []
+		for offspring in family.patterns:
+			genotypes = offspring.genotype_list
+			selfing_row = [0.0] * num_loci
+			outcrossing_row = [0.0] * num_loci
+			for n in offspring.observed_loci:
+				selfing_row[n] = tables[n].get_selfing_lnL(mom_genotypes[n], genotypes[n])
+				outcrossing_row[n] = tables[n].get_outcrossing_lnL(mom_genotypes[n], genotypes[n])
+			selfing_factors.append(selfing_row)
+			outcrossing_factors.append(outcrossing_row)
+			progeny_lnL.append((sum(selfing_row), sum(outcrossing_row)))
+		self.selfing_factors[family] = selfing_factors
+		self.outcrossing_factors[family] = outcrossing_factors
+		self.progeny_lnL[family] = progeny_lnL
+		self.mom_factors[family] = [calc_log(mom.calc_prob_mom_locus(n, population)) for n in range(len(mom.genotype_list))]
+		self.mom_lnL[family] = sum(self.mom_factors[family])
+
+	def refresh_mom(self, family):
+		"""Recalculates the cached ln likelihood of the mom of a family.
+		"""
+		mom = family.mom
+		population = self.population
+		self.mom_factors[family] = [calc_log(mom.calc_prob_mom_locus(n, population)) for n in range(len(mom.genotype_list))]
+		self.mom_lnL[family] = sum(self.mom_factors[family])
+
+	def update_locus(self, locus):
+		"""Recalculates the factors at one locus after its allele frequencies changed, and returns a snapshot for def restore_locus.
+		"""
+		# the multilocus sums are rebuilt rather than updated by difference, since a factor of -inf cannot be subtracted out
+		population = self.population
+		table = self.tables[locus]
+		snapshot = (locus, {}, {}, self.progeny_lnL, self.mom_lnL, table.refresh(population.allele_freq_list[locus]))
+		old_outcrossing_columns, old_mom_factors = snapshot[1], snapshot[2]
+		progeny_lnL = {}
+		mom_lnL = {}
+		for family in population.family_list:
+			mom = family.mom
+			mom_g = mom.genotype_list[locus]
+			patterns = family.patterns
+			outcrossing_factors = self.outcrossing_factors[family]
+			old_column = []
+			family_lnL = list(self.progeny_lnL[family])
+			for i in family.observed_patterns[locus]:
+				outcrossing_row = outcrossing_factors[i]
+				old_column.append(outcrossing_row[locus])
+				outcrossing_row[locus] = table.get_outcrossing_lnL(mom_g, patterns[i].genotype_list[locus])
+				family_lnL[i] = (family_lnL[i][0], sum(outcrossing_row))
+			old_outcrossing_columns[family] = old_column
+			progeny_lnL[family] = family_lnL
+			mom_row = self.mom_factors[family]
+			old_mom_factors[family] = mom_row[locus]
+			mom_row[locus] = calc_log(mom.calc_prob_mom_locus(locus, population))
+			mom_lnL[family] = sum(mom_row)
+		self.progeny_lnL = progeny_lnL
+		self.mom_lnL = mom_lnL
+		return snapshot
+
+	def restore_locus(self, snapshot):
+		"""Undoes a call to def update_locus using the snapshot it returned.
+		"""
+		locus, old_outcrossing_columns, old_mom_factors, self.progeny_lnL, self.mom_lnL, table_snapshot = snapshot
+		self.tables[locus].restore(table_snapshot)
+		for family, old_column in old_outcrossing_columns.items():
+			outcrossing_factors = self.outcrossing_factors[family]
+			for i, old_factor in zip(family.observed_patterns[locus], old_column):
+				outcrossing_factors[i][locus] = old_factor
+			self.mom_factors[family][locus] = old_mom_factors[family]
+
+	def update_family_locus(self, family, locus):
+		"""Recalculates the factors of a family at a locus after its maternal genotype changed, and returns a snapshot for def restore_family_locus.
+		"""
+		population = self.population
+		mom = family.mom
+		mom_g = mom.genotype_list[locus]
+		table = self.tables[locus]
+		patterns = family.patterns
+		selfing_factors = self.selfing_factors[family]
+		outcrossing_factors = self.outcrossing_factors[family]
+		old_selfing_column = []
+		old_outcrossing_column = []
+		progeny_lnL = list(self.progeny_lnL[family])
+		for i in family.observed_patterns[locus]:
+			genotype = patterns[i].genotype_list[locus]
+			selfing_row = selfing_factors[i]
+			outcrossing_row = outcrossing_factors[i]
+			old_selfing_column.append(selfing_row[locus])
+			old_outcrossing_column.append(outcrossing_row[locus])
+			selfing_row[locus] = table.get_selfing_lnL(mom_g, genotype)
+			outcrossing_row[locus] = table.get_outcrossing_lnL(mom_g, genotype)
+			progeny_lnL[i] = (sum(selfing_row), sum(outcrossing_row))
+		mom_row = self.mom_factors[family]
+		snapshot = (locus, old_selfing_column, old_outcrossing_column, mom_row[locus], self.progeny_lnL[family], self.mom_lnL[family])
+		mom_row[locus] = calc_log(mom.calc_prob_mom_locus(locus, population))
+		self.progeny_lnL[family] = progeny_lnL
+		self.mom_lnL[family] = sum(mom_row)
+		return snapshot
+
+	def restore_family_locus(self, family, snapshot):
+		"""Undoes a call to def update_family_locus using the snapshot it returned.
+		"""
+		locus, old_selfing_column, old_outcrossing_column, old_mom_factor, self.progeny_lnL[family], self.mom_lnL[family] = snapshot
+		selfing_factors = self.selfing_factors[family]
+		outcrossing_factors = self.outcrossing_factors[family]
+		for i, old_selfing_factor, old_outcrossing_factor in zip(family.observed_patterns[locus], old_selfing_column, old_outcrossing_column):
+			selfing_factors[i][locus] = old_selfing_factor
+			outcrossing_factors[i][locus] = old_outcrossing_factor
+		self.mom_factors[family][locus] = old_mom_factor
+
+	def calc_progeny_lnL(self, family, outcrossing_rate):
+		"""Calculates the ln likelihood value for only the offspring of a family.
+		"""
+		# the pattern values are added up in offspring order rather than multiplied by their counts, to match a sum over offspring
+		selfing_rate_lnL = calc_log(1.0 - outcrossing_rate)
+		outcrossing_rate_lnL = calc_log(outcrossing_rate)
+		pattern_lnL = [calc_log_sum_exp(selfing_rate_lnL + selfing_lnL, outcrossing_rate_lnL + outcrossing_lnL) for selfing_lnL, outcrossing_lnL in self.progeny_lnL[family]]
+		lnL = 0.0
+		for p in family.offspring_pattern:
+			lnL = lnL + pattern_lnL[p]
+		return lnL
+
+	def calc_mom_lnL_change(self, old_mom_lnL):
+		"""Returns the change in the maternal ln likelihood of the population since the moms had old_mom_lnL.
+		"""
+		# only the moms whose ln likelihood changed are summed, so that a -inf is never subtracted from itself
+		change = 0.0
+		for family, mom_lnL in self.mom_lnL.items():
+			if mom_lnL != old_mom_lnL[family]:
+				change = change + (mom_lnL - old_mom_lnL[family])
+		return change
+
+	def calc_pop_lnL(self, outcrossing_rate):
+		"""Calculates the ln likelihood of the population summed over families (see Population.calc_pop_lnL).
+		"""
+		return self.calc_pop_lnL_components(outcrossing_rate)[0]
+
+	def calc_pop_lnL_components(self, outcrossing_rate):
+		"""Returns the (total, progeny, maternal) ln likelihood of the population.
+		"""
+		# the total is summed family by family, as in Population.calc_pop_lnL
+		lnL = 0.0
+		progeny_lnL = 0.0
+		mom_lnL = 0.0
+		for family in self.population.family_list:
+			family_progeny_lnL = self.calc_progeny_lnL(family, outcrossing_rate)
+			lnL = lnL + (family_progeny_lnL + self.mom_lnL[family])
+			progeny_lnL = progeny_lnL + family_progeny_lnL
+			mom_lnL = mom_lnL + self.mom_lnL[family]
+		return lnL, progeny_lnL, mom_lnL
@@ -7,6 +7,7 @@ class Population(object):
 		self.allele_list = allele_list
 		self.allele_freq_list = allele_freq_list
 		self.family_list = []
+		self.imputed_family_list = []
 		self.outcrossing_rate = float(outcrossing_rate)
 		self.ih_prob_list = []
 		self.y_values = y_values
@@ -19,9 +20,10 @@ class Population(object):
 			for n, allele in enumerate(locus_alleles):
 				self.y_values[locus_index].append(allele.y)
 			
+			y_sum = sum(self.y_values[locus_index])
 			new_af_list = []
 			for n, allele in enumerate(locus_alleles):
-				new_af = allele.y / sum(self.y_values[locus_index])
+				new_af = allele.y / y_sum
 				new_af_list.append(new_af)
 				if step > burn_in:
 					if (step % 10) == 0:
@@ -33,18 +35,26 @@ class Population(object):
 				else:
 					self.y_values[locus_index].append(allele.y)
 			
+			y_sum = sum(self.y_values[locus_index])
 			new_af_list = [0.0]
 			for n, allele in enumerate(locus_alleles):
 				if n == 0:
 					continue
 				else:
-					new_af = allele.y / sum(self.y_values[locus_index])
+					new_af = allele.y / y_sum
 					new_af_list.append(new_af)
 					if step > burn_in:
 						if (step % 10) == 0:
 							allele.af_list.append(new_af)
 		return new_af_list
 	
+	def add_family(self, family):
+		"""Adds a family to the population, and also to the list of families with imputed maternal loci if it has any.
+		"""
+		self.family_list.append(family)
+		if family.imputed_loci:
+			self.imputed_family_list.append(family)
+
 	def calc_pop_lnL(self, null_loci):
 		"""Calculates the ln likelihood of a population summed over families.
 		"""
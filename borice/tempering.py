@@ -0,0 +1,19 @@
+import math
+
+def calc_heats(temperatures, heat_increment):
+	"""Returns the heats of the chains of parallel tempering, from the cold chain (heat 1) to the hottest.
+	"""
+	return [1.0 / (1.0 + heat_increment * k) for k in range(temperatures)]
+
+def swap_states(states, heats, rng, swaps, parity):
+	"""Proposes to swap the states of neighbouring chains of parallel tempering, and returns the states after the swaps.
+	"""
+	# the pairs (k, k + 1) with k of the given parity are proposed, so that every pair is proposed every other time
+	states = list(states)
+	for k in range(parity % 2, len(states) - 1, 2):
+		lnL_ratio = (heats[k] - heats[k + 1]) * (states[k + 1]['progeny_lnL'] - states[k]['progeny_lnL'])
+		accepted = (lnL_ratio >= 0) or (rng.random() < math.exp(lnL_ratio))
+		swaps[k].record(accepted)
+		if accepted:
+			states[k], states[k + 1] = states[k + 1], states[k]
+	return states
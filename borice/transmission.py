@@ -0,0 +1,57 @@
+from .genotype import *
+from .individual import *
+
+class TransmissionTable(object):
+	"""A TransmissionTable holds the ln offspring genotype probabilities of one locus given each maternal genotype.
+	"""
+	# the selfing table is built once; outcrossing entries are filled on first use and discarded when the allele frequencies change
+	def __init__(self, locus, num_alleles, null, offspring_genotypes):
+		self.locus = locus
+		self.null = null
+		self.stride = (num_alleles * (num_alleles + 1)) // 2
+		self.allele_freq = None
+		self.outcrossing = {}
+		self.selfing = {}
+		for second in range(num_alleles):
+			for first in range(second + 1):
+				mom_g = SingleLocusGenotype(first, second)
+				mom_code = mom_g.get_code()
+				for genotype in offspring_genotypes:
+					self.selfing[self.get_key(mom_code, genotype.code)] = calc_log(genotype.calc_prob_offspring_given_selfing(mom_g, locus, null))
+
+	def get_key(self, mom_code, offspring_code):
+		"""Returns the position of a (maternal genotype code, offspring genotype code) pair in the tables.
+		"""
+		return (mom_code * self.stride) + offspring_code
+
+	def refresh(self, allele_freq):
+		"""Discards the outcrossing probabilities after the allele frequencies of the locus changed, and returns a snapshot for def restore.
+		"""
+		snapshot = (self.allele_freq, self.outcrossing)
+		self.allele_freq = allele_freq
+		self.outcrossing = {}
+		return snapshot
+
+	def restore(self, snapshot):
+		"""Restores the outcrossing probabilities saved by def refresh.
+		"""
+		self.allele_freq, self.outcrossing = snapshot
+
+	def get_selfing_lnL(self, mom_g, genotype):
+		"""Returns the ln probability of an observed offspring genotype given selfing and its maternal genotype.
+		"""
+		if mom_g == None: # single-offspring family with missing data and no maternal genotype; effectively skips the locus
+			return 0.0
+		return self.selfing[self.get_key(mom_g.get_code(), genotype.code)]
+
+	def get_outcrossing_lnL(self, mom_g, genotype):
+		"""Returns the ln probability of an observed offspring genotype given outcrossing and its maternal genotype.
+		"""
+		if mom_g == None: # single-offspring family with missing data and no maternal genotype; effectively skips the locus
+			return 0.0
+		key = self.get_key(mom_g.get_code(), genotype.code)
+		lnL = self.outcrossing.get(key)
+		if lnL is None:
+			lnL = calc_log(genotype.calc_prob_offspring_given_outcrossing(self.allele_freq, mom_g, self.locus, self.null))
+			self.outcrossing[key] = lnL
+		return lnL
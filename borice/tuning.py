@@ -0,0 +1,50 @@
+import math
+
+class ProposalTuner(object):
+	"""A ProposalTuner holds the tuning parameter of a Metropolis move and counts how often the move is accepted.
+	"""
+	# the tuning parameter can be adapted during the burn-in (see def adapt), and is then frozen for the rest of the chain
+	__slots__ = ('scale', 'target', 'min_scale', 'max_scale', 'adaptations', 'proposals', 'acceptances')
+
+	def __init__(self, scale, target, min_scale, max_scale):
+		self.scale = None if scale is None else float(scale)
+		self.target = target
+		self.min_scale = min_scale
+		self.max_scale = max_scale
+		self.adaptations = 0
+		self.proposals = 0
+		self.acceptances = 0
+
+	def record(self, accepted):
+		"""Counts a proposal of the move, and whether it was accepted.
+		"""
+		self.proposals = self.proposals + 1
+		if accepted:
+			self.acceptances = self.acceptances + 1
+
+	def record_many(self, proposals, acceptances):
+		"""Counts a batch of proposals of the move, and how many of them were accepted.
+		"""
+		self.proposals = self.proposals + proposals
+		self.acceptances = self.acceptances + acceptances
+
+	def adapt(self, accepted):
+		"""Counts a proposal of the move, and moves the logarithm of the tuning parameter toward the target acceptance rate.
+		"""
+		self.record(accepted)
+		self.adaptations = self.adaptations + 1
+		log_scale = math.log(self.scale) + ((1.0 if accepted else 0.0) - self.target) / self.adaptations ** 0.6
+		self.scale = min(self.max_scale, max(self.min_scale, math.exp(log_scale)))
+
+	def freeze(self):
+		"""Ends the adaptation: the tuning parameter keeps its value, and the acceptance rate is counted anew.
+		"""
+		self.proposals = 0
+		self.acceptances = 0
+
+	def calc_acceptance_rate(self):
+		"""Returns the fraction of proposals accepted since the start of the chain or the freeze, or None.
+		"""
+		if not self.proposals:
+			return None
+		return float(self.acceptances) / self.proposals
@@ -1,9 +1,11 @@
+import os
+
 from PyQt5 import QtCore
 
 from borice.application import Application
 
 class BoriceThread(QtCore.QThread):
-	def __init__(self, parent, dataFileName, locusModel, numSteps, numBurnInSteps, outcrossingRateTuningParam, alleleFreqTuningParam, outcrossingRate, writeOutput2, writeOutput3, writeOutput4, ignoreGenotypingErrors):
+	def __init__(self, parent, dataFileName, locusModel, numSteps, numBurnInSteps, outcrossingRateTuningParam, alleleFreqTuningParam, outcrossingRate, writeOutput2, writeOutput3, writeOutput4, ignoreGenotypingErrors, engine, chains, jobs, chainOutputs, adaptTuning, autoBurnIn, tMove, ihMove, momMove, checkpoint):
 		super().__init__(parent)
 		self.dataFileName = dataFileName
 		self.locusModel = locusModel
@@ -16,10 +18,26 @@ class BoriceThread(QtCore.QThread):
 		self.writeOutput3 = writeOutput3
 		self.writeOutput4 = writeOutput4
 		self.ignoreGenotypingErrors = ignoreGenotypingErrors
+		self.engine = engine
+		self.chains = chains
+		self.jobs = jobs
+		self.chainOutputs = chainOutputs
+		self.adaptTuning = adaptTuning
+		self.autoBurnIn = autoBurnIn
+		self.tMove = tMove
+		self.ihMove = ihMove
+		self.momMove = momMove
+		# a checkpointed run is saved next to its data file, so that a stopped run can be resumed from the CLI (borice --resume)
+		self.checkpointFile = None
+		if checkpoint:
+			self.checkpointFile = os.path.splitext(os.path.abspath(dataFileName))[0] + '_checkpoint.pkl'
 		self.app = Application()
 
 	def run(self):
-		self.app.run(self.dataFileName, self.locusModel, self.numSteps, self.numBurnInSteps, self.outcrossingRateTuningParam, self.alleleFreqTuningParam, self.outcrossingRate, self.writeOutput2, self.writeOutput3, self.writeOutput4, self.ignoreGenotypingErrors)
+		self.app.run(self.dataFileName, self.locusModel, self.numSteps, self.numBurnInSteps, self.outcrossingRateTuningParam, self.alleleFreqTuningParam, self.outcrossingRate, self.writeOutput2, self.writeOutput3, self.writeOutput4, self.ignoreGenotypingErrors, engine=self.engine, checkpoint_file=self.checkpointFile, chains=self.chains, jobs=self.jobs, chain_outputs=self.chainOutputs, adapt_tuning=self.adaptTuning, auto_burn_in=self.autoBurnIn, t_move=self.tMove, ih_move=self.ihMove, mom_move=self.momMove)
+
+	def stop(self):
+		self.app.request_stop()
 
 	def getStep(self):
 		return self.app.getStep()
@@ -33,12 +33,22 @@ class MainWindow(QMainWindow):
 		self.outcrossingRate = Application.INITIAL_OUTCROSSING_RATE
 		self.numSteps = Application.NUM_STEPS
 		self.numBurnInSteps = Application.BURN_IN
+		self.autoBurnIn = Application.AUTO_BURN_IN
 		self.outcrossingRateTuningParam = Application.OUTCROSSING_RATE_TUNING
 		self.alleleFreqTuningParam = Application.ALLELE_FREQUENCY_TUNING
+		self.adaptTuning = Application.ADAPT_TUNING
+		self.tMove = Application.T_MOVE
+		self.ihMove = Application.IH_MOVE
+		self.momMove = Application.MOM_MOVE
 		self.ignoreGenotypingErrors = Application.IGNORE_GENOTYPING_ERRORS
 		self.writeOutput2 = Application.WRITE_OUTPUT_2
 		self.writeOutput3 = Application.WRITE_OUTPUT_3
 		self.writeOutput4 = Application.WRITE_OUTPUT_4
+		self.engine = Application.ENGINE
+		self.chains = Application.CHAINS
+		self.jobs = Application.JOBS
+		self.chainOutputs = Application.CHAIN_OUTPUTS
+		self.checkpoint = bool(Application.CHECKPOINT_FILE)
 
 		# Build the user interface
 		self.buildUI()
@@ -50,15 +60,25 @@ class MainWindow(QMainWindow):
 		# General Settings
 		self.numStepsText.setValue(Application.NUM_STEPS)
 		self.numStepsBurnInText.setValue(Application.BURN_IN)
+		self.autoBurnInCheckbox.setChecked(Application.AUTO_BURN_IN)
 		self.initialPopulationOutcrossingRateText.setValue(Application.INITIAL_OUTCROSSING_RATE)
 		self.outcrossingRateTuningParamText.setValue(Application.OUTCROSSING_RATE_TUNING)
 		self.AlleleFreqTuningParamText.setValue(Application.ALLELE_FREQUENCY_TUNING)
+		self.adaptTuningCheckbox.setChecked(Application.ADAPT_TUNING)
+		self.tMoveComboBox.setCurrentText(Application.T_MOVE)
+		self.ihMoveComboBox.setCurrentText(Application.IH_MOVE)
+		self.momMoveComboBox.setCurrentText(Application.MOM_MOVE)
 		self.ignoreGenotypingErrorsCheckbox.setChecked(Application.IGNORE_GENOTYPING_ERRORS)
+		self.engineComboBox.setCurrentText(Application.ENGINE)
+		self.chainsText.setValue(Application.CHAINS)
+		self.jobsText.setValue(Application.JOBS)
 
 		# File Output Settings
 		self.writeOutput2Checkbox.setChecked(Application.WRITE_OUTPUT_2)
 		self.writeOutput3Checkbox.setChecked(Application.WRITE_OUTPUT_3)
 		self.writeOutput4Checkbox.setChecked(Application.WRITE_OUTPUT_4)
+		self.chainOutputsCheckbox.setChecked(Application.CHAIN_OUTPUTS)
+		self.checkpointCheckbox.setChecked(bool(Application.CHECKPOINT_FILE))
 
 		# Locus Settings
 		for checkbox in self.locusCheckBoxList:
@@ -185,6 +205,13 @@ class MainWindow(QMainWindow):
 		self.numStepsBurnInText.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
 		genSettingsLayout.addRow("Number of Burn In Steps:", self.numStepsBurnInText)
 
+		# Automatic Burn In
+		self.autoBurnInCheckbox = QCheckBox()
+		self.autoBurnInCheckbox.setChecked(self.autoBurnIn)
+		self.autoBurnInCheckbox.toggled.connect(self.setAutoBurnIn)
+		self.autoBurnInCheckbox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Detect Burn In Automatically:", self.autoBurnInCheckbox)
+
 		# Initial Population Outcrossing Rate
 		self.initialPopulationOutcrossingRateText = self.createNumberWidget(QDoubleSpinBox, self.outcrossingRate, 0.0, 1.0, 0.05, self.setInitialPopulationOutcrossingRate)
 		self.initialPopulationOutcrossingRateText.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
@@ -200,6 +227,37 @@ class MainWindow(QMainWindow):
 		self.AlleleFreqTuningParamText.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
 		genSettingsLayout.addRow("Allele Frequency Tuning Parameter:", self.AlleleFreqTuningParamText)
 
+		# Adapt Tuning Parameters
+		self.adaptTuningCheckbox = QCheckBox()
+		self.adaptTuningCheckbox.setChecked(self.adaptTuning)
+		self.adaptTuningCheckbox.toggled.connect(self.setAdaptTuning)
+		self.adaptTuningCheckbox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Adapt Tuning Parameters During Burn In:", self.adaptTuningCheckbox)
+
+		# Outcrossing Rate Move
+		self.tMoveComboBox = QComboBox()
+		self.tMoveComboBox.addItems(list(Application.T_MOVES))
+		self.tMoveComboBox.setCurrentText(self.tMove)
+		self.tMoveComboBox.currentTextChanged.connect(self.setTMove)
+		self.tMoveComboBox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Outcrossing Rate Move:", self.tMoveComboBox)
+
+		# Inbreeding History Move
+		self.ihMoveComboBox = QComboBox()
+		self.ihMoveComboBox.addItems(list(Application.IH_MOVES))
+		self.ihMoveComboBox.setCurrentText(self.ihMove)
+		self.ihMoveComboBox.currentTextChanged.connect(self.setIhMove)
+		self.ihMoveComboBox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Inbreeding History Move:", self.ihMoveComboBox)
+
+		# Maternal Genotype Move
+		self.momMoveComboBox = QComboBox()
+		self.momMoveComboBox.addItems(list(Application.MOM_MOVES))
+		self.momMoveComboBox.setCurrentText(self.momMove)
+		self.momMoveComboBox.currentTextChanged.connect(self.setMomMove)
+		self.momMoveComboBox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Maternal Genotype Move:", self.momMoveComboBox)
+
 		# Ignore Genotyping Errors
 		self.ignoreGenotypingErrorsCheckbox = QCheckBox()
 		self.ignoreGenotypingErrorsCheckbox.setChecked(self.ignoreGenotypingErrors)
@@ -207,6 +265,24 @@ class MainWindow(QMainWindow):
 		self.ignoreGenotypingErrorsCheckbox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
 		genSettingsLayout.addRow("Ignore Genotyping Errors:", self.ignoreGenotypingErrorsCheckbox)
 
+		# Engine
+		self.engineComboBox = QComboBox()
+		self.engineComboBox.addItems(list(Application.ENGINES))
+		self.engineComboBox.setCurrentText(self.engine)
+		self.engineComboBox.currentTextChanged.connect(self.setEngine)
+		self.engineComboBox.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Engine:", self.engineComboBox)
+
+		# Number of chains
+		self.chainsText = self.createNumberWidget(QSpinBox, self.chains, 1, self.MAX_INT, 1, self.setChains)
+		self.chainsText.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Number of Chains:", self.chainsText)
+
+		# Number of worker processes
+		self.jobsText = self.createNumberWidget(QSpinBox, self.jobs, 1, os.cpu_count() or 1, 1, self.setJobs)
+		self.jobsText.setMinimumWidth(self.INPUT_FIELD_MINIMUM_WIDTH)
+		genSettingsLayout.addRow("Number of Worker Processes:", self.jobsText)
+
 		return genSettingsBox
 
 	def createFileOutputSettingsTab(self):
@@ -237,6 +313,18 @@ class MainWindow(QMainWindow):
 		self.writeOutput4Checkbox.toggled.connect(self.setWrite4)
 		outputOptionsLayout.addRow("Posterior distributions for each maternal genotype at each locus in each family:", self.writeOutput4Checkbox)
 
+		# Output files of each chain
+		self.chainOutputsCheckbox = QCheckBox()
+		self.chainOutputsCheckbox.setChecked(self.chainOutputs)
+		self.chainOutputsCheckbox.toggled.connect(self.setChainOutputs)
+		outputOptionsLayout.addRow("Output files of each chain (with several chains):", self.chainOutputsCheckbox)
+
+		# Checkpoint next to the data file, to resume a stopped run
+		self.checkpointCheckbox = QCheckBox()
+		self.checkpointCheckbox.setChecked(self.checkpoint)
+		self.checkpointCheckbox.toggled.connect(self.setCheckpoint)
+		outputOptionsLayout.addRow("Checkpoint to resume a stopped run (next to the data file):", self.checkpointCheckbox)
+
 		return outputOptionsBox
 
 	def createInputDataSummaryTab(self, markerLociCount, familyCount, individualCount):
@@ -323,11 +411,41 @@ class MainWindow(QMainWindow):
 	def setAlleleFreqTuningParam(self, value):
 		self.alleleFreqTuningParam = value
 
+	def setAutoBurnIn(self, value):
+		self.autoBurnIn = value
+
+	def setAdaptTuning(self, value):
+		self.adaptTuning = value
+
+	def setTMove(self, value):
+		self.tMove = value
+
+	def setIhMove(self, value):
+		self.ihMove = value
+
+	def setMomMove(self, value):
+		self.momMove = value
+
 	def setIgnoreGenotypingErrors(self, value):
 		self.ignoreGenotypingErrors = value
 	
 	def setInitialPopulationOutcrossingRate(self, value):
 		self.outcrossingRate = value
+
+	def setEngine(self, value):
+		self.engine = value
+
+	def setChains(self, value):
+		self.chains = int(str(value))
+
+	def setJobs(self, value):
+		self.jobs = int(str(value))
+
+	def setChainOutputs(self, value):
+		self.chainOutputs = value
+
+	def setCheckpoint(self, value):
+		self.checkpoint = value
 	
 	def setLocus(self, value):
 		sender = self.sender()
@@ -406,7 +524,7 @@ class MainWindow(QMainWindow):
 		progress.setWindowTitle("Calculating...")
 		progress.show()
 
-		thread = BoriceThread(self, self.dataFileName, self.locusModel, self.numSteps, self.numBurnInSteps, self.outcrossingRateTuningParam, self.alleleFreqTuningParam, self.outcrossingRate, self.writeOutput2, self.writeOutput3, self.writeOutput4, self.ignoreGenotypingErrors)
+		thread = BoriceThread(self, self.dataFileName, self.locusModel, self.numSteps, self.numBurnInSteps, self.outcrossingRateTuningParam, self.alleleFreqTuningParam, self.outcrossingRate, self.writeOutput2, self.writeOutput3, self.writeOutput4, self.ignoreGenotypingErrors, self.engine, self.chains, self.jobs, self.chainOutputs, self.adaptTuning, self.autoBurnIn, self.tMove, self.ihMove, self.momMove, self.checkpoint)
 		
 		thread.start()
 
@@ -414,7 +532,21 @@ class MainWindow(QMainWindow):
 			progress.setValue(int(thread.getStep()))
 			QApplication.instance().processEvents()			
 			if (progress.wasCanceled()):
-				thread.terminate()
+				# the chain stops at the end of its current step and saves a checkpoint if it has one
+				thread.stop()
+				thread.wait()
+				message = QMessageBox(self)
+				message.setWindowTitle("Stopped")
+				if not thread.checkpointFile:
+					message.setText("Calculation stopped!")
+				elif self.chains > 1:
+					# the checkpoints of several chains are in the directory of each chain, in your current working directory
+					resumeCommand = "borice --resume %s --chains %s" % (os.path.basename(thread.checkpointFile), self.chains)
+					message.setText("Calculation stopped!\nThe chains were saved to %s in the directory of each chain and can be resumed from your current working directory with:\n%s" % (os.path.basename(thread.checkpointFile), resumeCommand))
+				else:
+					resumeCommand = "borice --resume %s" % thread.checkpointFile
+					message.setText("Calculation stopped!\nThe run was saved to %s and can be resumed with:\n%s" % (thread.checkpointFile, resumeCommand))
+				message.exec_()
 				return
 
 		progress.setValue(self.numSteps)
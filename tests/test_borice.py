@@ -1,8 +1,10 @@
 import yaml
 import hashlib
 import pytest
+import numpy as np
 
 from borice.application import *
+from borice import kernels
 
 def hashfile(filename):
 	BLOCKSIZE = 65536
@@ -50,4 +52,480 @@ def test_output_validation():
 	# Add the computed hash to tests with no hash result
 	if newTests > 0:
 		with open(validationFile, 'w') as file:
-			yaml.safe_dump(tests, file, default_flow_style=False, sort_keys=False)
\ No newline at end of file
+			yaml.safe_dump(tests, file, default_flow_style=False, sort_keys=False)
+
+# The example data file, found from any working directory
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example_datafile.csv')
+
+@pytest.fixture
+def dataFile(tmp_path, monkeypatch):
+	# Run in a temporary directory, so that the output files of a test do not land in the working tree
+	monkeypatch.chdir(tmp_path)
+	return DATA_FILE
+
+def loadPopulation(fileName, locusModel):
+	# Parse a data file and infer maternal genotypes the way Application.run does
+	with open(fileName, 'r') as file:
+		markerNames, families = parse_csv(file, ',')
+	alleleFreqs = []
+	for null, marker in zip(locusModel, markerNames):
+		alleles = len(marker[1]) if null else len(marker[1]) - 1
+		alleleFreqs.append(([] if null else [0.0]) + [1.0 / alleles] * alleles)
+	population = Population([marker[1] for marker in markerNames], alleleFreqs, [[] for marker in markerNames], 0.5)
+	for fam in sorted(families):
+		fam.infer_mom(locusModel, False, population.allele_list)
+		fam.population_name = population
+		population.add_family(fam)
+		for genotype in fam.mom.genotype_list:
+			fam.locus_genotypes.append([])
+			fam.possible_genotypes.append([])
+	return population
+
+# Test that the array engine computes the same likelihood as the object model
+@pytest.mark.parametrize('locusModel', [[0, 0, 0], [1, 0, 1]])
+def test_array_engine_likelihood(locusModel):
+	population = loadPopulation(DATA_FILE, locusModel)
+	engine = ArrayEngine(population, locusModel, 1)
+	for outcrossingRate in [0.1, 0.5, 0.9]:
+		population.outcrossing_rate = outcrossingRate
+		population.calc_ih_prob()
+		engine.update_inbreeding_histories(population.ih_prob_list)
+		del population.ih_prob_list[:]
+		engine.update_mom_genotypes(outcrossingRate)
+		engine.sync_families()
+		assert engine.calc_pop_lnL(outcrossingRate) == pytest.approx(population.calc_pop_lnL(locusModel), rel=1e-12)
+		for fam in population.family_list:
+			assert engine.calc_progeny_lnL(fam, outcrossingRate) == pytest.approx(fam.calc_progeny_lnL(outcrossingRate, locusModel), rel=1e-12)
+
+# Test that the engines agree with each other on the first steps of the chain
+@pytest.mark.parametrize('engine', ['reference', 'array', 'jit'])
+def test_engine_cross_check(engine, dataFile):
+	Application().run(dataFile, [1, 0, 1], 30, 1, seed=123, engine=engine, cross_check=30)
+	assert os.path.exists('BORICE_output1.txt') and not os.path.exists('BORICE_summary.json')
+
+# Test that a cross-check fails on an engine with a wrong likelihood
+def test_engine_cross_check_mismatch(monkeypatch, dataFile):
+	class BrokenEngine(ArrayEngine):
+		def calc_pop_lnL(self, outcrossing_rate):
+			return ArrayEngine.calc_pop_lnL(self, outcrossing_rate) + 1e-3
+	monkeypatch.setitem(Application.ENGINES, 'broken', BrokenEngine)
+	with pytest.raises(EngineMismatchError):
+		Application().run(dataFile, num_steps=30, burn_in=1, seed=123, engine='broken', cross_check=1)
+
+# Test that an engine missing part of the interface cannot be built
+def test_incomplete_engine():
+	class IncompleteEngine(Engine):
+		def __init__(self, population, null_loci, seed = None):
+			pass
+		def calc_pop_lnL(self, outcrossing_rate):
+			return 0.0
+	with pytest.raises(TypeError):
+		IncompleteEngine(None, [])
+
+# Test that the kernels (compiled or not) give the same probabilities as the vectorized array engine
+def test_kernels():
+	population = loadPopulation(DATA_FILE, [1, 0, 1])
+	arrayEngine = ArrayEngine(population, [1, 0, 1])
+	jitEngine = JitEngine(population, [1, 0, 1])
+	for name in ['selfing_factors', 'outcrossing_factors', 'mom_factors', 'mom_lnL']:
+		assert (getattr(arrayEngine, name) == getattr(jitEngine, name)).all()
+	lnL = np.array([-1.0, -2.0, float('-inf'), 0.0])
+	prevLnL = np.array([-2.0, -1.0, -1.0, float('-inf')])
+	randomNumbers = np.array([0.5, 0.5, 0.0, 0.5])
+	assert kernels.metropolis_accept(lnL, prevLnL, randomNumbers).tolist() == [True, False, False, True]
+
+# Test that the likelihood of a large marker panel does not underflow
+def test_log_space_likelihood(tmp_path):
+	with open(DATA_FILE, 'r', newline='') as file:
+		lines = file.read().replace('\r\n', '\n').replace('\r', '\n').split('\n')
+	copies = 150
+	rows = ['%d,1,0' % (3 * copies), ','.join('%s_%d' % (marker, copy) for copy in range(copies) for marker in lines[1].split(',')[:3])]
+	for line in lines[2:]:
+		if line.strip():
+			cells = line.split(',')
+			rows.append(','.join(cells[:2] + cells[2:8] * copies))
+	fileName = tmp_path / 'wide_datafile.csv'
+	fileName.write_text('\n'.join(rows) + '\n')
+	locusModel = [0] * (3 * copies)
+	population = loadPopulation(fileName, locusModel)
+	referenceEngine = ReferenceEngine(population, locusModel)
+	arrayEngine = ArrayEngine(population, locusModel)
+	for outcrossingRate in [0.1, 0.5, 0.9]:
+		lnL = referenceEngine.calc_pop_lnL(outcrossingRate)
+		assert lnL < -1e4 and lnL != float('-inf')
+		assert arrayEngine.calc_pop_lnL(outcrossingRate) == pytest.approx(lnL, rel=1e-12)
+	assert calc_offspring_lnL(0.5, -1000.0, float('-inf')) == pytest.approx(math.log(0.5) - 1000.0)
+	assert calc_offspring_lnL(0.5, float('-inf'), float('-inf')) == float('-inf')
+
+# Test that parse_csv indexes the loci with data of every offspring, and the offspring with data at every locus
+def test_observed_index():
+	with open(DATA_FILE, 'r') as file:
+		markerNames, families = parse_csv(file, ',')
+	for fam in families:
+		for n in range(len(markerNames)):
+			observed = [child for child in fam.offspring if child.genotype_list[n].first != -9]
+			assert fam.get_observed_offspring(n) == observed
+		for child in fam.offspring:
+			assert list(child.observed_loci) == [n for n, genotype in enumerate(child.genotype_list) if genotype.first != -9]
+	family20 = [fam for fam in families if fam.name == '20'][0]
+	assert [len(family20.observed_offspring[n]) for n in range(3)] == [3, 3, 3]
+
+# Test that identical observed genotypes share an instance within a data file, but not across parsed files
+def test_observed_genotypes_shared():
+	parsed = []
+	for n in range(2):
+		with open(DATA_FILE, 'r') as file:
+			markerNames, families = parse_csv(file, ',')
+		parsed.append([genotype for fam in sorted(families) for child in fam.offspring for genotype in child.genotype_list])
+	first, second = parsed
+	assert len(set(map(id, first))) == len(set((genotype.first, genotype.second) for genotype in first))
+	assert not set(map(id, first)) & set(map(id, second))
+
+# Test that collapsing identical offspring into weighted patterns does not change the likelihood
+def test_offspring_patterns():
+	locusModel = [1, 0, 1]
+	population = loadPopulation(DATA_FILE, locusModel)
+	for fam in population.family_list:
+		assert sum(fam.pattern_counts) == len(fam.offspring)
+		assert len(set(tuple(child.genotype_list) for child in fam.patterns)) == len(fam.patterns)
+		assert [fam.patterns[p].genotype_list for p in fam.offspring_pattern] == [child.genotype_list for child in fam.offspring]
+		lnL = sum(child.calc_prob_offspring_geno(0.3, population, fam.mom, locusModel) for child in fam.offspring)
+		assert fam.calc_progeny_lnL(0.3, locusModel) == pytest.approx(lnL, rel=1e-12)
+	assert sum(len(fam.patterns) for fam in population.family_list) < sum(len(fam.offspring) for fam in population.family_list)
+
+# Test that the maternal count table gives the same maternal likelihood as the families after each kind of move
+def test_maternal_count_table():
+	locusModel = [1, 0, 1]
+	population = loadPopulation(DATA_FILE, locusModel)
+	engine = ArrayEngine(population, locusModel, 2)
+	for step in range(5):
+		population.calc_ih_prob()
+		engine.update_inbreeding_histories(population.ih_prob_list)
+		del population.ih_prob_list[:]
+		engine.update_mom_genotypes(0.5)
+		allele_freq = population.allele_freq_list[step % 3]
+		population.allele_freq_list[step % 3] = [freq * (1 + n) for n, freq in enumerate(allele_freq)]
+		total = sum(population.allele_freq_list[step % 3])
+		population.allele_freq_list[step % 3] = [freq / total for freq in population.allele_freq_list[step % 3]]
+		snapshot = engine.update_locus(step % 3)
+		if step % 2:
+			engine.restore_locus(snapshot)
+			population.allele_freq_list[step % 3] = allele_freq
+		engine.sync_families()
+		assert engine.locus_mom_lnL.sum() == pytest.approx(sum(fam.calc_mom_lnL() for fam in population.family_list), rel=1e-12)
+	engine.refresh_mom_factors()
+	assert engine.mom_lnL.tolist() == pytest.approx([fam.calc_mom_lnL() for fam in population.family_list], rel=1e-12)
+
+# Test that a chain state survives a copy, a pickle and a JSON round trip, and gives the same ln likelihood when restored into a new population
+def test_chain_state():
+	import json
+	import pickle
+	locusModel = [1, 0, 1]
+	population = loadPopulation(DATA_FILE, locusModel)
+	engine = ArrayEngine(population, locusModel, 3)
+	for step in range(5):
+		population.calc_ih_prob()
+		engine.update_inbreeding_histories(population.ih_prob_list)
+		del population.ih_prob_list[:]
+		engine.update_mom_genotypes(0.3)
+	population.outcrossing_rate = 0.3
+	allAlleles = [[Allele(n, locus) for n in range(len(alleleFreq))] for locus, alleleFreq in enumerate(population.allele_freq_list)]
+	state = ChainState(step = 5).capture(population, allAlleles, engine)
+	lnL = state.get_lnL(engine, 0.3)
+	assert lnL == engine.calc_pop_lnL(0.3)
+	assert state.progeny_lnL + state.mom_lnL == pytest.approx(lnL, rel=1e-12)
+	for other in [state.copy(), pickle.loads(pickle.dumps(state)), ChainState.from_dict(json.loads(json.dumps(state.to_dict())))]:
+		assert other.to_dict() == state.to_dict()
+	newPopulation = loadPopulation(DATA_FILE, locusModel)
+	ChainState.from_dict(json.loads(json.dumps(state.to_dict()))).restore(newPopulation, allAlleles)
+	assert ReferenceEngine(newPopulation, locusModel).calc_pop_lnL(0.3) == pytest.approx(lnL, rel=1e-12)
+	state.invalidate()
+	assert state.lnL is None and state.get_lnL(engine, 0.3) == lnL
+
+# Test that the inbreeding history and maternal genotype sweeps of the engines update the cached ln likelihood of a chain state to the value of a full recalculation
+@pytest.mark.parametrize('engine', ['reference', 'array'])
+def test_chain_state_lnL_change(engine):
+	locusModel = [1, 0, 1]
+	population = loadPopulation(DATA_FILE, locusModel)
+	likelihood = Application.ENGINES[engine](population, locusModel, 4)
+	state = ChainState()
+	state.get_lnL(likelihood, 0.3)
+	for step in range(10):
+		population.calc_ih_prob()
+		for update in [likelihood.update_inbreeding_histories, likelihood.update_inbreeding_histories_gibbs]:
+			fList, lnLChange = update(population.ih_prob_list)
+			assert lnLChange[0] == 0.0
+			state.change_lnL(lnLChange)
+		del population.ih_prob_list[:]
+		for update in [likelihood.update_mom_genotypes, likelihood.update_mom_genotypes_gibbs]:
+			stepped, changed, lnLChange = update(0.3)
+			state.change_lnL(lnLChange)
+		assert [state.lnL, state.progeny_lnL, state.mom_lnL] == pytest.approx(list(likelihood.calc_pop_lnL_components(0.3)), rel=1e-10)
+	state.set_lnL((float('-inf'), float('-inf'), 0.0))
+	state.change_lnL((float('inf'), 0.0))
+	assert state.lnL is None
+
+# Test that a run that fails restores the signal handlers it replaced
+def test_signal_handlers_restored(monkeypatch, dataFile):
+	class BrokenEngine(ArrayEngine):
+		def calc_pop_lnL(self, outcrossing_rate):
+			return ArrayEngine.calc_pop_lnL(self, outcrossing_rate) + 1e-3
+	monkeypatch.setitem(Application.ENGINES, 'broken', BrokenEngine)
+	handlers = [signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)]
+	app = Application()
+	with pytest.raises(EngineMismatchError):
+		app.run(dataFile, num_steps=30, burn_in=1, seed=123, engine='broken', cross_check=1, checkpoint_file='checkpoint.pkl')
+	assert [signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)] == handlers
+	assert not app.stop_requested
+
+# Test that a run stopped and resumed from its checkpoint, or a finished run extended from its checkpoint, gives the output of an uninterrupted run
+@pytest.mark.parametrize('engine', ['reference', 'array'])
+def test_checkpoint_resume(engine, monkeypatch, dataFile):
+	def readOutputs():
+		return [open('BORICE_output%d.txt' % n).read() for n in range(1, 5)]
+	Application().run(dataFile, [1, 0, 1], 300, 50, seed=5, engine=engine)
+	outputs = readOutputs()
+
+	app = Application()
+	class StoppingEngine(Application.ENGINES[engine]):
+		def update_mom_genotypes(self, outcrossing_rate):
+			moves = Application.ENGINES[engine].update_mom_genotypes(self, outcrossing_rate)
+			if app.chain_state.step == 123:
+				app.request_stop()
+			return moves
+	monkeypatch.setitem(Application.ENGINES, 'stopping', StoppingEngine)
+	app.run(dataFile, [1, 0, 1], 300, 50, seed=5, engine='stopping', checkpoint_file='checkpoint.pkl', checkpoint_interval=100)
+	assert app.stopped and app.chain_state.step == 124
+	Application().run(None, resume_file='checkpoint.pkl')
+	assert readOutputs() == outputs
+
+	Application().run(dataFile, [1, 0, 1], 150, 50, seed=5, engine=engine, checkpoint_file='finished.pkl')
+	Application().run(None, resume_file='finished.pkl', extend_steps=150)
+	assert readOutputs() == outputs
+
+# Test that pooled chains run like single runs with their own seeds, and that their samples are pooled in the output files
+def test_multiple_chains(dataFile):
+	app = Application()
+	app.run(dataFile, [1, 0, 1], 200, 50, seed=5, engine='array', chains=2, jobs=2, chain_outputs=True)
+	assert len(set(app.chain_seeds)) == 2
+	pooledSamples = open('BORICE_output3.txt').read().split('\n', 2)[2]
+	chainSamples = ''
+	for chain, chainSeed in enumerate(app.chain_seeds):
+		chainOutputs = [open(os.path.join('BORICE_chain%d' % (chain + 1), 'BORICE_output%d.txt' % n)).read() for n in range(1, 5)]
+		Application().run(dataFile, [1, 0, 1], 200, 50, seed=chainSeed, engine='array')
+		assert [open('BORICE_output%d.txt' % n).read() for n in range(1, 5)] == chainOutputs
+		chainSamples += chainOutputs[2].split('\n', 2)[2]
+	assert pooledSamples == chainSamples
+	tallies = merge_tallies([{'t_list': [0.1], 'F_list': [0.2], 'pop_lnL_list': [-1.0], 'diagnostics': ['chain1'], 'tuners': ['tuners1'], 'families': [([1], [[(1, 2)]], [[(1, 2)]])], 'af_lists': [[[0.5]]]}, {'t_list': [0.3], 'F_list': [0.4], 'pop_lnL_list': [-2.0], 'diagnostics': ['chain2'], 'tuners': ['tuners2'], 'families': [([2], [[(2, 2)]], [[(2, 2), (1, 2)]])], 'af_lists': [[[0.6]]]}])
+	assert tallies == {'t_list': [0.1, 0.3], 'F_list': [0.2, 0.4], 'pop_lnL_list': [-1.0, -2.0], 'diagnostics': ['chain1', 'chain2'], 'tuners': ['tuners1', 'tuners2'], 'families': [([1, 2], [[(1, 2), (2, 2)]], [[(1, 2), (2, 2)]])], 'af_lists': [[[0.5, 0.6]]]}
+
+# Test that the running diagnostics agree with the diagnostics of the full trace, and pool over chains
+def test_running_diagnostics():
+	rng = np.random.default_rng(3)
+	samples = rng.normal(size=(2, 5000))
+	diagnostics = [RunningDiagnostic(), RunningDiagnostic()]
+	for diagnostic, chainSamples in zip(diagnostics, samples):
+		for sample in chainSamples:
+			diagnostic.add(sample)
+		# the running moments and batches must match the whole trace
+		assert diagnostic.count == 5000
+		assert len(diagnostic.batches) <= diagnostic.max_batches
+		assert sum(batch[0] for batch in diagnostic.batches) == 5000
+		assert diagnostic.mean == pytest.approx(chainSamples.mean())
+		assert diagnostic.calc_variance() == pytest.approx(chainSamples.var(ddof=1))
+		assert 3000 < diagnostic.calc_ess() < 8000
+	summary = summarize_diagnostics(diagnostics)
+	assert summary['samples'] == 10000
+	assert summary['mean'] == pytest.approx(samples.mean())
+	assert summary['split_rhat'] == pytest.approx(1.0, abs=0.01)
+	# chains sampling different distributions have a large split-R-hat
+	shifted = RunningDiagnostic()
+	for sample in samples[1] + 1.0:
+		shifted.add(sample)
+	assert calc_split_rhat([diagnostics[0], shifted]) > 1.1
+	assert summarize_diagnostics([RunningDiagnostic()])['ess'] is None
+
+# Test that the stopping rules end the chain and record the rule in the output files
+def test_stopping_rules(dataFile):
+	app = Application()
+	app.run(dataFile, [1, 0, 1], 100000, 9, seed=5, engine='array', target_ess=20, write_summary=True)
+	summary = json.load(open('BORICE_summary.json'))
+	assert not app.stopped
+	assert summary['stop_reasons'] == ['target ESS']
+	assert summary['steps'] == [app.settings['num_steps']]
+	assert app.settings['num_steps'] < 100000
+	assert min(summary['t']['ess'], summary['F']['ess']) >= 20
+	assert "Chain ran %s steps (stopped by target ESS), with a burn-in of 9 steps (fixed)" % summary['steps'][0] in open('BORICE_output1.txt').read()
+	# a spent time budget stops the chain at its first sample
+	app.run(dataFile, [1, 0, 1], 100000, 9, seed=5, engine='array', time_budget=0, write_summary=True)
+	assert json.load(open('BORICE_summary.json'))['steps'] == [11]
+
+# Test that a time budget shorter than the burn-in ends the burn-in early and leaves time for samples
+def test_time_budget_during_burn_in(dataFile):
+	app = Application()
+	app.run(dataFile, [1, 0, 1], 10000000, 1000000, seed=5, engine='array', time_budget=1.0, write_summary=True)
+	summary = json.load(open('BORICE_summary.json'))
+	assert summary['stop_reasons'] == ['time budget']
+	assert summary['burn_in_stop_reasons'] == ['time budget']
+	assert 0 < summary['burn_in'][0] < summary['steps'][0] < 1000000
+	assert 'ended early by the time budget' in open('BORICE_output1.txt').read()
+
+# Test that the tuning parameters adapt toward the target acceptance rate during the burn-in only
+def test_proposal_tuning(dataFile):
+	# a move accepted with probability exp(-scale) settles where exp(-scale) is the target acceptance rate
+	rng = np.random.default_rng(7)
+	tuner = ProposalTuner(0.05, 0.44, 1e-4, 10.0)
+	for proposal in range(20000):
+		tuner.adapt(rng.random() < math.exp(-tuner.scale))
+	assert tuner.scale == pytest.approx(-math.log(0.44), rel=0.1)
+	tuner.freeze()
+	assert tuner.calc_acceptance_rate() is None
+	# adapted tuning parameters are frozen after the burn-in, and a resumed run adapts them as an uninterrupted one
+	app = Application()
+	app.run(dataFile, [1, 0, 1], 600, 299, seed=5, engine='array', adapt_tuning=True, write_summary=True)
+	tuning = json.load(open('BORICE_summary.json'))['tuning'][0]
+	assert tuning['t']['tuning_parameter'] != Application.OUTCROSSING_RATE_TUNING
+	outputs = [open('BORICE_output%d.txt' % n).read() for n in range(1, 5)]
+	app.request_stop()
+	app.run(dataFile, [1, 0, 1], 600, 299, seed=5, engine='array', adapt_tuning=True, checkpoint_file='run.pkl')
+	assert app.stopped and app.chain_state.step == 1
+	app.run(None, resume_file='run.pkl')
+	assert [open('BORICE_output%d.txt' % n).read() for n in range(1, 5)] == outputs
+
+# Test that the burn-in ends once the chain is stationary
+def test_auto_burn_in(monkeypatch, dataFile):
+	# a trending trace never becomes stationary, a stationary one does within a few windows
+	rng = np.random.default_rng(11)
+	trending = BurnInDetector(50)
+	assert not any(trending.add(0.001 * n + 0.01 * rng.normal(), -n + rng.normal()) for n in range(1000))
+	stationary = BurnInDetector(50)
+	assert any(stationary.add(rng.normal(), rng.normal()) for n in range(200))
+	# the samples of the run start after the burn-in found
+	monkeypatch.setattr(Application, 'AUTO_BURN_IN_WINDOWS', 20)
+	monkeypatch.setattr(Application, 'AUTO_BURN_IN_MIN_WINDOW', 10)
+	app = Application()
+	app.run(dataFile, [1, 0, 1], 3000, 1999, seed=5, engine='array', auto_burn_in=True, write_summary=True)
+	summary = json.load(open('BORICE_summary.json'))
+	burnIn = summary['burn_in'][0]
+	assert summary['burn_in_detected'] == [True] and burnIn < 1999
+	assert app.settings['burn_in'] == burnIn
+	assert summary['t']['samples'] == len(range(burnIn + 1, 3000, 10)) - 1
+
+# Test that the windows of the automatic burn-in follow the burn-in, and that a burn-in too short for two windows is reported
+def test_auto_burn_in_window(capsys, dataFile):
+	app = Application()
+	app.run(dataFile, [1, 0, 1], 500, 400, seed=5, engine='array', auto_burn_in=True)
+	assert 'warning' not in capsys.readouterr().out
+	app.run(dataFile, [1, 0, 1], 500, 299, seed=5, engine='array', auto_burn_in=True, write_summary=True)
+	assert 'shorter than the two windows of 200 steps' in capsys.readouterr().out
+	summary = json.load(open('BORICE_summary.json'))
+	assert summary['burn_in'] == [299] and summary['burn_in_detected'] == [False]
+
+# Test that neighbouring chains swap their states, and that the swaps of a tempered run are reported
+def test_parallel_tempering(dataFile):
+	# a swap toward the better offspring likelihood in the colder chain is always accepted, and only pairs of the given parity are proposed
+	heats = calc_heats(3, 0.5)
+	assert heats == [1.0, 1.0 / 1.5, 0.5]
+	states = [{'progeny_lnL': -10.0}, {'progeny_lnL': -5.0}, {'progeny_lnL': -1.0}]
+	swaps = [ProposalTuner(heat, None, heat, heat) for heat in heats[1:]]
+	swapped = swap_states(states, heats, np.random.default_rng(1), swaps, 0)
+	assert swapped == [states[1], states[0], states[2]]
+	assert [(swap.proposals, swap.acceptances) for swap in swaps] == [(1, 1), (0, 0)]
+	# the heated chains swap with the cold chain, whose swap acceptance rates are reported
+	Application().run(dataFile, [1, 0, 1], 300, 100, seed=5, engine='array', temperatures=3, swap_interval=10, write_summary=True)
+	summary = json.load(open('BORICE_summary.json'))
+	assert [swap['heat'] for swap in summary['tuning'][0]['swaps']] == pytest.approx(calc_heats(3, 0.1)[1:])
+	assert all(swap['acceptance_rate'] is not None for swap in summary['tuning'][0]['swaps'])
+	assert "Swap heats 1 and 0.9091" in open('BORICE_output1.txt').read()
+
+# Test that the grid move of t evaluates the same progeny likelihood as the engines, and accepts nearly all its proposals
+@pytest.mark.parametrize('engine', ['reference', 'array'])
+def test_outcrossing_rate_grid(engine, dataFile):
+	locusModel = [1, 0, 1]
+	population = loadPopulation(dataFile, locusModel)
+	likelihood = Application.ENGINES[engine](population, locusModel)
+	outcrossingRates = [0.005, 0.3, 0.995]
+	assert list(likelihood.calc_progeny_lnL_grid(outcrossingRates)) == pytest.approx([likelihood.calc_pop_lnL_components(outcrossingRate)[1] for outcrossingRate in outcrossingRates], rel=1e-12)
+	Application().run(dataFile, locusModel, 600, 100, seed=5, engine=engine, t_move='grid', write_summary=True)
+	tuning = json.load(open('BORICE_summary.json'))['tuning'][0]['t']
+	assert tuning['tuning_parameter'] == 1.0 / Application.T_GRID_SIZE and tuning['acceptance_rate'] > 0.8
+
+# Test that the Gibbs move of the inbreeding histories keeps its table of maternal probabilities up to date, and draws from the full conditional distribution
+def test_inbreeding_history_gibbs():
+	locusModel = [1, 0, 1]
+	population = loadPopulation(DATA_FILE, locusModel)
+	engine = ArrayEngine(population, locusModel, 4)
+	for step in range(5):
+		population.calc_ih_prob()
+		engine.update_inbreeding_histories_gibbs(population.ih_prob_list)
+		del population.ih_prob_list[:]
+		engine.update_mom_genotypes(0.5)
+		allele_freq = population.allele_freq_list[step % 3]
+		population.allele_freq_list[step % 3] = [freq * (1 + n) for n, freq in enumerate(allele_freq)]
+		total = sum(population.allele_freq_list[step % 3])
+		population.allele_freq_list[step % 3] = [freq / total for freq in population.allele_freq_list[step % 3]]
+		snapshot = engine.update_locus(step % 3)
+		if step % 2:
+			engine.restore_locus(snapshot)
+			population.allele_freq_list[step % 3] = allele_freq
+	engine.sync_families()
+	engine.refresh_mom_factors()
+	engine.refresh_ih_factors()
+	newEngine = ArrayEngine(population, locusModel)
+	newEngine.refresh_ih_factors()
+	assert engine.ih_factors.ravel().tolist() == pytest.approx(newEngine.ih_factors.ravel().tolist(), rel=1e-12)
+	assert engine.mom_lnL.tolist() == pytest.approx([fam.calc_mom_lnL() for fam in population.family_list], rel=1e-12)
+	# the draws of a family follow the inbreeding history probabilities times the probability of its mom under each history
+	ihProbs = np.full(7, 1.0 / 7)
+	family = 0
+	conditional = np.exp(engine.ih_factors[family].sum(axis=0))
+	conditional = conditional / conditional.sum()
+	draws = []
+	for n in range(4000):
+		engine.update_inbreeding_histories_gibbs(ihProbs.tolist())
+		draws.append(engine.inbreeding_history[family])
+	assert (np.bincount(draws, minlength=7) / 4000.0).tolist() == pytest.approx(conditional.tolist(), abs=0.03)
+	referenceEngine = ReferenceEngine(population, locusModel)
+	referenceDraws = []
+	for n in range(1000):
+		referenceEngine.update_inbreeding_histories_gibbs(ihProbs.tolist())
+		referenceDraws.append(population.family_list[family].inbreeding_history)
+	assert (np.bincount(referenceDraws, minlength=7) / 1000.0).tolist() == pytest.approx(conditional.tolist(), abs=0.06)
+
+# Test that the Gibbs move of the maternal genotypes keeps the likelihood of the engines up to date, and changes the genotypes more often than the Metropolis move
+@pytest.mark.parametrize('engine', ['reference', 'array'])
+def test_mom_genotype_gibbs(engine, dataFile):
+	locusModel = [1, 0, 1]
+	population = loadPopulation(dataFile, locusModel)
+	likelihood = Application.ENGINES[engine](population, locusModel, 6)
+	for step in range(5):
+		stepped, changed, lnLChange = likelihood.update_mom_genotypes_gibbs(0.3)
+		assert stepped == len(population.imputed_family_list) and 0 <= changed <= stepped
+	likelihood.sync_families()
+	assert likelihood.calc_pop_lnL(0.3) == pytest.approx(ReferenceEngine(population, locusModel).calc_pop_lnL(0.3), rel=1e-12)
+	changeRates = []
+	for momMove in ['metropolis', 'gibbs']:
+		Application().run(dataFile, locusModel, 600, 100, seed=5, engine=engine, mom_move=momMove, write_summary=True)
+		changeRates.append(json.load(open('BORICE_summary.json'))['tuning'][0]['mom']['acceptance_rate'])
+	assert changeRates[1] > changeRates[0]
+
+# Test that the maternal compatibility index agrees with the offspring probabilities, and catches impossible observed maternal genotypes
+def test_mom_compatibility():
+	locusModel = [1, 0, 1]
+	population = loadPopulation(DATA_FILE, locusModel)
+	incompatible = []
+	for fam in population.family_list:
+		for n, alleleFreq in enumerate(population.allele_freq_list):
+			compatibility = fam.mom_compatibility[n]
+			possible = []
+			for second in range(len(alleleFreq)):
+				for first in range(second + 1):
+					momGenotype = SingleLocusGenotype(first, second)
+					possible.append(all(child.genotype_list[n].calc_prob_offspring_given_outcrossing(alleleFreq, momGenotype, n, locusModel[n]) > 0.0 for child in fam.get_observed_offspring(n)))
+					if not possible[-1] and first > 0:
+						incompatible.append((fam, n, first, second))
+			assert compatibility.list_compatible(len(alleleFreq), locusModel[n]) == possible
+	fam, n, first, second = [entry for entry in incompatible if not locusModel[entry[1]]][0]
+	with pytest.raises(SingleLocusGenotypeError):
+		tag_mom_genotype(first, second, fam.mom_compatibility[n], n, locusModel, fam.name, False, population.allele_list[n])
+	assert tag_mom_genotype(first, second, fam.mom_compatibility[n], n, locusModel, fam.name, True, population.allele_list[n]).first == first